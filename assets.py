@@ -0,0 +1,121 @@
+"""
+Static asset build.
+
+Copies css/, js/, images/ and fonts/ into build/assets/ under content-hashed
+names, writes gzip (and brotli, if installed) variants next to the compressible
+ones and rewrites index.html to reference the hashed files. Because a file's
+name changes whenever its content does, the server can mark assets immutable.
+
+    python assets.py [build_dir]
+
+web.py runs the same build at startup whenever a source file is newer than the
+last build, so this is only needed to build ahead of time.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional; gzip is always written
+    brotli = None
+
+ASSET_DIRS = ('css', 'js', 'images', 'fonts')
+ASSET_URL_PREFIX = '/assets/'
+# Images are already compressed; precompressing them only wastes disk
+COMPRESSIBLE = ('.css', '.js', '.ttf', '.svg', '.json')
+HASH_LENGTH = 10
+MANIFEST = 'manifest.json'
+
+# src="js/app.js", href="css/style.css", ... - local asset references only
+ASSET_REF = re.compile(r'''(\b(?:src|href)=["'])/?((?:%s)/[^"'?#]+)(["'])''' % '|'.join(ASSET_DIRS))
+
+
+def source_files(source_dir):
+    """Relative paths ('js/app.js') of every asset under the asset directories"""
+    for top in ASSET_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(source_dir, top)):
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                yield os.path.relpath(path, source_dir).replace(os.sep, '/')
+
+
+def fingerprint(rel, data):
+    name, ext = os.path.splitext(rel)
+    return f'{name}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def _write_atomic(path, data):
+    # Several server processes may build at once; readers never see partial files
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def rewrite_html(html, manifest):
+    """Point asset references at the hashed files and expose the manifest to scripts"""
+    def replace(match):
+        hashed = manifest.get(match.group(2))
+        if hashed is None:
+            return match.group(0)
+        return f'{match.group(1)}{ASSET_URL_PREFIX}{hashed}{match.group(3)}'
+
+    html = ASSET_REF.sub(replace, html)
+    # Scripts that load assets at runtime (fonts, the PDF logo) look them up here
+    urls = {rel: ASSET_URL_PREFIX + hashed for rel, hashed in manifest.items()}
+    script = f'<script>window.ASSET_MANIFEST = {json.dumps(urls, sort_keys=True)};</script>\n'
+    return html.replace('</head>', script + '</head>', 1)
+
+
+def build(source_dir='.', build_dir='build'):
+    """Build every asset plus index.html; returns the manifest {source path: hashed path}"""
+    assets_dir = os.path.join(build_dir, 'assets')
+    manifest = {}
+    for rel in source_files(source_dir):
+        with open(os.path.join(source_dir, rel), 'rb') as f:
+            data = f.read()
+        hashed = fingerprint(rel, data)
+        manifest[rel] = hashed
+        target = os.path.join(assets_dir, hashed)
+        if os.path.exists(target):
+            continue  # content-addressed: an existing file is already up to date
+        if rel.endswith(COMPRESSIBLE):
+            _write_atomic(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(target + '.br', brotli.compress(data, quality=11))
+        # Written last, so its presence means the variants are in place too
+        _write_atomic(target, data)
+
+    with open(os.path.join(source_dir, 'index.html'), encoding='utf-8') as f:
+        html = f.read()
+    _write_atomic(os.path.join(build_dir, 'index.html'), rewrite_html(html, manifest).encode('utf-8'))
+    _write_atomic(os.path.join(build_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def ensure_built(source_dir='.', build_dir='build'):
+    """Rebuild if any source is newer than the last build; returns the manifest"""
+    manifest_path = os.path.join(build_dir, MANIFEST)
+    try:
+        built_at = os.path.getmtime(manifest_path)
+    except OSError:
+        return build(source_dir, build_dir)
+
+    sources = [os.path.join(source_dir, rel) for rel in source_files(source_dir)]
+    sources.append(os.path.join(source_dir, 'index.html'))
+    if any(os.path.getmtime(path) > built_at for path in sources):
+        return build(source_dir, build_dir)
+    with open(manifest_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    build_dir = sys.argv[1] if len(sys.argv) > 1 else 'build'
+    manifest = build('.', build_dir)
+    print(f"{len(manifest)} assets built into {build_dir}/ (brotli: {'yes' if brotli else 'not installed'})")
@@ -0,0 +1,774 @@
+"""
+Reproducible performance benchmark.
+
+Seeds a fresh SQLite file with synthetic customers, products, quotes and price
+history (deterministic for a given --seed and set of volumes), then drives every
+route in web.py, first in-process through the Flask test client and then over
+HTTP against a local multi-worker gunicorn. Each route gets p50/p95/p99 latency
+and throughput; the results are written as JSON and can be compared against a
+baseline run.
+
+    python benchmark.py seed [--scale 0.1]
+    python benchmark.py run [--scale 0.1] [--mode client|gunicorn|both] [--output results.json]
+                            [--baseline baseline.json] [--threshold 0.25]
+    python benchmark.py compare results.json baseline.json
+
+Seeded databases are kept under .benchmark/ and reused; every run works on a
+fresh copy, so write routes never leak into the next run. Scraping and the image
+proxy are pointed at a local stub site, so no network access is needed.
+"""
+import argparse
+import base64
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+import requests
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(APP_DIR, '.benchmark')
+
+# Full-size volumes; --scale multiplies all of them
+VOLUMES = {'customers': 100_000, 'products': 20_000, 'quotes': 200_000, 'priceHistory': 2_000_000}
+SEED = 42
+SEED_CHUNK_SIZE = 50_000
+# Seeded rows are spread over two years starting here, so date filters are reproducible
+DATA_START = datetime(2024, 1, 1)
+DATA_DAYS = 730
+
+REQUESTS_PER_ROUTE = 200
+WARMUP_REQUESTS = 5
+CONCURRENCY = 8
+# A route is a regression when a latency grows by more than the threshold and by
+# at least MIN_DELTA_MS; the absolute floor keeps sub-millisecond noise out
+REGRESSION_THRESHOLD = 0.25
+MIN_DELTA_MS = 2.0
+COMPARED_PERCENTILES = ('p50', 'p95')
+
+FIRST_NAMES = ('Ahmet', 'Mehmet', 'Ayşe', 'Fatma', 'Mustafa', 'Zeynep', 'Emre', 'Elif',
+               'Burak', 'Şule', 'İbrahim', 'Gülşen', 'Oğuz', 'Çağla', 'Hüseyin', 'Merve')
+SURNAMES = ('Yılmaz', 'Kaya', 'Demir', 'Şahin', 'Çelik', 'Yıldız', 'Öztürk', 'Aydın',
+            'Arslan', 'Doğan', 'Koç', 'Kurt', 'Özdemir', 'Kılıç', 'Aksoy', 'Erdoğan')
+COMPANY_WORDS = ('Güvenlik', 'Teknoloji', 'Elektronik', 'İnşaat', 'Bilişim', 'Otomasyon', 'Enerji', 'Yapı')
+COMPANY_SUFFIXES = ('Ltd. Şti.', 'A.Ş.', 'San. ve Tic. Ltd. Şti.')
+CITIES = ('İstanbul', 'Ankara', 'İzmir', 'Bursa', 'Antalya', 'Konya', 'Kocaeli', 'Eskişehir')
+BRANDS = ('Hikvision', 'Dahua', 'Uniview', 'Ajax', 'Paradox', 'Ubiquiti', 'TP-Link', 'Teltonika')
+PRODUCT_KINDS = ('IP Kamera', 'NVR Kayıt Cihazı', 'PoE Switch', 'Alarm Paneli', 'Hareket Dedektörü',
+                 'Access Point', 'Cat6 Kablo', 'Geçiş Kontrol Terminali')
+UNITS = ('Adet', 'Metre', 'Paket')
+CURRENCIES = ('USD', 'EUR', 'TRY')
+STATUSES = ('draft', 'sent', 'accepted', 'rejected')
+
+# 1x1 PNG served by the stub supplier site
+STUB_IMAGE = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+
+# --- synthetic data ---
+
+def scaled_volumes(scale=1.0, **overrides):
+    volumes = {name: max(1, int(count * scale)) for name, count in VOLUMES.items()}
+    volumes.update({name: count for name, count in overrides.items() if count is not None})
+    return volumes
+
+
+def seed_path(volumes, seed=SEED):
+    """Seeded databases are named after what is in them, so they can be reused"""
+    return os.path.join(DATA_DIR, 'seed-c{customers}-p{products}-q{quotes}-h{priceHistory}-s{seed}.db'.format(seed=seed, **volumes))
+
+
+def product_code(product_id):
+    return f'{BRANDS[product_id % len(BRANDS)][:3].upper()}-{product_id:06d}'
+
+
+def created_at(index, count, rng):
+    # Increasing with the id, like real data, with some jitter
+    offset = DATA_DAYS * 86400 * (index + rng.random()) / count
+    return (DATA_START + timedelta(seconds=offset)).isoformat()
+
+
+def phone_number(rng):
+    return f'05{rng.randrange(30, 60)} {rng.randrange(100, 1000)} {rng.randrange(10, 100)} {rng.randrange(10, 100)}'
+
+
+def generate_customers(rng, count):
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(SURNAMES)
+        company = f'{rng.choice(SURNAMES)} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}' if rng.random() < 0.7 else None
+        email = f'{first}.{last}{i}@example.com'.lower() if rng.random() < 0.6 else None
+        yield (i + 1, f'{first} {last}', company, email, phone_number(rng),
+               f'{rng.choice(CITIES)}, No: {rng.randrange(1, 200)}', created_at(i, count, rng))
+
+
+def generate_products(rng, count):
+    for i in range(count):
+        product_id = i + 1
+        brand, kind = BRANDS[product_id % len(BRANDS)], rng.choice(PRODUCT_KINDS)
+        yield (product_id, product_code(product_id), f'{brand} {kind} {rng.randrange(100, 9999)}',
+               f'{brand} marka {kind.lower()}, {rng.choice(("2MP", "4MP", "8MP", "16 port", "8 kanal", "305 m"))}',
+               round(rng.uniform(5, 2500), 2), rng.choice(CURRENCIES), rng.choice(UNITS),
+               None, created_at(i, count, rng))
+
+
+def generate_quotes(rng, volumes, web):
+    """(quote row, [item rows]) pairs; quote numbers restart every year like the real sequence"""
+    count, products = volumes['quotes'], volumes['products']
+    numbers = {}
+    for i in range(count):
+        quote_id = i + 1
+        created = created_at(i, count, rng)
+        year = int(created[:4])
+        numbers[year] = numbers.get(year, 0) + 1
+        items = []
+        for position in range(rng.randint(1, 5)):
+            product_id = rng.randrange(1, products + 1)
+            items.append((quote_id, position, product_id, product_code(product_id), f'Ürün {product_id}',
+                          rng.randint(1, 50), round(rng.uniform(5, 2500), 2), rng.choice(UNITS)))
+        total = round(sum(item[5] * item[6] for item in items), 2)
+        quote = (quote_id, web.format_quote_number(year, numbers[year]), rng.randrange(1, volumes['customers'] + 1),
+                 rng.choice(STATUSES), total, rng.choice(CURRENCIES), rng.choice((15, 30, 60)),
+                 'Teslim süresi 3 iş günü' if rng.random() < 0.3 else None, created)
+        yield quote, items
+
+
+def generate_price_history(rng, volumes):
+    count = volumes['priceHistory']
+    for i in range(count):
+        yield (rng.randrange(1, volumes['products'] + 1), rng.randrange(1, volumes['customers'] + 1),
+               rng.randrange(1, volumes['quotes'] + 1), round(rng.uniform(5, 2500), 2), created_at(i, count, rng))
+
+
+def bulk_insert(conn, table, columns, rows):
+    """Insert through a temp staging table in chunks: one INSERT ... SELECT per
+    chunk keeps FTS5 and the change triggers from flushing per statement"""
+    staging = f'temp.seed_{table}'
+    column_list = ', '.join(columns)
+    conn.execute(f'CREATE TEMP TABLE IF NOT EXISTS seed_{table} AS SELECT {column_list} FROM {table} WHERE 0')
+    insert = f"INSERT INTO {staging} VALUES ({', '.join('?' * len(columns))})"
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, SEED_CHUNK_SIZE))
+        if not chunk:
+            break
+        conn.executemany(insert, chunk)
+        conn.execute(f'INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging}')
+        conn.execute(f'DELETE FROM {staging}')
+    conn.execute(f'DROP TABLE {staging}')
+
+
+def seed(path, volumes, seed=SEED, log=print):
+    """Create `path` with the schema from web.init_db and fill it with synthetic data"""
+    import web
+
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(tmp_path + suffix):
+            os.unlink(tmp_path + suffix)
+
+    rng = random.Random(seed)
+    web.init_db(tmp_path)
+    conn = web.get_db_connection(tmp_path)
+    try:
+        started = perf_counter()
+        conn.execute('BEGIN')
+        bulk_insert(conn, 'customers', ('id', 'name', 'company', 'email', 'phone', 'address', 'createdAt'),
+                    generate_customers(rng, volumes['customers']))
+        log(f"  {volumes['customers']} customers ({perf_counter() - started:.1f} s)")
+        bulk_insert(conn, 'products', ('id', 'code', 'name', 'description', 'price', 'currency', 'unit', 'imageUrl', 'createdAt'),
+                    generate_products(rng, volumes['products']))
+        log(f"  {volumes['products']} products ({perf_counter() - started:.1f} s)")
+
+        item_rows = []
+
+        def quotes():
+            for quote, items in generate_quotes(rng, volumes, web):
+                item_rows.extend(items)
+                yield quote
+                if len(item_rows) >= SEED_CHUNK_SIZE:
+                    conn.executemany(web.QUOTE_ITEM_INSERT, item_rows)
+                    item_rows.clear()
+
+        bulk_insert(conn, 'quotes', ('id', 'quoteNumber', 'customerId', 'status', 'total', 'currency', 'validDays', 'notes', 'createdAt'),
+                    quotes())
+        conn.executemany(web.QUOTE_ITEM_INSERT, item_rows)
+        log(f"  {volumes['quotes']} quotes ({perf_counter() - started:.1f} s)")
+        bulk_insert(conn, 'price_history', ('productId', 'customerId', 'quoteId', 'price', 'createdAt'),
+                    generate_price_history(rng, volumes))
+        log(f"  {volumes['priceHistory']} price history rows ({perf_counter() - started:.1f} s)")
+        conn.commit()
+        # Statistics like a populated database gets when it is migrated
+        conn.execute('ANALYZE')
+        conn.commit()
+        # Fold the WAL into the main file, so the database is a single file to copy
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(tmp_path + suffix):
+            os.unlink(tmp_path + suffix)
+
+
+def fresh_copy(source, target):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(target + suffix):
+            os.unlink(target + suffix)
+    shutil.copyfile(source, target)
+
+
+# --- workload ---
+
+def req(method, path, **kwargs):
+    """A request description; transports understand json, form, upload=(name, bytes) and headers"""
+    return dict(kwargs, method=method, path=path)
+
+
+class Scenario:
+    def __init__(self, name, build, cost=1, conditional=False):
+        self.name = name
+        self.build = build            # Workload -> request description
+        self.cost = cost              # expensive routes run REQUESTS_PER_ROUTE / cost times
+        self.conditional = conditional  # replayed with the ETag of a first response (expects 304)
+
+
+class Workload:
+    """Deterministic request parameters for the seeded data"""
+
+    def __init__(self, volumes, latest_version, asset_path=None, stub_url=None, reserve=0, seed=SEED):
+        self.volumes = volumes
+        self.latest_version = latest_version
+        self.asset_path = asset_path
+        self.stub_url = stub_url
+        self.rng = random.Random(seed)
+        # The highest ids are kept for the DELETE routes, so reads never hit a deleted row
+        self.reserve = reserve
+        self._deleted = {table: itertools.count(volumes[table], -1) for table in ('customers', 'products', 'quotes')}
+        self._serial = itertools.count(1)
+
+    def pick(self, table):
+        return self.rng.randrange(1, max(2, self.volumes[table] - self.reserve))
+
+    def pick_many(self, table, count):
+        return ','.join(str(self.pick(table)) for _ in range(count))
+
+    def deletable(self, table):
+        return next(self._deleted[table])
+
+    def serial(self):
+        return next(self._serial)
+
+    def search_term(self):
+        return self.rng.choice(SURNAMES)[:self.rng.randint(3, 5)]
+
+    def product_search_term(self):
+        # A code prefix, a word of a product kind or a kind plus a resolution
+        kind = self.rng.choice(PRODUCT_KINDS)
+        return self.rng.choice((
+            product_code(self.pick('products'))[:self.rng.randint(3, 8)],
+            kind.split()[-1][:self.rng.randint(3, 6)],
+            f"{kind.split()[0][:3]} {self.rng.choice(('2mp', '4mp', '8 kanal'))}",
+        ))
+
+    def date_range(self, days=30):
+        start = DATA_START + timedelta(days=self.rng.randrange(DATA_DAYS - days))
+        return f'dateFrom={start.date().isoformat()}&dateTo={(start + timedelta(days=days)).date().isoformat()}'
+
+    def customer(self):
+        n = self.serial()
+        return {'name': f'Bench Müşteri {n}', 'company': 'Bench Güvenlik A.Ş.',
+                'email': f'bench{n}@example.com', 'phone': f'0555 {n:07d}', 'address': 'İstanbul'}
+
+    def product(self, product_id=None):
+        code = product_code(product_id) if product_id else f'BENCH-{self.serial():07d}'
+        return {'code': code, 'name': f'Bench Ürün {code}', 'description': 'Benchmark ürünü',
+                'price': round(self.rng.uniform(5, 2500), 2), 'currency': 'USD', 'unit': 'Adet'}
+
+    def quote(self):
+        items = []
+        for _ in range(3):
+            product_id = self.pick('products')
+            items.append({'productId': product_id, 'productCode': product_code(product_id), 'productName': f'Ürün {product_id}',
+                          'quantity': self.rng.randint(1, 20), 'unitPrice': round(self.rng.uniform(5, 2500), 2), 'unit': 'Adet'})
+        return {'customerId': self.pick('customers'), 'status': 'draft', 'currency': 'USD', 'validDays': 30,
+                'total': round(sum(i['quantity'] * i['unitPrice'] for i in items), 2), 'notes': 'Benchmark', 'items': items}
+
+    def import_file(self, rows=100):
+        lines = ['Ad Soyad;Firma;Telefon;E-posta']
+        for _ in range(rows):
+            n = self.serial()
+            lines.append(f'İthal Müşteri {n};Bench Ltd. Şti.;0544 {n:07d};import{n}@example.com')
+        return 'customers.csv', ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def stub_page(self):
+        # A new URL each time, so the scraper's cache does not answer it
+        return f'{self.stub_url}/product/{self.serial()}'
+
+
+def scenarios(web):
+    """Every route in web.py; the order matters only in that /logout comes last"""
+    user, password = next(iter(web.VALID_USERS.items()))
+    encode_cursor = web.encode_cursor
+    return [
+        Scenario('GET /login', lambda w: req('GET', '/login')),
+        Scenario('POST /login', lambda w: req('POST', '/login', form={'username': user, 'password': password})),
+        Scenario('GET /', lambda w: req('GET', '/')),
+        Scenario('GET /assets/<path>', lambda w: req('GET', w.asset_path, headers={'Accept-Encoding': 'br, gzip'})),
+        Scenario('GET /metrics', lambda w: req('GET', '/metrics')),
+
+        Scenario('GET /api/customers', lambda w: req('GET', '/api/customers?limit=50')),
+        Scenario('GET /api/customers (304)', lambda w: req('GET', '/api/customers?limit=50'), conditional=True),
+        Scenario('GET /api/customers?after=', lambda w: req('GET', f"/api/customers?limit=50&after={encode_cursor(w.pick('customers'))}")),
+        Scenario('GET /api/customers?search=', lambda w: req('GET', f'/api/customers?limit=50&search={w.search_term()}')),
+        Scenario('GET /api/customers?ids=', lambda w: req('GET', f"/api/customers?ids={w.pick_many('customers', 50)}")),
+        Scenario('GET /api/customers/search', lambda w: req('GET', f'/api/customers/search?q={w.search_term()}')),
+        Scenario('GET /api/customers/<id>', lambda w: req('GET', f"/api/customers/{w.pick('customers')}")),
+        Scenario('POST /api/customers', lambda w: req('POST', '/api/customers', json=w.customer())),
+        Scenario('POST /api/customers (bulk)', lambda w: req('POST', '/api/customers', json=[w.customer() for _ in range(100)])),
+        Scenario('PUT /api/customers/<id>', lambda w: req('PUT', f"/api/customers/{w.pick('customers')}", json=w.customer())),
+        Scenario('POST /api/customers/import', lambda w: req('POST', '/api/customers/import', upload=w.import_file()), cost=4),
+        Scenario('POST /api/customers/import?async=1', lambda w: req('POST', '/api/customers/import?async=1', upload=w.import_file())),
+        Scenario('GET /api/jobs/<id>', lambda w: req('GET', '/api/jobs/1')),
+
+        Scenario('GET /api/products', lambda w: req('GET', '/api/products'), cost=10),
+        Scenario('GET /api/products (304)', lambda w: req('GET', '/api/products'), conditional=True),
+        Scenario('GET /api/products?ids=', lambda w: req('GET', f"/api/products?ids={w.pick_many('products', 50)}")),
+        Scenario('GET /api/products/<id>', lambda w: req('GET', f"/api/products/{w.pick('products')}")),
+        Scenario('GET /api/products/search', lambda w: req('GET', f'/api/products/search?q={w.product_search_term()}')),
+        Scenario('POST /api/products', lambda w: req('POST', '/api/products', json=w.product())),
+        Scenario('POST /api/products (bulk)', lambda w: req('POST', '/api/products', json=[w.product() for _ in range(100)])),
+        Scenario('POST /api/products?upsert=1', lambda w: req('POST', '/api/products?upsert=1', json=[w.product(w.pick('products')) for _ in range(100)])),
+        Scenario('PUT /api/products/<id>', lambda w: (lambda pid: req('PUT', f'/api/products/{pid}', json=w.product(pid)))(w.pick('products'))),
+
+        Scenario('GET /api/quotes', lambda w: req('GET', '/api/quotes?limit=50')),
+        Scenario('GET /api/quotes (304)', lambda w: req('GET', '/api/quotes?limit=50'), conditional=True),
+        Scenario('GET /api/quotes?fields=items', lambda w: req('GET', '/api/quotes?limit=50&fields=id,quoteNumber,total,items')),
+        Scenario('GET /api/quotes?status=&dateFrom=', lambda w: req('GET', f'/api/quotes?limit=50&status=accepted&{w.date_range()}')),
+        Scenario('GET /api/quotes?customerId=', lambda w: req('GET', f"/api/quotes?customerId={w.pick('customers')}")),
+        Scenario('GET /api/quotes?productId=', lambda w: req('GET', f"/api/quotes?productId={w.pick('products')}")),
+        Scenario('GET /api/quotes?q=', lambda w: req('GET', f'/api/quotes?q={w.search_term()}'), cost=4),
+        Scenario('GET /api/quotes?ids=', lambda w: req('GET', f"/api/quotes?ids={w.pick_many('quotes', 50)}")),
+        Scenario('GET /api/quotes/<id>', lambda w: req('GET', f"/api/quotes/{w.pick('quotes')}")),
+        Scenario('POST /api/quotes', lambda w: req('POST', '/api/quotes', json=dict(w.quote(), allocateNumber=True))),
+        Scenario('POST /api/quotes (bulk)', lambda w: req('POST', '/api/quotes', json=[w.quote() for _ in range(20)])),
+        Scenario('PUT /api/quotes/<id>', lambda w: req('PUT', f"/api/quotes/{w.pick('quotes')}", json=w.quote())),
+        Scenario('PUT /api/quotes/<id> (status)', lambda w: req('PUT', f"/api/quotes/{w.pick('quotes')}", json={'status': w.rng.choice(STATUSES)})),
+        Scenario('GET /api/quote-number', lambda w: req('GET', '/api/quote-number')),
+        Scenario('POST /api/quote-number', lambda w: req('POST', '/api/quote-number')),
+
+        Scenario('GET /api/stats', lambda w: req('GET', '/api/stats')),
+        Scenario('GET /api/price-history', lambda w: req('GET', f"/api/price-history?productId={w.pick('products')}")),
+        Scenario('GET /api/price-history/summary', lambda w: req(
+            'GET', f"/api/price-history/summary?productId={w.pick('products')}&customerId={w.pick('customers')}&perCustomer=1")),
+        Scenario('GET /api/price-history/summary?productIds=', lambda w: req(
+            'GET', f"/api/price-history/summary?productIds={w.pick_many('products', 20)}&customerId={w.pick('customers')}")),
+        Scenario('POST /api/batch', lambda w: req('POST', '/api/batch', json={'requests': [
+            f"customers/{w.pick('customers')}", f"products/{w.pick('products')}", f"quotes/{w.pick('quotes')}",
+            f"customers?ids={w.pick_many('customers', 20)}", f"price-history?productId={w.pick('products')}",
+            f"price-history/summary?productId={w.pick('products')}&customerId={w.pick('customers')}",
+        ]})),
+        Scenario('GET /api/changes', lambda w: req('GET', '/api/changes'), cost=4),
+        Scenario('GET /api/changes?since=', lambda w: req('GET', f'/api/changes?since={max(0, w.latest_version - 100)}')),
+
+        Scenario('GET /api/export/customers', lambda w: req('GET', '/api/export/customers'), cost=20),
+        Scenario('GET /api/export/products?format=ndjson', lambda w: req('GET', '/api/export/products?format=ndjson'), cost=10),
+        Scenario('GET /api/export/quotes?gzip=1', lambda w: req('GET', f'/api/export/quotes?format=ndjson&gzip=1&{w.date_range()}'), cost=10),
+        Scenario('GET /api/export/price-history', lambda w: req('GET', f'/api/export/price-history?{w.date_range()}'), cost=10),
+
+        Scenario('POST /api/scrape-product', lambda w: req('POST', '/api/scrape-product', json={'url': w.stub_page()})),
+        Scenario('POST /api/scrape-products', lambda w: req('POST', '/api/scrape-products', json={'urls': [w.stub_page() for _ in range(10)]}), cost=4),
+        Scenario('GET /api/proxy-image', lambda w: req('GET', f'/api/proxy-image?url={w.stub_url}/img/cached.png')),
+        Scenario('GET /api/proxy-image (miss)', lambda w: req('GET', f'/api/proxy-image?url={w.stub_url}/img/{w.serial()}.png&w=80')),
+
+        Scenario('DELETE /api/customers/<id>', lambda w: req('DELETE', f"/api/customers/{w.deletable('customers')}")),
+        Scenario('DELETE /api/products/<id>', lambda w: req('DELETE', f"/api/products/{w.deletable('products')}")),
+        Scenario('DELETE /api/quotes/<id>', lambda w: req('DELETE', f"/api/quotes/{w.deletable('quotes')}")),
+        Scenario('GET /logout', lambda w: req('GET', '/logout')),
+    ]
+
+
+class StubSupplier(BaseHTTPRequestHandler):
+    """Offline stand-in for a supplier site: product pages and images"""
+
+    def do_GET(self):
+        if self.path.startswith('/img/'):
+            body, content_type = STUB_IMAGE, 'image/png'
+        else:
+            body = (
+                '<html><head><title>Hikvision - DS-2CD1043 - Kamera</title>'
+                '<meta property="og:image" content="/img/cam.png">'
+                '<meta name="description" content="4MP IP kamera"></head><body>' + 'x' * 20000 + '</body></html>'
+            ).encode('utf-8')
+            content_type = 'text/html; charset=utf-8'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# --- transports ---
+
+class ClientTransport:
+    """In-process requests through the Flask test client"""
+
+    def __init__(self, app, login_form):
+        self.client = app.test_client()
+        self.client.post('/login', data=login_form)
+
+    def send(self, r):
+        kwargs = {'headers': r.get('headers')}
+        if 'json' in r:
+            kwargs['json'] = r['json']
+        if 'form' in r:
+            kwargs['data'] = r['form']
+        if 'upload' in r:
+            name, body = r['upload']
+            kwargs['data'] = {'file': (io.BytesIO(body), name)}
+        response = self.client.open(r['path'], method=r['method'], **kwargs)
+        body = response.get_data()
+        response.close()
+        return response.status_code, len(body), response.headers.get('ETag')
+
+
+class HttpTransport:
+    """Requests over HTTP, one logged-in session per client thread"""
+
+    def __init__(self, base_url, login_form):
+        self.base_url = base_url
+        self.login_form = login_form
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.post(self.base_url + '/login', data=self.login_form, allow_redirects=False)
+        return session
+
+    def send(self, r):
+        kwargs = {'headers': r.get('headers'), 'json': r.get('json'), 'data': r.get('form')}
+        if 'upload' in r:
+            kwargs['files'] = {'file': r['upload']}
+        response = self._session().request(r['method'], self.base_url + r['path'], allow_redirects=False, timeout=300, **kwargs)
+        return response.status_code, len(response.content), response.headers.get('ETag')
+
+
+# --- measurement ---
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, wall):
+    latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+    errors = sum(1 for _, status, _ in samples if status == 0 or status >= 400)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'p50': round(percentile(latencies, 0.50), 3),
+        'p95': round(percentile(latencies, 0.95), 3),
+        'p99': round(percentile(latencies, 0.99), 3),
+        'mean': round(sum(latencies) / len(latencies), 3),
+        'max': round(latencies[-1], 3),
+        'throughput': round(len(samples) / wall, 1) if wall else None,
+        'bytes': sum(size for _, _, size in samples) // len(samples),
+    }
+
+
+def timed_send(transport, r):
+    start = perf_counter()
+    try:
+        status, size, _ = transport.send(r)
+    except requests.RequestException:
+        status, size = 0, 0
+    return perf_counter() - start, status, size
+
+
+def run_scenario(transport, scenario, workload, count, warmup, concurrency):
+    # Requests are built up front so the sequence is the same however they are dispatched
+    batch = [scenario.build(workload) for _ in range(warmup + count)]
+    if scenario.conditional:
+        etag = transport.send(batch[0])[2]
+        for r in batch:
+            r['headers'] = dict(r.get('headers') or {}, **({'If-None-Match': etag} if etag else {}))
+    for r in batch[:warmup]:
+        transport.send(r)
+
+    batch = batch[warmup:]
+    start = perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(lambda r: timed_send(transport, r), batch))
+    else:
+        samples = [timed_send(transport, r) for r in batch]
+    return summarize(samples, perf_counter() - start)
+
+
+def run_mode(label, transport, routes, workload, args, concurrency):
+    print(f'\n{label}')
+    results = {}
+    for scenario in routes:
+        count = max(3, args.requests // scenario.cost)
+        warmup = min(args.warmup, count)
+        stats = run_scenario(transport, scenario, workload, count, warmup, concurrency)
+        results[scenario.name] = stats
+        flag = f"  {stats['errors']} errors" if stats['errors'] else ''
+        print(f"  {scenario.name:<48} p50 {stats['p50']:>9.2f}  p95 {stats['p95']:>9.2f}  p99 {stats['p99']:>9.2f} ms"
+              f"  {stats['throughput']:>8.1f} req/s{flag}")
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(env, workers=None, threads=None, timeout=120):
+    """gunicorn with the production settings (gunicorn.conf.py), optionally with other worker/thread counts"""
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}', '--timeout', '300', '--log-level', 'warning']
+    if workers:
+        command += ['--workers', str(workers)]
+    if threads:
+        command += ['--threads', str(threads)]
+    command.append('web:app')
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {process.returncode}')
+        try:
+            if requests.get(base_url + '/login', timeout=1).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def latest_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT COALESCE(MAX(version), 0) FROM table_stats').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    volumes = scaled_volumes(args.scale, customers=args.customers, products=args.products,
+                             quotes=args.quotes, priceHistory=args.price_history)
+    seeded = seed_path(volumes, args.seed)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    client_db = os.path.join(DATA_DIR, 'run-client.db')
+    # web reads these at import time; the client run uses its own copy of the seeded data
+    os.environ['TEKLIF_DB'] = client_db
+    os.environ['IMAGE_CACHE_DIR'] = os.path.join(DATA_DIR, 'image_cache-client')
+    import web
+
+    if not os.path.exists(seeded):
+        print(f'Seeding {seeded}')
+        seed(seeded, volumes, args.seed)
+
+    pattern = re.compile(args.routes) if args.routes else None
+    routes = [s for s in scenarios(web) if pattern is None or pattern.search(s.name)]
+    login_form = dict(zip(('username', 'password'), next(iter(web.VALID_USERS.items()))))
+    # Each mode runs on its own copy, so one set of ids to delete is enough
+    reserve = args.requests + args.warmup
+
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), StubSupplier)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f'http://127.0.0.1:{stub.server_port}'
+
+    def workload():
+        # Same parameters in every mode
+        asset = (web.asset_manifest or {}).get('js/app.js')
+        return Workload(volumes, latest_version(seeded), asset_path=f'/assets/{asset}' if asset else '/js/app.js',
+                        stub_url=stub_url, reserve=reserve, seed=args.seed)
+
+    results = {
+        'createdAt': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'volumes': volumes,
+        'seed': args.seed,
+        'metrics': os.environ.get('TEKLIF_METRICS', '1') != '0',
+        'modes': {},
+    }
+    try:
+        if args.mode in ('client', 'both'):
+            fresh_copy(seeded, client_db)
+            # A cached seed can predate schema changes; gunicorn applies them when it imports web
+            web.init_db(client_db)
+            transport = ClientTransport(web.app, login_form)
+            results['modes']['client'] = {
+                'config': {'concurrency': 1},
+                'routes': run_mode('Flask test client', transport, routes, workload(), args, 1),
+            }
+
+        if args.mode in ('gunicorn', 'both'):
+            gunicorn_db = os.path.join(DATA_DIR, 'run-gunicorn.db')
+            fresh_copy(seeded, gunicorn_db)
+            env = dict(os.environ, TEKLIF_DB=gunicorn_db, IMAGE_CACHE_DIR=os.path.join(DATA_DIR, 'image_cache-gunicorn'))
+            process, base_url = start_gunicorn(env, args.workers, args.threads)
+            try:
+                transport = HttpTransport(base_url, login_form)
+                results['modes']['gunicorn'] = {
+                    'config': {'workers': args.workers, 'threads': args.threads, 'concurrency': args.concurrency},
+                    'routes': run_mode(f"gunicorn ({args.workers or 'default'} workers, {args.threads or 'default'} threads, "
+                                       f'{args.concurrency} clients)',
+                                       transport, routes, workload(), args, args.concurrency),
+                }
+            finally:
+                # Quick shutdown: a graceful one waits out the clients' idle keep-alive connections
+                process.send_signal(signal.SIGINT)
+                process.wait(30)
+    finally:
+        stub.shutdown()
+
+    output = args.output or os.path.join(DATA_DIR, f"results-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f'\nResults written to {output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        return 1 if compare(results, baseline, args.threshold, args.min_delta_ms) else 0
+    return 0
+
+
+# --- comparison ---
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD, min_delta_ms=MIN_DELTA_MS):
+    """Print the routes whose latency moved beyond the threshold; returns the regressions"""
+    if current.get('volumes') != baseline.get('volumes'):
+        print(f"Warning: volumes differ (baseline {baseline.get('volumes')}, current {current.get('volumes')})")
+
+    regressions = []
+    print(f"\nCompared with baseline {baseline.get('commit') or ''} ({baseline.get('createdAt')}), "
+          f'threshold +{threshold:.0%} and +{min_delta_ms} ms')
+    for mode, results in current.get('modes', {}).items():
+        base_routes = baseline.get('modes', {}).get(mode, {}).get('routes', {})
+        for route, stats in results['routes'].items():
+            base = base_routes.get(route)
+            if base is None:
+                continue
+            for key in COMPARED_PERCENTILES:
+                before, after = base[key], stats[key]
+                delta = after - before
+                change = delta / before if before else 0
+                if delta >= min_delta_ms and change > threshold:
+                    regressions.append((mode, route, key, before, after))
+                    print(f'  REGRESSION {mode:<9} {route:<48} {key} {before:.2f} -> {after:.2f} ms ({change:+.0%})')
+                elif -delta >= min_delta_ms and -change > threshold:
+                    print(f'  improved   {mode:<9} {route:<48} {key} {before:.2f} -> {after:.2f} ms ({change:+.0%})')
+            if stats['errors'] > base.get('errors', 0):
+                regressions.append((mode, route, 'errors', base.get('errors', 0), stats['errors']))
+                print(f"  REGRESSION {mode:<9} {route:<48} errors {base.get('errors', 0)} -> {stats['errors']}")
+    if not regressions:
+        print('  No regressions')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed synthetic data and benchmark every route')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_volume_args(p):
+        p.add_argument('--scale', type=float, default=1.0, help='multiplies all default volumes')
+        p.add_argument('--customers', type=int)
+        p.add_argument('--products', type=int)
+        p.add_argument('--quotes', type=int)
+        p.add_argument('--price-history', type=int)
+        p.add_argument('--seed', type=int, default=SEED)
+
+    p = commands.add_parser('seed', help='create the seeded database for a set of volumes')
+    add_volume_args(p)
+
+    p = commands.add_parser('run', help='benchmark every route and write the results as JSON')
+    add_volume_args(p)
+    p.add_argument('--mode', choices=('client', 'gunicorn', 'both'), default='both')
+    p.add_argument('--requests', type=int, default=REQUESTS_PER_ROUTE, help='timed requests per route')
+    p.add_argument('--warmup', type=int, default=WARMUP_REQUESTS)
+    p.add_argument('--concurrency', type=int, default=CONCURRENCY, help='client threads against gunicorn')
+    p.add_argument('--workers', type=int, help='default: gunicorn.conf.py')
+    p.add_argument('--threads', type=int, help='default: gunicorn.conf.py')
+    p.add_argument('--routes', help='only routes whose name matches this regex')
+    p.add_argument('--output')
+    p.add_argument('--baseline', help='results file to compare against; exits 1 on a regression')
+    p.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    p.add_argument('--min-delta-ms', type=float, default=MIN_DELTA_MS)
+
+    p = commands.add_parser('compare', help='compare two results files')
+    p.add_argument('results')
+    p.add_argument('baseline')
+    p.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    p.add_argument('--min-delta-ms', type=float, default=MIN_DELTA_MS)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'seed':
+        volumes = scaled_volumes(args.scale, customers=args.customers, products=args.products,
+                                 quotes=args.quotes, priceHistory=args.price_history)
+        path = seed_path(volumes, args.seed)
+        if os.path.exists(path):
+            print(f'{path} already exists')
+            return 0
+        os.makedirs(DATA_DIR, exist_ok=True)
+        # Importing web creates its database; point it at the file being seeded
+        os.environ['TEKLIF_DB'] = path + '.tmp'
+        print(f'Seeding {path}')
+        seed(path, volumes, args.seed)
+        return 0
+
+    if args.command == 'run':
+        return run(args)
+
+    with open(args.results, encoding='utf-8') as f:
+        current = json.load(f)
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    return 1 if compare(current, baseline, args.threshold, args.min_delta_ms) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
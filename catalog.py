@@ -0,0 +1,182 @@
+"""
+In-process cache of the product catalog.
+
+Each worker process keeps one snapshot of the products table: the rows by id
+and by code, and, once the full list has been asked for, its encoded JSON. A
+snapshot is tagged with the products version in table_stats, which the change
+triggers bump on every write, whichever worker makes it.
+
+get() brings the snapshot up to date when the version has moved. Only the rows
+stamped with a newer version and the newer deleted_rows tombstones are read,
+so a product edit costs one indexed lookup, not a reload of the catalog; the
+JSON of the full list is encoded again only when it is next asked for.
+current() never refreshes: single-row lookups use it and go to SQLite when the
+snapshot is behind.
+
+max_bytes bounds the memory held. A catalog whose rows do not fit is not kept
+(lookups return None and callers query SQLite as before), and is only loaded
+again once products have been deleted; the list body is kept only while rows
+and body fit together.
+"""
+import sys
+import threading
+
+from metrics import Counter
+
+# Rows read per fetchmany() while loading, so an oversize catalog is abandoned early
+LOAD_CHUNK_SIZE = 1000
+
+
+def _row_size(row):
+    # The keys are the column names, shared by every row
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+
+
+class CatalogSnapshot:
+    """One version of the catalog. The rows are shared between requests and must not be modified."""
+
+    def __init__(self, version, by_id, by_code, size):
+        self.version = version
+        self.by_id = by_id      # ascending ids; GET /api/products lists them newest first
+        self.by_code = by_code
+        self.size = size        # estimated bytes held by the rows
+        self.body = None        # encoded JSON of the full list, built on first use
+        self.body_too_large = False
+
+    @property
+    def rows(self):
+        return list(reversed(self.by_id.values()))
+
+
+class CatalogCache:
+    """Read-through cache of the products table; `encode` turns the row list into JSON bytes"""
+
+    def __init__(self, encode, max_bytes=64 * 1024 * 1024):
+        self.encode = encode
+        self.max_bytes = max_bytes
+        self._snapshot = None
+        self._oversize_rows = None  # products row count when the catalog last did not fit
+        self._lock = threading.Lock()
+        self.hits = Counter('teklif_catalog_cache_hits_total', 'Catalog lookups answered from memory')
+        self.misses = Counter('teklif_catalog_cache_misses_total',
+                              'Catalog lookups that refreshed the snapshot or found the catalog too large to keep')
+
+    @staticmethod
+    def _stats(conn):
+        row = conn.execute("SELECT version, rowCount FROM table_stats WHERE tableName = 'products'").fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def current(self, conn):
+        """The snapshot if it is up to date, else None; never refreshes"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._stats(conn)[0]:
+            self.hits.inc()
+            return snapshot
+        return None
+
+    def get(self, conn):
+        """The snapshot, brought up to date; None when the catalog is over max_bytes"""
+        version, row_count = self._stats(conn)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            self.hits.inc()
+            return snapshot
+        self.misses.inc()
+        if snapshot is None and self._oversize_rows is not None and row_count >= self._oversize_rows:
+            return None
+        with self._lock:
+            # Another thread may have refreshed it while this one waited
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version >= version:
+                return snapshot
+            # The version is read before the rows: a write in between makes the
+            # snapshot newer than its tag, and the next lookup applies it again
+            if snapshot is None:
+                snapshot = self._load(conn, version, row_count)
+            else:
+                snapshot = self._apply_changes(conn, snapshot, version)
+            if snapshot is None or snapshot.size > self.max_bytes:
+                self._snapshot = None
+                self._oversize_rows = row_count
+                return None
+            self._snapshot = snapshot
+            self._oversize_rows = None
+            return snapshot
+
+    def _load(self, conn, version, row_count):
+        by_id, by_code, size = {}, {}, 0
+        cursor = conn.execute('SELECT * FROM products ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(LOAD_CHUNK_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                row = dict(row)
+                by_id[row['id']] = row
+                if row['code'] is not None:
+                    by_code[row['code']] = row
+                size += _row_size(row)
+            if size > self.max_bytes:
+                cursor.close()
+                return None
+        return CatalogSnapshot(version, by_id, by_code, size)
+
+    @staticmethod
+    def _apply_changes(conn, snapshot, version):
+        """A new snapshot from `snapshot` and the rows written or deleted since its version"""
+        by_id, by_code, size = dict(snapshot.by_id), dict(snapshot.by_code), snapshot.size
+
+        def remove(product_id):
+            nonlocal size
+            old = by_id.pop(product_id, None)
+            if old is not None:
+                size -= _row_size(old)
+                if by_code.get(old['code']) is old:
+                    del by_code[old['code']]
+
+        for (product_id,) in conn.execute(
+                "SELECT rowId FROM deleted_rows WHERE tableName = 'products' AND version > ?", (snapshot.version,)):
+            remove(product_id)
+        in_order = True
+        last_id = next(reversed(by_id), 0)
+        # Sorted here: ORDER BY id would have SQLite walk the table instead of idx_products_version
+        changed = sorted((dict(row) for row in conn.execute('SELECT * FROM products WHERE version > ?', (snapshot.version,))),
+                         key=lambda row: row['id'])
+        for row in changed:
+            old = by_id.get(row['id'])
+            if old is not None:
+                size -= _row_size(old)
+                if by_code.get(old['code']) is old:
+                    del by_code[old['code']]
+            elif row['id'] < last_id:
+                in_order = False  # an explicit id below the newest one
+            by_id[row['id']] = row
+            if row['code'] is not None:
+                by_code[row['code']] = row
+            size += _row_size(row)
+        if not in_order:
+            by_id = dict(sorted(by_id.items()))
+        return CatalogSnapshot(version, by_id, by_code, size)
+
+    def body(self, snapshot):
+        """Encoded JSON of the snapshot's rows, newest first; None once it has not fit in max_bytes"""
+        if snapshot.body is not None or snapshot.body_too_large:
+            return snapshot.body
+        with self._lock:
+            if snapshot.body is None and not snapshot.body_too_large:
+                body = self.encode(snapshot.rows)
+                if snapshot.size + len(body) > self.max_bytes:
+                    # Served this once; later requests stream it from SQLite
+                    snapshot.body_too_large = True
+                    return body
+                snapshot.body = body
+            return snapshot.body
+
+    def render(self):
+        yield from self.hits.render()
+        yield from self.misses.render()
+        snapshot = self._snapshot
+        size = snapshot.size + len(snapshot.body or b'') if snapshot else 0
+        yield '# HELP teklif_catalog_cache_bytes Estimated memory held by the catalog snapshot'
+        yield '# TYPE teklif_catalog_cache_bytes gauge'
+        yield f'teklif_catalog_cache_bytes {size}'
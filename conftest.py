@@ -0,0 +1,48 @@
+"""
+Under pytest, test_api.py runs against the app served in-process on a scratch
+database; `python test_api.py` still targets a server at localhost:5000.
+"""
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+# Before web is imported: it opens and migrates TEKLIF_DB at import time
+DATA_DIR = tempfile.mkdtemp(prefix='teklif-test-')
+os.environ['TEKLIF_DB'] = os.path.join(DATA_DIR, 'test.db')
+os.environ['IMAGE_CACHE_DIR'] = os.path.join(DATA_DIR, 'image_cache')
+os.environ['JOB_FILES_DIR'] = os.path.join(DATA_DIR, 'job_files')
+
+import test_api  # noqa: E402
+
+
+@pytest.fixture(scope='session', autouse=True)
+def live_server():
+    import web
+
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    test_api.BASE_URL = f'http://127.0.0.1:{server.server_port}'
+    yield
+    server.shutdown()
+    web.job_queue.stop()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def cid():
+    return test_api.create_customer()
+
+
+@pytest.fixture
+def pid():
+    return test_api.create_product()
+
+
+@pytest.fixture
+def qid(cid, pid):
+    return test_api.create_quote(cid, pid)
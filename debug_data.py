@@ -3,7 +3,8 @@ import json
 
 BASE_URL = "http://localhost:5000/api"
 
-def check_endpoint(name, url):
+def check_endpoint(name, url, key=None):
+    # Paginated endpoints return {key: [...], ..., "next": cursor} instead of a bare list
     print(f"--- Checking {name} ---")
     try:
         r = requests.get(url)
@@ -11,7 +12,13 @@ def check_endpoint(name, url):
             print(f"❌ Error: {r.status_code}")
             return
         data = r.json()
-        print(f"Count: {len(data)}")
+        if key:
+            page = data
+            data = page[key]
+            total = f", total: {page['total']}" if 'total' in page else ''
+            print(f"Count: {len(data)} (first page{total}, more: {page.get('next') is not None})")
+        else:
+            print(f"Count: {len(data)}")
         if len(data) > 0:
             print("Sample Item Keys:")
             print(json.dumps(list(data[0].keys()), indent=2))
@@ -21,6 +28,6 @@ def check_endpoint(name, url):
         print(f"❌ Exception: {e}")
 
 if __name__ == "__main__":
-    check_endpoint("Customers", f"{BASE_URL}/customers")
+    check_endpoint("Customers", f"{BASE_URL}/customers", key="customers")
     check_endpoint("Products", f"{BASE_URL}/products")
-    check_endpoint("Quotes", f"{BASE_URL}/quotes")
+    check_endpoint("Quotes", f"{BASE_URL}/quotes", key="quotes")
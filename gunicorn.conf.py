@@ -0,0 +1,24 @@
+"""
+Production server settings: gunicorn --config gunicorn.conf.py web:app
+
+gthread workers serve requests from a thread pool, so a request waiting on a
+supplier site (scraping, the image proxy) holds one thread instead of a whole
+worker. web.py lets at most OUTBOUND_MAX_WAITING threads per worker wait on
+outbound fetches, so the remaining threads stay free for database routes.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class = 'gthread'
+# SQLite has one writer at a time: a few processes with many threads each
+# suits it better than many single-threaded processes
+workers = int(os.environ.get('WEB_CONCURRENCY', min(4, multiprocessing.cpu_count())))
+# Must stay above OUTBOUND_MAX_WAITING (default 16)
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+# Outbound fetches give up after OUTBOUND_DEADLINE (15 s); exports stream for longer
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
@@ -0,0 +1,350 @@
+"""
+On-disk cache for proxied product images.
+
+Originals are stored content-addressed (objects/ab/<sha256>) and looked up
+through a small per-URL index file. Thumbnails for the standard widths are
+generated on the first request for them, if Pillow is installed. The cache is
+capped in bytes, index files included, and evicts least recently used objects
+first; an original goes together with the index files that point at it.
+
+A download in progress is one _CacheWriter per URL; request threads follow()
+it to stream the bytes to their clients as they arrive.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are optional; originals are served without Pillow
+    Image = None
+
+# Thumbnail widths; a ?w= request is rounded up to the next one
+THUMBNAIL_WIDTHS = (80, 320)
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+
+class ImageTooLarge(Exception):
+    """The image is larger than MAX_IMAGE_BYTES"""
+
+
+class DownloadFailed(Exception):
+    """The download being followed was aborted or stalled"""
+
+
+class CachedImage:
+    def __init__(self, path, content_type, etag):
+        self.path = path
+        self.content_type = content_type
+        self.etag = etag
+
+
+class ImageCache:
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # computed lazily from disk
+        self._downloads = {}  # url -> _CacheWriter in progress
+        self._no_thumbnail = set()  # digests of originals Pillow cannot read
+        for subdir in ('objects', 'index', 'tmp'):
+            os.makedirs(os.path.join(self.root, subdir), exist_ok=True)
+
+    # --- paths ---
+
+    def _index_path(self, url):
+        return os.path.join(self.root, 'index', hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _object_path(self, digest, width=None):
+        name = digest if width is None else f'{digest}.w{width}'
+        return os.path.join(self.root, 'objects', digest[:2], name)
+
+    # --- lookup ---
+
+    @staticmethod
+    def thumbnail_width(width):
+        """Standard width to serve for a requested width, or None for the original"""
+        if not width or Image is None:
+            return None
+        for standard in THUMBNAIL_WIDTHS:
+            if width <= standard:
+                return standard
+        return None
+
+    def lookup(self, url, width=None):
+        """Cached original (or thumbnail) for `url`, or None on a miss"""
+        try:
+            with open(self._index_path(url)) as f:
+                digest, content_type = f.read().split(' ', 1)
+        except (OSError, ValueError):
+            return None
+
+        width = self.thumbnail_width(width)
+        if width is not None and digest not in self._no_thumbnail:
+            path = self._object_path(digest, width)
+            if os.path.exists(path):
+                self._touch(path)
+                return CachedImage(path, 'image/jpeg', f'{digest[:32]}-w{width}')
+            written = self._make_thumbnail(digest, width)
+            if written:
+                self._account(written)
+                return CachedImage(path, 'image/jpeg', f'{digest[:32]}-w{width}')
+            # Not a raster image, or the original is gone: fall back to the original
+
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            return None
+        self._touch(path)
+        return CachedImage(path, content_type, digest[:32])
+
+    def _touch(self, path):
+        # mtime doubles as the LRU clock
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    # --- store ---
+
+    def download(self, url):
+        """(writer, created): the download of `url` in progress, or a new one the caller must run"""
+        with self._lock:
+            writer = self._downloads.get(url)
+            if writer is not None:
+                return writer, False
+            writer = self._downloads[url] = _CacheWriter(self, url)
+            return writer, True
+
+    def _forget(self, writer):
+        with self._lock:
+            if self._downloads.get(writer.url) is writer:
+                del self._downloads[writer.url]
+
+    def store(self, url, content_type, tmp_path, digest, size):
+        """Move a fully downloaded file into the store and index it under `url`"""
+        path = self._object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+            added = 0
+        else:
+            os.replace(tmp_path, path)
+            added = size
+
+        index_path = self._index_path(url)
+        try:
+            added -= os.path.getsize(index_path)
+        except OSError:
+            pass
+        entry = f'{digest} {content_type}'.encode('utf-8')
+        fd, tmp_index = tempfile.mkstemp(dir=os.path.dirname(index_path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(entry)
+        os.replace(tmp_index, index_path)
+
+        self._account(added + len(entry))
+
+    def _make_thumbnail(self, digest, width):
+        """Write the `width` thumbnail of a stored original; its size in bytes, or 0 if there is none"""
+        try:
+            with Image.open(self._object_path(digest)) as original:
+                original.load()
+                image = original.convert('RGB')
+        except FileNotFoundError:
+            return 0
+        except Exception:
+            self._no_thumbnail.add(digest)
+            return 0
+        image.thumbnail((width, width * 4))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=82, optimize=True)
+        # Written aside and moved in, so a concurrent lookup never serves half a file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(buffer.getvalue())
+        thumb_path = self._object_path(digest, width)
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        os.replace(tmp_path, thumb_path)
+        return buffer.tell()
+
+    # --- eviction ---
+
+    def _disk_usage(self):
+        total = 0
+        for subdir in ('objects', 'index'):
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, subdir)):
+                for name in filenames:
+                    try:
+                        total += os.path.getsize(os.path.join(dirpath, name))
+                    except OSError:
+                        pass
+        return total
+
+    def _account(self, added):
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._size = self._evict(int(self.max_bytes * 0.9))
+
+    def _evict(self, target):
+        """Delete least recently used objects, and the index files of evicted originals, until usage is under `target` bytes"""
+        files = []
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, 'objects')):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+
+        index = {}  # digest -> [(size, path)] of the index files pointing at it
+        index_dir = os.path.join(self.root, 'index')
+        for name in os.listdir(index_dir):
+            path = os.path.join(index_dir, name)
+            try:
+                with open(path, 'rb') as f:
+                    entry = f.read()
+            except OSError:
+                continue
+            index.setdefault(entry.split(b' ', 1)[0].decode('ascii', 'replace'), []).append((len(entry), path))
+            total += len(entry)
+
+        def unlink(path):
+            try:
+                os.unlink(path)
+                return True
+            except OSError:
+                return False
+
+        # Index files whose original is already gone only produce misses
+        originals = {os.path.basename(path) for _, _, path in files}
+        for digest in set(index) - originals:
+            for size, path in index.pop(digest):
+                if unlink(path):
+                    total -= size
+
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            if unlink(path):
+                total -= size
+            # Thumbnails are named <digest>.w<width>; an original goes with its index files
+            for index_size, index_path in index.pop(os.path.basename(path), ()):
+                if unlink(index_path):
+                    total -= index_size
+        return total
+
+
+class _CacheWriter:
+    """Collects a download into a temp file while hashing it; committed only if complete.
+
+    The fetching thread calls start(), write() for each chunk and then commit()
+    or abort(); any number of request threads may wait_started() and follow().
+    """
+
+    def __init__(self, cache, url):
+        self.cache = cache
+        self.url = url
+        self.content_type = None
+        self.size = 0
+        self.done = False
+        self.error = None
+        self._hash = hashlib.sha256()
+        self._cond = threading.Condition()
+        # Outside objects/ so eviction never removes a download in progress
+        fd, self.path = tempfile.mkstemp(dir=os.path.join(cache.root, 'tmp'))
+        self._file = os.fdopen(fd, 'wb')
+
+    def start(self, content_type, length=None):
+        """The upstream headers arrived; raises ImageTooLarge for a declared length over the cap"""
+        if length is not None and length > MAX_IMAGE_BYTES:
+            raise ImageTooLarge('Image too large')
+        with self._cond:
+            self.content_type = content_type
+            self._cond.notify_all()
+
+    def write(self, chunk):
+        """Append a chunk; raises ImageTooLarge as soon as the cap is passed"""
+        if self.size + len(chunk) > MAX_IMAGE_BYTES:
+            raise ImageTooLarge('Image too large')
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        # Flushed so followers can read it
+        self._file.flush()
+        with self._cond:
+            self.size += len(chunk)
+            self._cond.notify_all()
+
+    def commit(self):
+        self._file.close()
+        # Under the condition: a follower opens self.path either before the move or after it.
+        # Only the move and the index write happen here; thumbnails are made on first request.
+        with self._cond:
+            tmp_path = self.path
+            self.path = self.cache._object_path(self._hash.hexdigest())
+            self.cache.store(self.url, self.content_type, tmp_path, self._hash.hexdigest(), self.size)
+            self.done = True
+            self._cond.notify_all()
+        self.cache._forget(self)
+
+    def abort(self, error='Failed to fetch image'):
+        self._file.close()
+        with self._cond:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+        self.cache._forget(self)
+
+    # --- followers ---
+
+    def wait_started(self, timeout):
+        """True once the upstream response is known to be an image; False if it failed or timed out"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.content_type is not None or self.done, timeout)
+            return self.content_type is not None and self.error is None
+
+    def wait_done(self, timeout):
+        """True once the image is stored; False if it failed or timed out"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.done, timeout)
+            return self.done and self.error is None
+
+    def follow(self, chunk_size, timeout):
+        """Yield the image's bytes as they are written.
+
+        Raises DownloadFailed if the download is aborted, or writes nothing for
+        `timeout` seconds, so the client sees a broken response, not a short image.
+        """
+        with self._cond:
+            if self.error is not None:
+                raise DownloadFailed(self.error)
+            f = open(self.path, 'rb')
+        with f:
+            sent = 0
+            while True:
+                with self._cond:
+                    if not self._cond.wait_for(lambda: self.size > sent or self.done, timeout):
+                        raise DownloadFailed('Image download stalled')
+                    size, done, error = self.size, self.done, self.error
+                while sent < size:
+                    chunk = f.read(min(chunk_size, size - sent))
+                    if not chunk:
+                        # Unlinked by abort() after a truncated write
+                        raise DownloadFailed(error or 'Image download was aborted')
+                    sent += len(chunk)
+                    yield chunk
+                if error is not None:
+                    raise DownloadFailed(error)
+                if done:
+                    return
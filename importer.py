@@ -0,0 +1,331 @@
+"""
+Bulk customer import from .xlsx and .csv files.
+
+Rows are streamed: xlsx sheets are read with iterparse straight out of the zip
+archive, CSV with the csv module, so memory stays flat however large the file.
+Rows are deduplicated on phone number and e-mail (or on the name, for rows with
+neither) against the file and the existing customers, and inserted in batches
+of executemany, one transaction per batch.
+
+    python importer.py cariler.xlsx [--columns name,phone] [--batch-size 5000]
+"""
+import argparse
+import csv
+import io
+import os
+import posixpath
+import re
+import sys
+import zipfile
+from datetime import datetime
+from xml.etree.ElementTree import iterparse
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+FIELDS = ('name', 'company', 'email', 'phone', 'address')
+# cariler.xlsx has no header row: the name, then the phone number
+DEFAULT_COLUMNS = ('name', 'phone')
+COLUMN_ALIASES = {
+    'name': ('name', 'ad', 'adi', 'ad soyad', 'adi soyadi', 'cari', 'cari adi', 'unvan', 'cari unvani', 'musteri', 'yetkili'),
+    'company': ('company', 'firma', 'firma adi', 'sirket'),
+    'email': ('email', 'e-mail', 'e-posta', 'eposta', 'mail'),
+    'phone': ('phone', 'telefon', 'tel', 'gsm', 'cep', 'cep telefonu'),
+    'address': ('address', 'adres'),
+}
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+NON_DIGITS = re.compile(r'\D')
+
+# Rows are staged in a temp table and moved with one INSERT ... SELECT per batch:
+# FTS5 flushes its pending index data at every statement, so a per-row
+# executemany straight into customers (whose trigger feeds customers_fts) is
+# several times slower.
+CREATE_STAGING = '''
+    CREATE TEMP TABLE IF NOT EXISTS customer_import (
+        name TEXT, company TEXT, email TEXT, phone TEXT, address TEXT, createdAt TEXT
+    )
+'''
+INSERT_STAGING = 'INSERT INTO temp.customer_import VALUES (?, ?, ?, ?, ?, ?)'
+MOVE_STAGING = '''
+    INSERT INTO customers (name, company, email, phone, address, createdAt)
+    SELECT name, company, email, phone, address, createdAt FROM temp.customer_import
+'''
+
+
+class ImportFormatError(Exception):
+    """The uploaded file is not a readable xlsx/csv file"""
+
+
+# --- readers ---
+
+def _column_index(ref):
+    # 'B12' -> 1
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - 64
+    return index - 1
+
+
+def _first_sheet_path(archive):
+    """Archive path of the workbook's first sheet, resolved through the relationships"""
+    workbook = archive.read('xl/workbook.xml')
+    rels = archive.read('xl/_rels/workbook.xml.rels')
+    targets = {}
+    for _, el in iterparse(io.BytesIO(rels)):
+        if el.tag == PKG_REL_NS + 'Relationship':
+            targets[el.get('Id')] = el.get('Target')
+    for _, el in iterparse(io.BytesIO(workbook)):
+        if el.tag == MAIN_NS + 'sheet':
+            target = targets[el.get(REL_NS + 'id')]
+            return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+    raise ImportFormatError('Workbook has no sheets')
+
+
+def _shared_strings(archive):
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as f:
+        for _, el in iterparse(f):
+            if el.tag == MAIN_NS + 'si':
+                # Rich text splits a string into several runs
+                strings.append(''.join(t.text or '' for t in el.iter(MAIN_NS + 't')))
+                el.clear()
+    return strings
+
+
+def _cell_value(cell, strings):
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(MAIN_NS + 't'))
+    value = cell.findtext(MAIN_NS + 'v')
+    if value is None:
+        return None
+    if kind == 's':
+        return strings[int(value)]
+    if kind in ('str', 'b', 'e'):
+        return value
+    # Numbers: phone numbers typed as numbers come back as '5326538556' or '5326538556.0'
+    return value[:-2] if value.endswith('.0') else value
+
+
+def read_xlsx(file):
+    """Yield each row of the first sheet as a list of cell values"""
+    try:
+        archive = zipfile.ZipFile(file)
+        strings = _shared_strings(archive)
+        sheet = archive.open(_first_sheet_path(archive))
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ImportFormatError(f'Not a valid xlsx file: {e}') from e
+
+    with sheet:
+        sheet_data = None
+        for event, el in iterparse(sheet, events=('start', 'end')):
+            if event == 'start':
+                if el.tag == MAIN_NS + 'sheetData':
+                    sheet_data = el
+                continue
+            if el.tag != MAIN_NS + 'row':
+                continue
+            row = []
+            for cell in el.iter(MAIN_NS + 'c'):
+                index = _column_index(cell.get('r', '')) if cell.get('r') else len(row)
+                row.extend([None] * (index - len(row)))
+                row.append(_cell_value(cell, strings))
+            yield row
+            # Drop parsed rows so the tree never grows beyond one row
+            sheet_data.clear()
+
+
+def read_csv(file):
+    """Yield each CSV row; the delimiter (',', ';' or tab) is sniffed from the start"""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(_chain(sample, text), dialect)
+
+
+def _chain(sample, text):
+    # csv.reader needs the sniffed sample back in front of the rest of the stream
+    yield from io.StringIO(sample + text.readline())
+    yield from text
+
+
+def read_rows(file, filename):
+    """Row iterator for an .xlsx or .csv file object, chosen by file name"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        return read_xlsx(file)
+    if ext in ('.csv', '.txt'):
+        return read_csv(file)
+    raise ImportFormatError('Unsupported file type, expected .xlsx or .csv')
+
+
+# --- mapping and normalization ---
+
+def _header_key(value):
+    value = str(value or '').strip().replace('İ', 'i').replace('I', 'i').lower()
+    return value.replace('ı', 'i').replace('ş', 's').replace('ç', 'c').replace('ğ', 'g').replace('ü', 'u').replace('ö', 'o')
+
+
+HEADER_FIELDS = {_header_key(alias): field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+
+def resolve_columns(first_row, columns=None):
+    """Field name (or None) per column, and whether `first_row` is a header row"""
+    header = [HEADER_FIELDS.get(_header_key(value)) for value in first_row]
+    is_header = any(header)
+    if columns:
+        unknown = [c for c in columns if c and c not in FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+        return [c or None for c in columns], is_header
+    if is_header:
+        return header, True
+    return list(DEFAULT_COLUMNS), False
+
+
+def clean_text(value):
+    if value is None:
+        return None
+    # Collapses runs of whitespace, including the non-breaking spaces Excel exports are full of
+    return ' '.join(str(value).split()) or None
+
+
+def phone_key(phone):
+    """Comparable form of a phone number (national digits), or None if too short to trust"""
+    digits = NON_DIGITS.sub('', phone or '')
+    if len(digits) == 12 and digits.startswith('90'):
+        digits = digits[2:]
+    digits = digits.lstrip('0')
+    return digits if len(digits) >= 7 else None
+
+
+def dedupe_keys(name, phone, email):
+    keys = []
+    phone = phone_key(phone)
+    if phone:
+        keys.append('p:' + phone)
+    if email:
+        keys.append('e:' + email.lower())
+    if not keys and name:
+        # Nothing to contact them by: only an identical name marks a duplicate
+        keys.append('n:' + ' '.join(name.split()).casefold())
+    return keys
+
+
+# --- import ---
+
+def import_customers(conn, rows, columns=None, batch_size=BATCH_SIZE, progress=None):
+    """Insert customers from `rows` (lists of cell values); returns a summary dict.
+
+    `progress(processed, inserted)` is called after every committed batch.
+    """
+    result = {'processed': 0, 'inserted': 0, 'duplicates': 0, 'errorCount': 0, 'errors': []}
+
+    seen = set()
+    for name, phone, email in conn.execute('SELECT name, phone, email FROM customers'):
+        seen.update(dedupe_keys(name, phone, (email or '').strip() or None))
+
+    def error(row_number, message):
+        result['errorCount'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            result['errors'].append({'row': row_number, 'error': message})
+
+    conn.execute(CREATE_STAGING)
+
+    def flush(batch):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(INSERT_STAGING, batch)
+            conn.execute(MOVE_STAGING)
+            conn.execute('DELETE FROM temp.customer_import')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        result['inserted'] += len(batch)
+        batch.clear()
+        if progress:
+            progress(result['processed'], result['inserted'])
+
+    created_at = datetime.now().isoformat()
+    mapping = None
+    batch = []
+    for row_number, row in enumerate(rows, start=1):
+        if mapping is None:
+            mapping, is_header = resolve_columns(row, columns)
+            result['columns'] = [field for field in mapping if field]
+            if is_header:
+                continue
+        if not any(clean_text(value) for value in row):
+            continue  # blank line
+        result['processed'] += 1
+
+        record = dict.fromkeys(FIELDS)
+        for field, value in zip(mapping, row):
+            if field:
+                record[field] = clean_text(value)
+        if record['phone'] and NON_DIGITS.sub('', record['phone']) in ('', '90'):
+            record['phone'] = None  # e.g. a bare '+90'
+        if not record['name']:
+            error(row_number, 'Missing name')
+            continue
+        if record['email'] and '@' not in record['email']:
+            error(row_number, f"Invalid e-mail: {record['email']}")
+            continue
+
+        keys = dedupe_keys(record['name'], record['phone'], record['email'])
+        if any(key in seen for key in keys):
+            result['duplicates'] += 1
+            continue
+        seen.update(keys)
+
+        batch.append((record['name'], record['company'], record['email'], record['phone'], record['address'], created_at))
+        if len(batch) >= batch_size:
+            flush(batch)
+    if batch:
+        flush(batch)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import customers from an .xlsx or .csv file')
+    parser.add_argument('file')
+    parser.add_argument('--columns', help=f"comma-separated field per column, e.g. name,phone (fields: {', '.join(FIELDS)}; leave empty to skip a column)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    import web  # opens the configured database and makes sure the schema exists
+
+    def report(processed, inserted):
+        print(f'\r{processed} rows read, {inserted} imported', end='', file=sys.stderr, flush=True)
+
+    columns = args.columns.split(',') if args.columns else None
+    conn = web.get_db_connection()
+    try:
+        with open(args.file, 'rb') as f:
+            result = import_customers(conn, read_rows(f, args.file), columns, args.batch_size, report)
+    except (ImportFormatError, ValueError) as e:
+        print(f'Import failed: {e}', file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    print(file=sys.stderr)
+    print(f"Imported {result['inserted']} of {result['processed']} rows "
+          f"({result['duplicates']} duplicates, {result['errorCount']} errors)")
+    for item in result['errors']:
+        print(f"  row {item['row']}: {item['error']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""
+Background jobs kept in the application's own SQLite database.
+
+Jobs are rows of the `jobs` table (created in web.init_db). Each process runs a
+JobQueue: a few worker threads that claim due jobs with a single
+UPDATE ... RETURNING, so any number of gunicorn workers can share the queue
+without a broker. A failed attempt is retried with exponential backoff until
+the job's max_attempts; a job whose process stopped sending heartbeats for
+`lease` seconds is put back in the queue. On shutdown the workers stop
+claiming and running jobs get a grace period; a handler that reports progress
+is interrupted at its next report and requeued without spending an attempt.
+"""
+import atexit
+import json
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class JobFailed(Exception):
+    """Raised by a handler for failures that retrying cannot fix"""
+
+
+class JobInterrupted(Exception):
+    """Raised from Job.progress() once the queue is shutting down; the job is requeued"""
+
+
+def _now_iso():
+    return datetime.now().isoformat()
+
+
+class Job:
+    """A claimed job, as seen by its handler"""
+
+    def __init__(self, queue, conn, row):
+        self.id = row['id']
+        self.kind = row['kind']
+        self.payload = json.loads(row['payload']) if row['payload'] else {}
+        self.attempt = row['attempts']
+        self.max_attempts = row['maxAttempts']
+        self.conn = conn
+        self._queue = queue
+
+    @property
+    def final_attempt(self):
+        return self.attempt >= self.max_attempts
+
+    @property
+    def stopping(self):
+        return self._queue.stopping
+
+    def progress(self, **values):
+        """Record progress, shown at /api/jobs/<id>; raises JobInterrupted once the queue is stopping"""
+        self._queue._execute(self.conn, 'UPDATE jobs SET progress = ?, heartbeatAt = ? WHERE id = ? AND lockedBy = ?',
+                             (json.dumps(values), time.time(), self.id, self._queue.worker_id))
+        if self.stopping:
+            raise JobInterrupted()
+
+
+class JobQueue:
+    """Worker threads running the registered handlers for jobs in the `jobs` table.
+
+    `connect` opens a database connection (one per worker thread, also handed
+    to the handlers as job.conn). start() is idempotent and restarts the
+    threads in a forked child, so it can be called from a request hook.
+    """
+
+    def __init__(self, connect, workers=2, poll_interval=1.0, lease=60, backoff=5, max_backoff=600,
+                 shutdown_timeout=20, retention_days=7):
+        self.connect = connect
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.shutdown_timeout = shutdown_timeout
+        self.retention_days = retention_days
+        self.logger = None
+        self._handlers = {}  # kind -> (handler, max_attempts)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self.worker_id = None
+
+    def register(self, kind, handler, max_attempts=3):
+        """Run `handler(job)` for jobs of `kind`; its return value is stored as the job's result"""
+        self._handlers[kind] = (handler, max_attempts)
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    # --- producers ---
+
+    def enqueue(self, conn, kind, payload=None, delay=0):
+        """Queue a job and commit; returns its id"""
+        if kind not in self._handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        cur = conn.execute('''
+            INSERT INTO jobs (kind, payload, maxAttempts, runAt, createdAt)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (kind, json.dumps(payload), self._handlers[kind][1], time.time() + delay, _now_iso()))
+        conn.commit()
+        with self._wakeup:
+            self._wakeup.notify()
+        return cur.lastrowid
+
+    @staticmethod
+    def get(conn, job_id):
+        """Status of a job as a dict, or None; the payload is left out"""
+        row = conn.execute('''
+            SELECT id, kind, status, progress, result, error, attempts, maxAttempts, runAt,
+                   createdAt, startedAt, finishedAt
+            FROM jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ('progress', 'result'):
+            job[key] = json.loads(job[key]) if job[key] else None
+        job['runAt'] = datetime.fromtimestamp(job['runAt']).isoformat() if job['status'] == 'queued' else None
+        return job
+
+    # --- lifecycle ---
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Threads do not survive a fork; a child starts its own
+            self._pid = os.getpid()
+            self.worker_id = f'{socket.gethostname()}:{self._pid}'
+            self._stopping.clear()
+            self._threads = [threading.Thread(target=self._work, name=f'job-worker-{n}', daemon=True)
+                             for n in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._maintain, name='job-maintenance', daemon=True))
+            for thread in self._threads:
+                thread.start()
+        # Daemon threads, so exiting never hangs on them; atexit runs first and lets jobs finish
+        atexit.register(self.stop)
+
+    def stop(self, timeout=None):
+        """Stop claiming jobs and wait for the running ones; those still running are requeued"""
+        with self._lock:
+            if self._pid != os.getpid() or self.stopping:
+                return
+            self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        deadline = time.monotonic() + (self.shutdown_timeout if timeout is None else timeout)
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        if any(thread.is_alive() for thread in self._threads):
+            conn = self.connect()
+            try:
+                self._execute(conn, '''
+                    UPDATE jobs SET status = 'queued', attempts = attempts - 1, lockedBy = NULL, runAt = ?
+                    WHERE status = 'running' AND lockedBy = ?
+                ''', (time.time(), self.worker_id))
+            finally:
+                conn.close()
+
+    # --- workers ---
+
+    def _work(self):
+        conn = self.connect()
+        try:
+            while not self.stopping:
+                try:
+                    row = self._claim(conn)
+                except Exception:
+                    self._log_exception('Claiming a job failed')
+                    row = None
+                if row is None:
+                    with self._wakeup:
+                        self._wakeup.wait(self.poll_interval)
+                    continue
+                self._run(conn, row)
+        finally:
+            conn.close()
+
+    def _claim(self, conn):
+        now = time.time()
+        kinds = list(self._handlers)
+        placeholders = ','.join('?' * len(kinds))
+        # A read first, so idle workers do not take the write lock every poll
+        due = conn.execute(f'''
+            SELECT 1 FROM jobs WHERE status = 'queued' AND runAt <= ? AND kind IN ({placeholders}) LIMIT 1
+        ''', [now] + kinds).fetchone()
+        if due is None:
+            return None
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(f'''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, lockedBy = ?, heartbeatAt = ?,
+                                startedAt = COALESCE(startedAt, ?)
+                WHERE id = (
+                    SELECT id FROM jobs WHERE status = 'queued' AND runAt <= ? AND kind IN ({placeholders})
+                    ORDER BY runAt, id LIMIT 1
+                )
+                RETURNING *
+            ''', [self.worker_id, now, _now_iso(), now] + kinds).fetchall()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return rows[0] if rows else None
+
+    def _run(self, conn, row):
+        job = Job(self, conn, row)
+        handler = self._handlers[job.kind][0]
+        try:
+            result = handler(job)
+        except JobInterrupted:
+            self._finish(conn, job, "status = 'queued', attempts = attempts - 1, runAt = ?", (time.time(),))
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            error = str(e) or type(e).__name__
+            if isinstance(e, JobFailed) or job.final_attempt:
+                if not isinstance(e, JobFailed):
+                    self._log_exception(f'Job {job.id} ({job.kind}) failed after {job.attempt} attempts')
+                self._finish(conn, job, "status = 'failed', error = ?, finishedAt = ?", (error, _now_iso()))
+            else:
+                delay = min(self.max_backoff, self.backoff * 2 ** (job.attempt - 1)) * random.uniform(0.75, 1.25)
+                self._finish(conn, job, "status = 'queued', error = ?, runAt = ?", (error, time.time() + delay))
+        else:
+            self._finish(conn, job, "status = 'succeeded', result = ?, error = NULL, finishedAt = ?",
+                         (json.dumps(result), _now_iso()))
+
+    def _finish(self, conn, job, assignments, params):
+        # lockedBy guards against a job that was reaped and claimed again meanwhile
+        try:
+            self._execute(conn, f'UPDATE jobs SET {assignments}, lockedBy = NULL WHERE id = ? AND lockedBy = ?',
+                          params + (job.id, self.worker_id))
+        except Exception:
+            self._log_exception(f'Recording the outcome of job {job.id} failed')
+
+    # --- heartbeats, expired leases and cleanup ---
+
+    def _maintain(self):
+        conn = self.connect()
+        try:
+            while not self._stopping.wait(self.lease / 3):
+                try:
+                    self._heartbeat(conn)
+                except Exception:
+                    self._log_exception('Job queue maintenance failed')
+        finally:
+            conn.close()
+
+    def _heartbeat(self, conn):
+        now = time.time()
+        self._execute(conn, "UPDATE jobs SET heartbeatAt = ? WHERE status = 'running' AND lockedBy = ?",
+                      (now, self.worker_id))
+        # Jobs of a process that died: back in the queue, unless that was their last attempt
+        self._execute(conn, '''
+            UPDATE jobs SET status = CASE WHEN attempts >= maxAttempts THEN 'failed' ELSE 'queued' END,
+                            error = 'Worker stopped responding', lockedBy = NULL, runAt = ?,
+                            finishedAt = CASE WHEN attempts >= maxAttempts THEN ? END
+            WHERE status = 'running' AND heartbeatAt < ?
+        ''', (now, _now_iso(), now - self.lease))
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        self._execute(conn, "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finishedAt < ?", (cutoff,))
+
+    @staticmethod
+    def _execute(conn, sql, params):
+        try:
+            conn.execute(sql, params)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _log_exception(self, message):
+        if self.logger is not None:
+            self.logger.exception(message)
@@ -140,35 +140,31 @@ function renderAutocomplete(container, results, onSelect) {
 // Dashboard Stats
 async function updateDashboardStats() {
     try {
-        const customers = await customerManager.getAll();
-        const products = await productManager.getAll();
-        const quotes = await quoteManager.getAll();
+        // Counters and recent quotes are maintained server-side
+        const stats = await db.getStats(5);
 
-        document.getElementById('stat-customers').textContent = customers.length;
-        document.getElementById('stat-products').textContent = products.length;
-        document.getElementById('stat-quotes').textContent = quotes.length;
+        document.getElementById('stat-customers').textContent = stats.customers;
+        document.getElementById('stat-products').textContent = stats.products;
+        document.getElementById('stat-quotes').textContent = stats.quotes;
 
-        // Calculate total revenue from accepted quotes
-        const totalRevenue = quotes
-            .filter(q => q.status === 'accepted')
-            .reduce((sum, q) => sum + q.total, 0);
-        document.getElementById('stat-revenue').textContent = formatCurrency(totalRevenue, 'USD');
+        // Accepted revenue, one amount per currency
+        const revenue = Object.entries(stats.revenue);
+        document.getElementById('stat-revenue').textContent = revenue.length
+            ? revenue.map(([currency, total]) => formatCurrency(total, currency)).join(' + ')
+            : formatCurrency(0, 'USD');
 
         // Render recent quotes in dashboard
-        await renderDashboardQuotes(quotes.slice(0, 5), customers);
+        renderDashboardQuotes(stats.recentQuotes);
     } catch (error) {
         console.error('Dashboard güncellenemedi:', error);
     }
 }
 
 // Render recent quotes in dashboard
-async function renderDashboardQuotes(quotes, customers) {
+function renderDashboardQuotes(quotes) {
     const tbody = document.getElementById('dashboard-quotes-body');
     if (!tbody) return;
 
-    const customerMap = {};
-    customers.forEach(c => customerMap[c.id] = c);
-
     if (quotes.length === 0) {
         tbody.innerHTML = `
             <tr>
@@ -185,8 +181,7 @@ async function renderDashboardQuotes(quotes, customers) {
     const statusClasses = { draft: 'status-draft', sent: 'status-sent', accepted: 'status-accepted', rejected: 'status-rejected' };
 
     tbody.innerHTML = quotes.map(q => {
-        const customer = customerMap[q.customerId];
-        const customerName = customer ? customer.name : 'Bilinmeyen';
+        const customerName = q.customerName || 'Bilinmeyen';
         return `
             <tr>
                 <td data-label="Teklif No"><code>${escapeHtml(q.quoteNumber)}</code></td>
@@ -28,7 +28,9 @@ class CustomerManager {
     }
 
     async search(query) {
-        return await this.db.searchAll('customers', query);
+        // Server-side FTS search (first page); customers are not replicated locally
+        const data = await this.db.getJSON(`${this.db.baseUrl}/customers?search=${encodeURIComponent(query)}`);
+        return data.customers;
     }
 
     async getAutocompleteResults(query, limit = 10) {
@@ -52,13 +54,24 @@ class CustomerManager {
 const CustomerUI = {
     currentPage: 1,
     searchQuery: '',
+    // Keyset cursor for each visited page (page 1 needs none), so deep pages stay cheap
+    cursors: {},
 
     async renderList(page = 1, search = '') {
+        if (page === 1 || search !== this.searchQuery) {
+            this.cursors = {};
+            page = 1;
+        }
         this.currentPage = page;
         this.searchQuery = search;
 
-        const response = await fetch(`/api/customers?page=${page}&limit=50&search=${encodeURIComponent(search)}`);
-        const data = await response.json();
+        const cursor = this.cursors[page];
+        const pageParam = cursor ? `after=${encodeURIComponent(cursor)}` : `page=${page}`;
+        const data = await db.getJSON(`/api/customers?${pageParam}&limit=50&search=${encodeURIComponent(search)}`);
+
+        // A newer search may have started while this page was loading
+        if (search !== this.searchQuery || page !== this.currentPage) return;
+        if (data.next) this.cursors[page + 1] = data.next;
 
         const tbody = document.getElementById('customers-table-body');
         const paginationDiv = document.getElementById('customers-pagination');
@@ -104,13 +117,13 @@ const CustomerUI = {
             let paginationHtml = '<div class="pagination">';
 
             if (page > 1) {
-                paginationHtml += `<button class="btn btn-primary" onclick="CustomerUI.renderList(${page - 1}, '${search}')"><i class="fas fa-chevron-left"></i></button>`;
+                paginationHtml += `<button class="btn btn-primary" onclick="CustomerUI.goToPage(${page - 1})"><i class="fas fa-chevron-left"></i></button>`;
             }
 
             paginationHtml += `<span class="page-info">Sayfa ${page} / ${data.pages}</span>`;
 
-            if (page < data.pages) {
-                paginationHtml += `<button class="btn btn-primary" onclick="CustomerUI.renderList(${page + 1}, '${search}')"><i class="fas fa-chevron-right"></i></button>`;
+            if (data.next) {
+                paginationHtml += `<button class="btn btn-primary" onclick="CustomerUI.goToPage(${page + 1})"><i class="fas fa-chevron-right"></i></button>`;
             }
 
             paginationHtml += '</div>';
@@ -120,6 +133,10 @@ const CustomerUI = {
         }
     },
 
+    goToPage(page) {
+        this.renderList(page, this.searchQuery);
+    },
+
     searchCustomers(query) {
         this.renderList(1, query);
     },
@@ -3,15 +3,142 @@
  * Python/Flask backend API ile iletişim kurar.
  */
 
+/**
+ * IndexedDB replica of the products, kept current from the /api/changes delta
+ * feed so the product list, autocomplete and searches can be served locally.
+ * Customers and quotes are not replicated: their screens page through the
+ * server with keyset cursors and search it, and a full copy of 100k customers
+ * would undo that.
+ */
+class LocalReplica {
+    constructor(name = 'teklif-replica') {
+        this.name = name;
+        this.stores = ['products'];
+        this.idb = null;
+        this.syncing = {};
+    }
+
+    open() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(this.name, 2);
+            request.onupgradeneeded = () => {
+                const idb = request.result;
+                this.stores.forEach(store => {
+                    if (!idb.objectStoreNames.contains(store)) idb.createObjectStore(store, { keyPath: 'id' });
+                });
+                if (!idb.objectStoreNames.contains('meta')) idb.createObjectStore('meta');
+                // Version 1 replicated customers and quotes as well; drop those copies
+                ['customers', 'quotes'].forEach(store => {
+                    if (idb.objectStoreNames.contains(store)) idb.deleteObjectStore(store);
+                    request.transaction.objectStore('meta').delete(`cursor:${store}`);
+                });
+            };
+            request.onsuccess = () => {
+                this.idb = request.result;
+                resolve(this);
+            };
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    read(storeName, method, ...args) {
+        return new Promise((resolve, reject) => {
+            const request = this.idb.transaction(storeName).objectStore(storeName)[method](...args);
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async getAll(storeName) {
+        // Newest first, like the API
+        const rows = await this.read(storeName, 'getAll');
+        return rows.reverse();
+    }
+
+    sync(baseUrl, storeName) {
+        // Concurrent callers share one round of requests per store
+        if (!this.syncing[storeName]) {
+            this.syncing[storeName] = this.pull(baseUrl, storeName).finally(() => {
+                delete this.syncing[storeName];
+            });
+        }
+        return this.syncing[storeName];
+    }
+
+    async pull(baseUrl, storeName) {
+        // Each store keeps its own cursor and pulls only its own table, so a
+        // screen that lists products does not download customers and quotes
+        const key = `cursor:${storeName}`;
+        let cursor = await this.read('meta', 'get', key);
+        let more = true;
+        while (more) {
+            // No cursor yet: the server starts a full snapshot
+            const since = cursor === undefined ? '' : `&since=${cursor}`;
+            const response = await fetch(`${baseUrl}/changes?tables=${storeName}${since}`);
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            const page = await response.json();
+            await this.apply(storeName, key, page, cursor === undefined);
+            cursor = page.cursor;
+            more = page.more;
+        }
+    }
+
+    apply(storeName, key, page, snapshot) {
+        return new Promise((resolve, reject) => {
+            const tx = this.idb.transaction([storeName, 'meta'], 'readwrite');
+            const store = tx.objectStore(storeName);
+            if (snapshot) store.clear();
+            (page.changes[storeName] || []).forEach(row => store.put(row));
+            (page.deleted[storeName] || []).forEach(id => store.delete(id));
+            // Stored in the same transaction, so rows and cursor never disagree
+            tx.objectStore('meta').put(page.cursor, key);
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => reject(tx.error);
+        });
+    }
+}
+
 class Database {
     constructor() {
         this.baseUrl = '/api';
+        this.replica = null;
+        // url -> { etag, data } for collection responses (see getJSON)
+        this.validators = new Map();
+        this.maxValidators = 50;
     }
 
     async init() {
-        // API health check could go here, but for now we'll assume it's up.
+        // Without IndexedDB (e.g. some private windows) everything is read from the API
+        try {
+            this.replica = await new LocalReplica().open();
+        } catch (error) {
+            console.warn('Yerel önbellek açılamadı, veriler sunucudan okunacak:', error);
+            this.replica = null;
+        }
         console.log('API Client Initialized');
-        return Promise.resolve(true);
+        return true;
+    }
+
+    // Conditional GET: collection endpoints tag responses with an ETag built
+    // from table version stamps, so an unchanged list costs a bodiless 304
+    async getJSON(url) {
+        const cached = this.validators.get(url);
+        const response = await fetch(url, {
+            headers: cached ? { 'If-None-Match': cached.etag } : {}
+        });
+        if (response.status === 304 && cached) return cached.data;
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (etag) {
+            this.validators.delete(url);
+            this.validators.set(url, { etag, data });
+            if (this.validators.size > this.maxValidators) {
+                // Map keeps insertion order: drop the least recently stored entry
+                this.validators.delete(this.validators.keys().next().value);
+            }
+        }
+        return data;
     }
 
     // Generic CRUD operations
@@ -75,14 +202,25 @@ class Database {
     }
 
     async getAll(storeName) {
+        // Products are served from the local replica after pulling the latest
+        // changes; customers and quotes return the API's first page
+        if (this.replica && this.replica.stores.includes(storeName)) {
+            try {
+                await this.replica.sync(this.baseUrl, storeName);
+                return await this.replica.getAll(storeName);
+            } catch (error) {
+                console.error('Replica sync failed, reading from the API:', error);
+            }
+        }
         try {
-            const response = await fetch(`${this.baseUrl}/${storeName}`);
-            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-            const data = await response.json();
-            // Handle paginated response format for customers
+            const data = await this.getJSON(`${this.baseUrl}/${storeName}`);
+            // Handle paginated response format for customers and quotes
             if (storeName === 'customers' && data.customers) {
                 return data.customers;
             }
+            if (storeName === 'quotes' && data.quotes) {
+                return data.quotes;
+            }
             return data;
         } catch (error) {
             console.error('Error fetching all data:', error);
@@ -90,9 +228,40 @@ class Database {
         }
     }
 
+    async getMany(storeName, ids) {
+        // Multi-get shortcut: one request for many ids, results in the same order
+        if (ids.length === 0) return [];
+        try {
+            return await this.getJSON(`${this.baseUrl}/${storeName}?ids=${ids.join(',')}`);
+        } catch (error) {
+            console.error('Error fetching data:', error);
+            throw error;
+        }
+    }
+
+    async batch(paths) {
+        // Runs several GET sub-requests (e.g. 'customers/5', 'price-history?productId=3')
+        // in one round-trip; returns [{ status, body }] in the same order
+        if (paths.length === 0) return [];
+        try {
+            const response = await fetch(`${this.baseUrl}/batch`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ requests: paths })
+            });
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            const data = await response.json();
+            return data.responses;
+        } catch (error) {
+            console.error('Error running batch:', error);
+            throw error;
+        }
+    }
+
     async search(storeName, indexName, query) {
-        // Implement client-side filtering since dataset is likely small
-        // or backend doesn't support field-specific search yet.
+        // Client-side filtering over getAll(), i.e. the local replica for products
         const allItems = await this.getAll(storeName);
         if (!query) return allItems;
 
@@ -128,35 +297,76 @@ class Database {
     }
 
     async getPriceHistoryForProductAndCustomer(productId, customerId) {
-        const allHistory = await this.getPriceHistoryForProduct(productId);
-        // Customer filtering done client-side as backend returns all history for product
-        // (Optimizable if backend supports customerId filter)
-        return allHistory.filter(h => h.customerId == customerId); // == for type coercion just in case
+        try {
+            const response = await fetch(`${this.baseUrl}/price-history?productId=${productId}&customerId=${customerId}`);
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            return await response.json();
+        } catch (error) {
+            console.error('Error fetching price history:', error);
+            throw error;
+        }
+    }
+
+    // Aggregated server-side: last price for the customer, average over the
+    // other customers, min/max and count; one request for all products
+    async getPriceSummaries(productIds, customerId = null) {
+        if (productIds.length === 0) return [];
+        const customerParam = customerId ? `&customerId=${customerId}` : '';
+        try {
+            const response = await fetch(`${this.baseUrl}/price-history/summary?productIds=${productIds.join(',')}${customerParam}`);
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            return await response.json();
+        } catch (error) {
+            console.error('Error fetching price summary:', error);
+            throw error;
+        }
     }
 
     async getAveragePriceForProduct(productId, excludeCustomerId = null) {
-        const history = await this.getPriceHistoryForProduct(productId);
-        const filtered = excludeCustomerId
-            ? history.filter(h => h.customerId != excludeCustomerId)
-            : history;
+        const [summary] = await this.getPriceSummaries([productId], excludeCustomerId);
+        if (!excludeCustomerId) {
+            return summary.count ? { average: summary.average, count: summary.count } : null;
+        }
+        return summary.averageForOthers;
+    }
 
-        if (filtered.length === 0) return null;
+    async getLastPriceForCustomer(productId, customerId) {
+        const [summary] = await this.getPriceSummaries([productId], customerId);
+        return summary.lastPriceForCustomer;
+    }
 
-        const sum = filtered.reduce((acc, h) => acc + h.price, 0);
-        return {
-            average: sum / filtered.length,
-            count: filtered.length
-        };
+    async getPriceInfoForProducts(productIds, customerId) {
+        const summaries = await this.getPriceSummaries(productIds, customerId);
+        return summaries.map(summary => ({
+            lastPriceForCustomer: summary.lastPriceForCustomer,
+            averageForOthers: summary.averageForOthers
+        }));
     }
 
-    async getLastPriceForCustomer(productId, customerId) {
-        const history = await this.getPriceHistoryForProductAndCustomer(productId, customerId);
-        if (history.length === 0) return null;
+    // Quote listing (server-side filters, keyset pagination)
+    async listQuotes(params = {}) {
+        const query = new URLSearchParams();
+        Object.entries(params).forEach(([key, value]) => {
+            if (value !== null && value !== undefined && value !== '') query.set(key, value);
+        });
+        try {
+            return await this.getJSON(`${this.baseUrl}/quotes?${query}`);
+        } catch (error) {
+            console.error('Error listing quotes:', error);
+            throw error;
+        }
+    }
 
-        // Sort by date descending and get the most recent
-        // Backend returns ISO strings so string comparison works, or Date object
-        history.sort((a, b) => new Date(b.createdAt) - new Date(a.createdAt));
-        return history[0];
+    // Dashboard summary
+    async getStats(recent = 5) {
+        try {
+            const response = await fetch(`${this.baseUrl}/stats?recent=${recent}`);
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            return await response.json();
+        } catch (error) {
+            console.error('Error fetching stats:', error);
+            throw error;
+        }
     }
 
     // Quote number generation
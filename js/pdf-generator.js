@@ -3,11 +3,61 @@
  * jsPDF ve jspdf-autotable kullanarak Proforma Fatura şablonu oluşturur.
  */
 
+// Built pages map asset paths to fingerprinted URLs (see assets.py)
+const assetUrl = (path) => (window.ASSET_MANIFEST && window.ASSET_MANIFEST[path]) || path;
+
+// Open Sans covers the Turkish characters Helvetica lacks. It is only fetched
+// when the first PDF is generated and then reused for the rest of the session.
+const PDFFonts = {
+    family: 'OpenSans',
+    file: 'fonts/OpenSans-Regular.ttf',
+    loading: null,
+
+    load() {
+        if (!this.loading) {
+            this.loading = fetch(assetUrl(this.file))
+                .then(response => {
+                    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                    return response.arrayBuffer();
+                })
+                .then(buffer => {
+                    // jsPDF's virtual file system takes a binary string
+                    const bytes = new Uint8Array(buffer);
+                    let binary = '';
+                    for (let i = 0; i < bytes.length; i += 0x8000) {
+                        binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+                    }
+                    return binary;
+                })
+                .catch(error => {
+                    this.loading = null; // retry on the next PDF
+                    throw error;
+                });
+        }
+        return this.loading;
+    },
+
+    // Registers the font on `doc`; returns the family to use for body text
+    async register(doc) {
+        try {
+            const data = await this.load();
+            const fileName = this.file.split('/').pop();
+            doc.addFileToVFS(fileName, data);
+            doc.addFont(fileName, this.family, 'normal');
+            return this.family;
+        } catch (error) {
+            console.error('Font yüklenemedi, Helvetica kullanılıyor:', error);
+            return 'helvetica';
+        }
+    }
+};
+
 const PDFGenerator = {
     async generate(quote, customer) {
         try {
             const { jsPDF } = window.jspdf;
             const doc = new jsPDF();
+            const bodyFont = await PDFFonts.register(doc);
 
             // --- CONFIGURATION ---
             const pageWidth = doc.internal.pageSize.getWidth();
@@ -33,9 +83,10 @@ const PDFGenerator = {
                 });
             };
 
-            // Remove Turkish special characters for PDF compatibility
+            // Remove Turkish special characters when falling back to Helvetica
             const removeTurkishChars = (str) => {
                 if (!str) return '';
+                if (bodyFont !== 'helvetica') return str;
                 return str
                     .replace(/İ/g, 'I')
                     .replace(/ı/g, 'i')
@@ -69,10 +120,10 @@ const PDFGenerator = {
                     img.src = url;
                 });
             };
-            const logoImg = await loadImage('images/logo.png');
+            const logoImg = await loadImage(assetUrl('images/logo.png'));
 
-            // Use Helvetica (built-in, always works)
-            doc.setFont('helvetica');
+            // Labels use built-in Helvetica Bold (ASCII only); values use the body font
+            doc.setFont(bodyFont);
 
             // --- HEADER ---
             let y = 20;
@@ -102,19 +153,19 @@ const PDFGenerator = {
 
             doc.setFont('helvetica', 'bold');
             doc.text('Teklif No:', margin, y);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text(quote.quoteNumber, margin + 40, y);
 
             y += 5;
             doc.setFont('helvetica', 'bold');
             doc.text('Tarih:', margin, y);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text(formatDateStr(quote.createdAt), margin + 40, y);
 
             y += 5;
             doc.setFont('helvetica', 'bold');
             doc.text('Gecerlilik:', margin, y);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text(quote.validDays + ' gun', margin + 40, y);
 
             y += 10;
@@ -141,32 +192,32 @@ const PDFGenerator = {
 
             doc.setFont('helvetica', 'bold');
             doc.text('Firma:', leftColX, startY);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text(removeTurkishChars(truncateToWords(customer.company || customer.name || '-', 2)), leftColX + 25, startY);
 
             startY += 6;
             doc.setFont('helvetica', 'bold');
             doc.text('Adres:', leftColX, startY);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             const addr = customer.address || '-';
             doc.text(addr.substring(0, 40), leftColX + 25, startY);
 
             startY += 6;
             doc.setFont('helvetica', 'bold');
             doc.text('Telefon:', leftColX, startY);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text(customer.phone || '-', leftColX + 25, startY);
 
             startY += 6;
             doc.setFont('helvetica', 'bold');
             doc.text('Yetkili:', leftColX, startY);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text(removeTurkishChars(truncateToWords(customer.name || '-', 2)), leftColX + 25, startY);
 
             startY = y + 7;
             doc.setFont('helvetica', 'bold');
             doc.text('E-posta:', rightColX, startY);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text(customer.email || '-', rightColX + 15, startY);
 
             y += infoBoxHeight + 5;
@@ -194,6 +245,7 @@ const PDFGenerator = {
                     halign: 'center'
                 },
                 bodyStyles: {
+                    font: bodyFont,
                     fontSize: 8,
                     textColor: [50, 50, 50],
                     minCellHeight: 6,
@@ -227,7 +279,7 @@ const PDFGenerator = {
             // Ara Toplam (Subtotal)
             doc.setFont('helvetica', 'bold');
             doc.text('ARA TOPLAM:', rightStart + 2, currentTotalY + 5);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text(formatMoney(subtotal, quote.currency), pageWidth - margin - 2, currentTotalY + 5, { align: 'right' });
 
             currentTotalY += rowHeight;
@@ -238,7 +290,7 @@ const PDFGenerator = {
             currentTotalY += 2;
             doc.setFont('helvetica', 'bold');
             doc.text('KDV (%20):', rightStart + 2, currentTotalY + 5);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text(formatMoney(kdvAmount, quote.currency), pageWidth - margin - 2, currentTotalY + 5, { align: 'right' });
 
             currentTotalY += rowHeight;
@@ -262,20 +314,20 @@ const PDFGenerator = {
 
             doc.setFont('helvetica', 'bold');
             doc.text('Teslimat:', margin, leftY);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text('Stoktan Teslim', margin + 30, leftY);
 
             leftY += 6;
             doc.setFont('helvetica', 'bold');
             doc.text('Odeme:', margin, leftY);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text('Pesin / Havale', margin + 30, leftY);
 
             if (quote.notes) {
                 leftY += 6;
                 doc.setFont('helvetica', 'bold');
                 doc.text('Notlar:', margin, leftY);
-                doc.setFont('helvetica', 'normal');
+                doc.setFont(bodyFont, 'normal');
                 const notesLines = doc.splitTextToSize(quote.notes, rightStart - margin - 10);
                 doc.text(notesLines, margin + 30, leftY);
                 leftY += (notesLines.length * 5);
@@ -285,7 +337,7 @@ const PDFGenerator = {
 
             // --- SIGNATURE ---
             doc.setFontSize(9);
-            doc.setFont('helvetica', 'normal');
+            doc.setFont(bodyFont, 'normal');
             doc.text('Musteri Adi Soyadi - Kase ve Imza:', margin, y);
             doc.rect(margin, y + 2, 70, 20);
 
@@ -306,17 +358,17 @@ const PDFGenerator = {
             const addBankInfo = (x, iban) => {
                 doc.setFont('helvetica', 'bold');
                 doc.text('Banka:', x + 2, bankStartY);
-                doc.setFont('helvetica', 'normal');
+                doc.setFont(bodyFont, 'normal');
                 doc.text('Garanti BBVA', x + 18, bankStartY);
 
                 doc.setFont('helvetica', 'bold');
                 doc.text('IBAN:', x + 2, bankStartY + 5);
-                doc.setFont('helvetica', 'normal');
+                doc.setFont(bodyFont, 'normal');
                 doc.text(iban, x + 18, bankStartY + 5);
 
                 doc.setFont('helvetica', 'bold');
                 doc.text('Sube:', x + 2, bankStartY + 10);
-                doc.setFont('helvetica', 'normal');
+                doc.setFont(bodyFont, 'normal');
                 doc.text('Corlu', x + 18, bankStartY + 10);
             };
 
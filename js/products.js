@@ -32,16 +32,22 @@ class ProductManager {
     }
 
     async getAutocompleteResults(query, limit = 10) {
-        const results = await this.search(query);
-        return results.slice(0, limit).map(p => ({
-            id: p.id,
-            code: p.code,
-            name: p.name,
-            defaultPrice: p.price,
-            currency: p.currency,
-            unit: p.unit,
-            displayText: `${p.code} - ${p.name}`
-        }));
+        try {
+            const response = await fetch(`/api/products/search?q=${encodeURIComponent(query)}&limit=${limit}`);
+            const results = await response.json();
+            return results.map(p => ({
+                id: p.id,
+                code: p.code,
+                name: p.name,
+                defaultPrice: p.price,
+                currency: p.currency,
+                unit: p.unit,
+                displayText: `${p.code} - ${p.name}`
+            }));
+        } catch (error) {
+            console.error('Autocomplete error:', error);
+            return [];
+        }
     }
 }
 
@@ -67,7 +73,7 @@ const ProductUI = {
 
         tbody.innerHTML = products.map(p => {
             const imgHtml = p.imageUrl
-                ? `<img src="/api/proxy-image?url=${encodeURIComponent(p.imageUrl)}" style="width: 40px; height: 40px; object-fit: cover; border-radius: 4px;" onerror="this.style.display='none'">`
+                ? `<img src="/api/proxy-image?url=${encodeURIComponent(p.imageUrl)}&w=80" loading="lazy" style="width: 40px; height: 40px; object-fit: cover; border-radius: 4px;" onerror="this.style.display='none'">`
                 : `<i class="fas fa-image" style="color: #ccc; font-size: 20px;"></i>`;
             return `
             <tr>
@@ -235,7 +241,7 @@ const ProductUI = {
         const previewImg = document.getElementById('preview-img');
 
         // Use proxy to avoid CORS
-        previewImg.src = '/api/proxy-image?url=' + encodeURIComponent(imageUrl);
+        previewImg.src = '/api/proxy-image?url=' + encodeURIComponent(imageUrl) + '&w=320';
         previewContainer.style.display = 'block';
     },
 
@@ -34,18 +34,22 @@ class QuoteManager {
         return quotes.sort((a, b) => new Date(b.createdAt) - new Date(a.createdAt));
     }
 
+    async list(params = {}) {
+        // Returns { quotes, next } with customerName already joined in
+        return await this.db.listQuotes(params);
+    }
+
     async generateQuoteNumber() {
         return await this.db.generateQuoteNumber();
     }
 
     async getPriceInfo(productId, customerId) {
-        const lastPrice = await this.db.getLastPriceForCustomer(productId, customerId);
-        const avgPrice = await this.db.getAveragePriceForProduct(productId, customerId);
+        const [priceInfo] = await this.db.getPriceInfoForProducts([productId], customerId);
+        return priceInfo;
+    }
 
-        return {
-            lastPriceForCustomer: lastPrice,
-            averageForOthers: avgPrice
-        };
+    async getPriceInfoForProducts(productIds, customerId) {
+        return await this.db.getPriceInfoForProducts(productIds, customerId);
     }
 }
 
@@ -61,74 +65,87 @@ let currentQuote = {
 
 // UI Functions for Quote Management
 const QuoteUI = {
-    async renderList() {
-        const quotes = await quoteManager.getAll();
+    searchQuery: '',
+    nextCursor: null,
+
+    async renderList(search = this.searchQuery, after = null) {
+        this.searchQuery = search;
+
+        const page = await quoteManager.list({ q: search, after, limit: 50 });
         const tbody = document.getElementById('quotes-table-body');
+        const paginationDiv = document.getElementById('quotes-pagination');
 
         if (!tbody) return;
 
-        if (quotes.length === 0) {
+        // A newer search may have started while this page was loading
+        if (search !== this.searchQuery) return;
+        this.nextCursor = page.next;
+
+        if (!after && page.quotes.length === 0) {
             tbody.innerHTML = `
                 <tr>
                     <td colspan="6" class="empty-state">
-                        <i class="fas fa-file-invoice"></i>
-                        <p>Henüz teklif oluşturulmamış</p>
+                        <i class="fas ${search ? 'fa-search' : 'fa-file-invoice'}"></i>
+                        <p>${search ? 'Arama sonucu bulunamadı' : 'Henüz teklif oluşturulmamış'}</p>
                     </td>
                 </tr>
             `;
+            if (paginationDiv) paginationDiv.innerHTML = '';
             return;
         }
 
-        // Get unique customer IDs from quotes
-        const customerIds = [...new Set(quotes.map(q => q.customerId))];
-
-        // Fetch customer names by ID
-        const customerMap = {};
-        for (const id of customerIds) {
-            try {
-                const customer = await customerManager.get(id);
-                if (customer) customerMap[id] = customer;
-            } catch (e) {
-                console.error('Error fetching customer', id, e);
-            }
+        const rowsHtml = page.quotes.map(q => this.renderRow(q)).join('');
+        if (after) {
+            tbody.insertAdjacentHTML('beforeend', rowsHtml);
+        } else {
+            tbody.innerHTML = rowsHtml;
         }
 
-        tbody.innerHTML = quotes.map(q => {
-            const customer = customerMap[q.customerId];
-            const customerName = customer ? customer.name : 'Bilinmeyen';
-            const statusClass = this.getStatusClass(q.status);
-            const statusText = this.getStatusText(q.status);
+        if (paginationDiv) {
+            paginationDiv.innerHTML = page.next
+                ? `<div class="pagination"><button class="btn btn-primary" onclick="QuoteUI.loadMore()"><i class="fas fa-chevron-down"></i> Daha Fazla</button></div>`
+                : '';
+        }
+    },
 
-            return `
-                <tr>
-                    <td data-label="Teklif No"><code>${escapeHtml(q.quoteNumber)}</code></td>
-                    <td data-label="Müşteri">${escapeHtml(customerName)}</td>
-                    <td data-label="Tutar" class="text-right">${formatCurrency(q.total, q.currency)}</td>
-                    <td data-label="Durum"><span class="status-badge ${statusClass}">${statusText}</span></td>
-                    <td data-label="Tarih">${formatDate(q.createdAt)}</td>
-                    <td class="actions">
-                        <button onclick="QuoteUI.view(${q.id})" class="btn-icon" title="Görüntüle">
-                            <i class="fas fa-eye"></i>
-                        </button>
-                        <button onclick="QuoteUI.edit(${q.id})" class="btn-icon" title="Düzenle">
-                            <i class="fas fa-edit"></i>
-                        </button>
-                        <button onclick="QuoteUI.generatePDF(${q.id})" class="btn-icon" title="PDF İndir">
-                            <i class="fas fa-file-pdf"></i>
-                        </button>
-                        <button onclick="QuoteUI.sendWhatsApp(${q.id})" class="btn-icon btn-success" title="WhatsApp ile Gönder">
-                            <i class="fab fa-whatsapp"></i>
-                        </button>
-                        <button onclick="QuoteUI.sendEmail(${q.id})" class="btn-icon" title="E-posta ile Gönder">
-                            <i class="fas fa-envelope"></i>
-                        </button>
-                        <button onclick="QuoteUI.delete(${q.id})" class="btn-icon btn-danger" title="Sil">
-                            <i class="fas fa-trash"></i>
-                        </button>
-                    </td>
-                </tr>
-            `;
-        }).join('');
+    loadMore() {
+        if (this.nextCursor) this.renderList(this.searchQuery, this.nextCursor);
+    },
+
+    renderRow(q) {
+        const customerName = q.customerName || 'Bilinmeyen';
+        const statusClass = this.getStatusClass(q.status);
+        const statusText = this.getStatusText(q.status);
+
+        return `
+            <tr>
+                <td data-label="Teklif No"><code>${escapeHtml(q.quoteNumber)}</code></td>
+                <td data-label="Müşteri">${escapeHtml(customerName)}</td>
+                <td data-label="Tutar" class="text-right">${formatCurrency(q.total, q.currency)}</td>
+                <td data-label="Durum"><span class="status-badge ${statusClass}">${statusText}</span></td>
+                <td data-label="Tarih">${formatDate(q.createdAt)}</td>
+                <td class="actions">
+                    <button onclick="QuoteUI.view(${q.id})" class="btn-icon" title="Görüntüle">
+                        <i class="fas fa-eye"></i>
+                    </button>
+                    <button onclick="QuoteUI.edit(${q.id})" class="btn-icon" title="Düzenle">
+                        <i class="fas fa-edit"></i>
+                    </button>
+                    <button onclick="QuoteUI.generatePDF(${q.id})" class="btn-icon" title="PDF İndir">
+                        <i class="fas fa-file-pdf"></i>
+                    </button>
+                    <button onclick="QuoteUI.sendWhatsApp(${q.id})" class="btn-icon btn-success" title="WhatsApp ile Gönder">
+                        <i class="fab fa-whatsapp"></i>
+                    </button>
+                    <button onclick="QuoteUI.sendEmail(${q.id})" class="btn-icon" title="E-posta ile Gönder">
+                        <i class="fas fa-envelope"></i>
+                    </button>
+                    <button onclick="QuoteUI.delete(${q.id})" class="btn-icon btn-danger" title="Sil">
+                        <i class="fas fa-trash"></i>
+                    </button>
+                </td>
+            </tr>
+        `;
     },
 
     getStatusClass(status) {
@@ -151,82 +168,9 @@ const QuoteUI = {
         return texts[status] || 'Taslak';
     },
 
-    // Search/Filter quotes
+    // Search/Filter quotes (matched server-side on quote number and customer name)
     async filterList(query) {
-        const searchTerm = query.toLowerCase().trim();
-        const quotes = await quoteManager.getAll();
-
-        // Get unique customer IDs from quotes
-        const customerIds = [...new Set(quotes.map(q => q.customerId))];
-
-        // Fetch customer names by ID
-        const customerMap = {};
-        for (const id of customerIds) {
-            try {
-                const customer = await customerManager.get(id);
-                if (customer) customerMap[id] = customer;
-            } catch (e) {
-                console.error('Error fetching customer', id, e);
-            }
-        }
-
-        const tbody = document.getElementById('quotes-table-body');
-        if (!tbody) return;
-
-        // Filter quotes
-        const filtered = searchTerm ? quotes.filter(q => {
-            const customer = customerMap[q.customerId];
-            const customerName = customer ? customer.name.toLowerCase() : '';
-            return q.quoteNumber.toLowerCase().includes(searchTerm) ||
-                customerName.includes(searchTerm) ||
-                (q.notes && q.notes.toLowerCase().includes(searchTerm));
-        }) : quotes;
-
-        if (filtered.length === 0) {
-            tbody.innerHTML = `
-                <tr>
-                    <td colspan="6" class="empty-state">
-                        <i class="fas fa-search"></i>
-                        <p>${searchTerm ? 'Arama sonucu bulunamadı' : 'Henüz teklif oluşturulmamış'}</p>
-                    </td>
-                </tr>
-            `;
-            return;
-        }
-
-        tbody.innerHTML = filtered.map(q => {
-            const customer = customerMap[q.customerId];
-            const customerName = customer ? customer.name : 'Bilinmeyen';
-            const statusClass = this.getStatusClass(q.status);
-            const statusText = this.getStatusText(q.status);
-
-            return `
-                <tr>
-                    <td data-label="Teklif No"><code>${escapeHtml(q.quoteNumber)}</code></td>
-                    <td data-label="Müşteri">${escapeHtml(customerName)}</td>
-                    <td data-label="Tutar" class="text-right">${formatCurrency(q.total, q.currency)}</td>
-                    <td data-label="Durum"><span class="status-badge ${statusClass}">${statusText}</span></td>
-                    <td data-label="Tarih">${formatDate(q.createdAt)}</td>
-                    <td class="actions">
-                        <button onclick="QuoteUI.view(${q.id})" class="btn-icon" title="Görüntüle">
-                            <i class="fas fa-eye"></i>
-                        </button>
-                        <button onclick="QuoteUI.generatePDF(${q.id})" class="btn-icon" title="PDF İndir">
-                            <i class="fas fa-file-pdf"></i>
-                        </button>
-                        <button onclick="QuoteUI.sendWhatsApp(${q.id})" class="btn-icon btn-success" title="WhatsApp ile Gönder">
-                            <i class="fab fa-whatsapp"></i>
-                        </button>
-                        <button onclick="QuoteUI.sendEmail(${q.id})" class="btn-icon" title="E-posta ile Gönder">
-                            <i class="fas fa-envelope"></i>
-                        </button>
-                        <button onclick="QuoteUI.delete(${q.id})" class="btn-icon btn-danger" title="Sil">
-                            <i class="fas fa-trash"></i>
-                        </button>
-                    </td>
-                </tr>
-            `;
-        }).join('');
+        await this.renderList(query.trim());
     },
 
     async showCreateModal() {
@@ -240,7 +184,7 @@ const QuoteUI = {
             notes: ''
         };
 
-        // Generate quote number
+        // Preview only; the number is reserved by the server when the quote is saved
         const quoteNumber = await quoteManager.generateQuoteNumber();
         document.getElementById('quote-number').value = quoteNumber;
 
@@ -432,10 +376,11 @@ const QuoteUI = {
     async refreshPriceInfo() {
         if (!currentQuote.customerId) return;
 
-        for (let i = 0; i < currentQuote.items.length; i++) {
-            const item = currentQuote.items[i];
-            item.priceInfo = await quoteManager.getPriceInfo(item.productId, currentQuote.customerId);
-        }
+        const productIds = currentQuote.items.map(item => item.productId);
+        const priceInfos = await quoteManager.getPriceInfoForProducts(productIds, currentQuote.customerId);
+        currentQuote.items.forEach((item, i) => {
+            item.priceInfo = priceInfos[i];
+        });
         this.renderItems();
     },
 
@@ -476,9 +421,11 @@ const QuoteUI = {
                 await quoteManager.update(quote);
                 showToast('Teklif güncellendi', 'success');
             } else {
-                // Create new quote
-                await quoteManager.add(quote);
-                showToast('Teklif oluşturuldu', 'success');
+                // Create new quote; the server allocates the number in the same transaction
+                delete quote.quoteNumber;
+                quote.allocateNumber = true;
+                const created = await quoteManager.add(quote);
+                showToast(`Teklif oluşturuldu (${created.quoteNumber})`, 'success');
             }
             Modal.hide('quote-modal');
             await this.renderList();
@@ -0,0 +1,298 @@
+"""
+Request, SQLite and outbound HTTP instrumentation, exposed at /metrics in the
+Prometheus text format.
+
+Metrics are kept per process and can be switched on and off at runtime with
+configure() (the app exposes it to logged-in users as PUT /metrics
+{"enabled": false}); when off, every hook returns after a single flag check
+and new SQLite connections are plain sqlite3.Connection objects, without the
+timing wrappers. Requests slower than the threshold are logged with their
+slowest statements and those statements' query plans. Outbound HTTP time in a
+request is the time its thread waits on the fetch executor.
+"""
+import bisect
+import sqlite3
+import threading
+from time import perf_counter
+from urllib.parse import urlparse
+
+from flask import Response, g, has_app_context, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Scraped hosts are user supplied; beyond this many they share one label
+MAX_HOST_LABELS = 100
+SLOW_LOG_STATEMENTS = 5
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{_labels(self.labels, label_values)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{_labels(self.labels, label_values, [("le", bound)])} {cumulative}'
+            yield f'{self.name}_bucket{_labels(self.labels, label_values, [("le", "+Inf")])} {count}'
+            yield f'{self.name}_sum{_labels(self.labels, label_values)} {total}'
+            yield f'{self.name}_count{_labels(self.labels, label_values)} {count}'
+
+
+class RequestStats:
+    """Timings collected while one request is handled"""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.sql_seconds = 0.0
+        self.sql_count = 0
+        self.statements = []  # (seconds, sql, parameters)
+        self.json_seconds = 0.0
+        self.http_seconds = 0.0
+
+
+def _current_stats():
+    return g.get('_metrics') if has_app_context() else None
+
+
+class Metrics:
+    def __init__(self, enabled=True, slow_ms=500):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.logger = None
+        self.collectors = []
+        self.requests = self.add(Histogram(
+            'teklif_http_request_duration_seconds', 'Request latency by route', ('method', 'route', 'status')))
+        self.request_sql = self.add(Histogram(
+            'teklif_http_request_sql_seconds', 'Time spent in SQLite per request', ('route',)))
+        self.sql_statements = self.add(Counter(
+            'teklif_sql_statements_total', 'SQL statements executed', ('route',)))
+        self.json_seconds = self.add(Counter(
+            'teklif_json_serialize_seconds_total', 'Time spent encoding JSON responses', ('route',)))
+        self.outbound = self.add(Histogram(
+            'teklif_outbound_http_duration_seconds', 'Outbound HTTP time until response headers', ('host',)))
+        self.slow_requests = self.add(Counter(
+            'teklif_slow_requests_total', 'Requests slower than the slow-log threshold', ('route',)))
+        self._hosts = set()
+        self._instrumented_connection = self._make_connection_class()
+
+    @property
+    def connection_class(self):
+        """sqlite3 factory for new connections; the timed subclass only while metrics are on"""
+        return self._instrumented_connection if self.enabled else sqlite3.Connection
+
+    def add(self, collector):
+        """Register anything with a render() yielding exposition lines"""
+        self.collectors.append(collector)
+        return collector
+
+    def render(self):
+        return '\n'.join(line for collector in self.collectors for line in collector.render()) + '\n'
+
+    # --- Flask integration ---
+
+    def init_app(self, app):
+        self.logger = app.logger
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        # Time JSON responses (jsonify) of whichever provider the app uses
+        make_json_response = app.json.response
+
+        def timed_response(*args, **kwargs):
+            stats = _current_stats() if self.enabled else None
+            if stats is None:
+                return make_json_response(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return make_json_response(*args, **kwargs)
+            finally:
+                stats.json_seconds += perf_counter() - start
+
+        app.json.response = timed_response
+        # Read-only here; the app decides who may call configure()
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view, methods=['GET'])
+
+    def _before_request(self):
+        if self.enabled:
+            g._metrics = RequestStats()
+
+    def _after_request(self, response):
+        stats = g.get('_metrics')
+        if stats is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        args = (stats, request.method, route, request.full_path.rstrip('?'), response.status_code)
+        # A direct_passthrough body (send_file) is handed to the server as is and
+        # call_on_close never runs; it reads no SQL, so it is recorded now
+        if response.is_streamed and not response.direct_passthrough:
+            # The body (and the SQL reading it) is produced after this hook;
+            # the request is recorded once it has been sent
+            response.call_on_close(lambda: self._record(*args, conn=None))
+        else:
+            g.pop('_metrics')
+            self._record(*args, conn=g.get('db'))
+        return response
+
+    def _record(self, stats, method, route, path, status, conn):
+        elapsed = perf_counter() - stats.start
+        self.requests.observe(elapsed, method, route, status)
+        self.request_sql.observe(stats.sql_seconds, route)
+        self.sql_statements.inc(route, amount=stats.sql_count)
+        self.json_seconds.inc(route, amount=stats.json_seconds)
+        if elapsed * 1000 >= self.slow_ms:
+            self.slow_requests.inc(route)
+            self._log_slow_request(stats, elapsed, method, path, conn)
+
+    def configure(self, data):
+        """Apply {"enabled": bool, "slowMs": number} and return the settings; ValueError on a bad slowMs"""
+        slow_ms = self.slow_ms
+        if 'slowMs' in data:
+            try:
+                slow_ms = float(data['slowMs'])
+            except (TypeError, ValueError):
+                raise ValueError('slowMs must be a number')
+        if 'enabled' in data:
+            self.enabled = bool(data['enabled'])
+        self.slow_ms = slow_ms
+        return {'enabled': self.enabled, 'slowMs': self.slow_ms}
+
+    def _metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    # --- slow log ---
+
+    def _log_slow_request(self, stats, elapsed, method, path, conn):
+        lines = [
+            f'Slow request: {method} {path} {elapsed * 1000:.1f} ms '
+            f'(sql {stats.sql_seconds * 1000:.1f} ms in {stats.sql_count} statements, '
+            f'json {stats.json_seconds * 1000:.1f} ms, http {stats.http_seconds * 1000:.1f} ms)'
+        ]
+        # Query plans need the request's connection, which a finished stream has released
+        for seconds, sql, parameters in sorted(stats.statements, key=lambda s: s[0], reverse=True)[:SLOW_LOG_STATEMENTS]:
+            lines.append(f'  {seconds * 1000:8.1f} ms  {" ".join(sql.split())[:300]}')
+            if conn is not None:
+                lines.extend(f'              {detail}' for detail in self._query_plan(conn, sql, parameters))
+        self.logger.warning('\n'.join(lines))
+
+    @staticmethod
+    def _query_plan(conn, sql, parameters):
+        try:
+            # The base class method, so the EXPLAIN itself is not recorded
+            rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            return [f'(no plan: {e})']
+        return [row[-1] for row in rows]
+
+    # --- SQLite ---
+
+    def record_sql(self, sql, parameters, seconds):
+        stats = _current_stats()
+        if stats is None:
+            return
+        stats.sql_seconds += seconds
+        stats.sql_count += 1
+        stats.statements.append((seconds, sql, parameters))
+
+    def _make_connection_class(self):
+        metrics = self
+
+        def timed(method):
+            def wrapper(self, sql, parameters=()):
+                if not metrics.enabled:
+                    return method(self, sql, parameters)
+                start = perf_counter()
+                try:
+                    return method(self, sql, parameters)
+                finally:
+                    # executemany: the first parameter set is enough for a query plan
+                    if method.__name__ == 'executemany':
+                        parameters = next(iter(parameters), ()) if isinstance(parameters, (list, tuple)) else ()
+                    metrics.record_sql(sql, parameters, perf_counter() - start)
+            wrapper.__name__ = method.__name__
+            return wrapper
+
+        class InstrumentedCursor(sqlite3.Cursor):
+            execute = timed(sqlite3.Cursor.execute)
+            executemany = timed(sqlite3.Cursor.executemany)
+
+        class InstrumentedConnection(sqlite3.Connection):
+            """Times execute()/executemany() (up to the first result row) when metrics are on"""
+            execute = timed(sqlite3.Connection.execute)
+            executemany = timed(sqlite3.Connection.executemany)
+
+            def cursor(self, factory=InstrumentedCursor):
+                return super().cursor(factory)
+
+        return InstrumentedConnection
+
+    # --- outbound HTTP ---
+
+    def record_http(self, response, *args, **kwargs):
+        """requests response hook, per host; runs on the fetch thread, outside the request"""
+        if not self.enabled:
+            return
+        host = urlparse(response.url).netloc.lower()
+        if host not in self._hosts:
+            if len(self._hosts) >= MAX_HOST_LABELS:
+                host = 'other'
+            else:
+                self._hosts.add(host)
+        self.outbound.observe(response.elapsed.total_seconds(), host)
+
+    def record_http_wait(self, seconds):
+        """Time the request thread spent waiting on outbound fetches"""
+        stats = _current_stats()
+        if stats is not None:
+            stats.http_seconds += seconds
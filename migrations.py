@@ -0,0 +1,66 @@
+"""
+Schema migrations keyed on SQLite's PRAGMA user_version.
+
+Migrations are (version, function) pairs in ascending order; a database at
+user_version N gets every migration above N, each called with the connection.
+All pending migrations run in one write transaction (BEGIN IMMEDIATE), which
+doubles as the lock between gunicorn workers starting at the same time: the
+version is read again once the lock is held, so only the first worker applies
+anything and the others find the schema current. A database that is already
+current costs one PRAGMA read and no DDL.
+"""
+import sqlite3
+import time
+
+# How long a worker waits for another one to finish migrating
+LOCK_TIMEOUT = 600
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _begin_immediate(conn, timeout):
+    # busy_timeout covers ordinary writers; a long migration can hold the lock for longer
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) or time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def migrate(conn, migrations, lock_timeout=LOCK_TIMEOUT):
+    """Apply the migrations newer than the database's user_version; returns the versions applied.
+
+    The statistics are refreshed with ANALYZE afterwards, for the new tables and
+    indexes, and the WAL the migration wrote (index builds can write a lot) is
+    checkpointed, so readers do not start out searching a large log.
+    """
+    latest = migrations[-1][0]
+    if schema_version(conn) >= latest:
+        return []
+
+    _begin_immediate(conn, lock_timeout)
+    applied = []
+    try:
+        current = schema_version(conn)
+        for version, apply in migrations:
+            if version > current:
+                apply(conn)
+                # Inside the transaction: a failed migration leaves the version where it was
+                conn.execute(f'PRAGMA user_version = {int(version)}')
+                applied.append(version)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    if applied:
+        conn.execute('ANALYZE')
+        conn.commit()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return applied
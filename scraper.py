@@ -0,0 +1,374 @@
+"""
+Product page scraping: pooled keep-alive sessions per host, a TTL result cache
+and a streaming parser that stops reading as soon as it has what it needs.
+
+Outbound fetches (scraping and the image proxy) run on a FetchExecutor, which
+bounds how many run at once, overall and per host, and how many request
+threads may wait on them, so slow supplier sites cannot tie up the server.
+"""
+import codecs
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class ScrapeError(Exception):
+    """The page could not be fetched"""
+
+
+class FetchTimeout(ScrapeError):
+    """The fetch did not finish before its deadline"""
+
+
+class FetchBusy(Exception):
+    """Too many outbound fetches are queued or waited on; try again later"""
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, max_entries=512, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SessionPool:
+    """One keep-alive requests.Session per host, each with its own connection pool"""
+
+    def __init__(self, pool_size=4, response_hooks=()):
+        self.pool_size = pool_size
+        self.response_hooks = list(response_hooks)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = USER_AGENT
+                session.hooks['response'].extend(self.response_hooks)
+                self._sessions[host] = session
+            return session
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class FetchExecutor:
+    """Bounded thread pool for outbound fetches.
+
+    At most `max_workers` fetches run at once and at most `per_host` against any
+    one host; further fetches to a busy host wait in a per-host queue without
+    holding a pool thread. Fetches with the same key share one in-flight call.
+    Admission is bounded twice: at most `max_pending` fetches running or queued,
+    and at most `max_waiting` caller threads blocked on results; beyond either,
+    FetchBusy is raised at once. Callers wait until their deadline, after which
+    FetchTimeout is raised (the fetch itself keeps its own time budget).
+    `on_wait(seconds)` is called in the caller's thread after each wait.
+    """
+
+    def __init__(self, max_workers=16, per_host=4, max_pending=64, max_waiting=16, deadline=15, on_wait=None):
+        self.per_host = per_host
+        self.on_wait = on_wait
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch')
+        self._waiting = threading.BoundedSemaphore(max_waiting)
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future
+        self._running = {}   # host -> fetches running
+        self._queued = {}    # host -> deque of tasks waiting for a slot
+        self._pending = 0
+
+    def submit(self, key, url, fn):
+        """Future of fn(), a fetch of `url`; joins the in-flight call for `key` if there is one"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            if self._pending >= self.max_pending:
+                raise FetchBusy('Too many outbound fetches in progress')
+            self._pending += 1
+            future = self._inflight[key] = Future()
+            task = (key, host, fn, future)
+            if self._running.get(host, 0) < self.per_host:
+                self._running[host] = self._running.get(host, 0) + 1
+            else:
+                self._queued.setdefault(host, deque()).append(task)
+                return future
+        self._pool.submit(self._run, *task)
+        return future
+
+    def _run(self, key, host, fn, future):
+        try:
+            result = fn()
+        except BaseException as e:
+            outcome = (future.set_exception, e)
+        else:
+            outcome = (future.set_result, result)
+        with self._lock:
+            del self._inflight[key]
+            self._pending -= 1
+            queue = self._queued.get(host)
+            if queue:
+                next_task = queue.popleft()  # the host slot passes straight to it
+                if not queue:
+                    del self._queued[host]
+            else:
+                next_task = None
+                self._running[host] -= 1
+                if not self._running[host]:
+                    del self._running[host]
+        outcome[0](outcome[1])
+        if next_task is not None:
+            self._pool.submit(self._run, *next_task)
+
+    @contextmanager
+    def waiting(self):
+        """Count the calling thread as blocked on outbound fetches; FetchBusy past max_waiting"""
+        if not self._waiting.acquire(blocking=False):
+            raise FetchBusy('Too many requests waiting on outbound fetches')
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._waiting.release()
+            if self.on_wait is not None:
+                self.on_wait(time.monotonic() - start)
+
+    def gather(self, calls, timeout=None):
+        """Run (key, url, fn) calls and wait for all of them, at most `timeout` seconds.
+
+        Returns one result or exception per call, in order; FetchBusy is raised
+        if no more callers may wait.
+        """
+        with self.waiting():
+            futures = []
+            for key, url, fn in calls:
+                try:
+                    futures.append(self.submit(key, url, fn))
+                except FetchBusy as e:
+                    futures.append(e)
+            wait([f for f in futures if isinstance(f, Future)], timeout=self.deadline if timeout is None else timeout)
+
+        results = []
+        for future in futures:
+            if not isinstance(future, Future):
+                results.append(future)
+            elif not future.done():
+                results.append(FetchTimeout('Timed out waiting for the remote site'))
+            else:
+                results.append(future.exception() or future.result())
+        return results
+
+    def run(self, key, url, fn, timeout=None):
+        """fn()'s result for one call (see gather); its exception is raised"""
+        result = self.gather([(key, url, fn)], timeout)[0]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ProductMetaParser(HTMLParser):
+    """Collects og:/meta tags, the title and the first product-looking image.
+
+    `done` turns true once </head> has been seen and an image is known, so the
+    caller can stop reading the response.
+    """
+
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.meta = {}
+        self.title = ''
+        self.first_image = None
+        self.head_closed = False
+        self._in_title = False
+
+    @property
+    def done(self):
+        return self.head_closed and bool(self.meta.get('og:image') or self.first_image)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'meta':
+            key = (attrs.get('property') or attrs.get('name') or '').lower()
+            if key in ('og:image', 'og:title', 'og:description', 'description') and attrs.get('content'):
+                self.meta.setdefault(key, attrs['content'])
+        elif tag == 'title' and not self.title:
+            self._in_title = True
+        elif tag == 'body':
+            self.head_closed = True
+        elif tag == 'img' and self.first_image is None:
+            src = attrs.get('src') or attrs.get('data-src')
+            if src and 'logo' not in src.lower() and 'icon' not in src.lower():
+                self.first_image = urljoin(self.base_url, src)
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        elif tag == 'head':
+            self.head_closed = True
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+def extract_brand_model(title):
+    """Guess brand/model from 'Brand - Model - ...' titles, else the first words"""
+    brand = ''
+    model = ''
+    title_parts = title.split(' - ') if title else []
+    if len(title_parts) >= 2:
+        brand = title_parts[0].strip()
+        model = title_parts[1].strip()
+    elif title_parts:
+        words = title_parts[0].split()
+        brand = words[0] if words else ''
+        model = ' '.join(words[1:3]) if len(words) > 1 else ''
+    return brand, model
+
+
+def build_product_data(parser):
+    meta = parser.meta
+    image_url = urljoin(parser.base_url, meta['og:image']) if meta.get('og:image') else parser.first_image
+    title = (meta.get('og:title') or parser.title or '').strip()
+    description = meta.get('og:description') or meta.get('description') or ''
+    brand, model = extract_brand_model(title)
+    return {
+        'imageUrl': image_url,
+        'title': title[:200],
+        'brand': brand[:100],
+        'model': model[:100],
+        'description': description[:500]
+    }
+
+
+class Scraper:
+    """Fetches product pages and extracts their metadata.
+
+    Results are cached per URL. Fetches run on `executor`, which limits them per
+    host, coalesces identical in-flight URLs and enforces the deadline.
+    """
+
+    def __init__(self, sessions=None, cache=None, executor=None, timeout=10, max_bytes=1024 * 1024,
+                 chunk_size=16 * 1024):
+        self.executor = executor or FetchExecutor()
+        self.sessions = sessions or SessionPool(pool_size=self.executor.per_host)
+        self.cache = cache if cache is not None else TTLCache()
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+
+    def fetch(self, url, deadline=None):
+        """Stream `url` through the parser, stopping once the metadata is complete"""
+        parser = ProductMetaParser(url)
+        try:
+            response = self.sessions.for_url(url).get(url, timeout=self.timeout, stream=True)
+            try:
+                response.raise_for_status()
+                # requests assumes ISO-8859-1 for text/* without a charset; most pages are UTF-8
+                charset = response.encoding if 'charset' in response.headers.get('Content-Type', '').lower() else 'utf-8'
+                try:
+                    decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+                except LookupError:
+                    # Unknown or garbled charset= from the remote site
+                    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                read = 0
+                for chunk in response.iter_content(self.chunk_size):
+                    parser.feed(decoder.decode(chunk))
+                    read += len(chunk)
+                    if parser.done or read >= self.max_bytes:
+                        break
+                    # The read timeout applies per chunk; a page trickling in is cut off here
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise FetchTimeout('Page download took too long')
+            finally:
+                # Closing early drops the rest of the body instead of downloading it
+                response.close()
+        except requests.RequestException as e:
+            raise ScrapeError(str(e)) from e
+        return build_product_data(parser)
+
+    def _fetch_and_cache(self, url):
+        data = self.fetch(url, deadline=time.monotonic() + self.executor.deadline)
+        self.cache.set(url, data)
+        return data
+
+    def _call(self, url):
+        return ('scrape', url), url, lambda: self._fetch_and_cache(url)
+
+    def scrape(self, url):
+        data = self.cache.get(url)
+        if data is None:
+            data = self.executor.run(*self._call(url))
+        return data
+
+    def scrape_many(self, urls):
+        """Scrape `urls` concurrently; returns one result dict per URL, in order"""
+        results = {url: self.cache.get(url) for url in urls}
+        missing = list(dict.fromkeys(url for url, data in results.items() if data is None))
+        if missing:
+            results.update(zip(missing, self.executor.gather([self._call(url) for url in missing])))
+
+        def result(url):
+            data = results[url]
+            if isinstance(data, ScrapeError):
+                return {'url': url, 'success': False, 'error': f'Failed to fetch URL: {data}'}
+            if isinstance(data, FetchBusy):
+                return {'url': url, 'success': False, 'error': str(data)}
+            if isinstance(data, Exception):
+                return {'url': url, 'success': False, 'error': f'Scraping error: {data}'}
+            return {'url': url, 'success': True, 'data': data}
+
+        return [result(url) for url in urls]
@@ -0,0 +1,115 @@
+"""
+JSON encoding for API responses.
+
+FastJSONProvider is Flask's JSON provider backed by orjson when it is
+installed; without orjson it behaves like Flask's default provider.
+
+For whole-table list endpoints, query_json_objects() has SQLite encode each row
+with json_object(), so no sqlite3.Row, dict or per-row Python encoding is
+involved; rows_response() joins those texts a chunk at a time and streams the
+array once it outgrows a single chunk. Pages that are edited before encoding
+(quotes with their items) use row_dicts() on a plain tuple cursor instead.
+"""
+from flask import current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; the standard json module is used instead
+    orjson = None
+
+# Rows encoded per chunk of a streamed array
+ROW_CHUNK_SIZE = 1000
+
+if orjson is not None:
+    # Dates go through the provider's default() (HTTP dates), like with the json module
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Keys keep the column order; sorting them only costs time
+    sort_keys = False
+
+    def _indent(self):
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode('utf-8')
+
+    def dumps_bytes(self, obj):
+        """UTF-8 encoded JSON, without the str round trip of dumps()"""
+        if orjson is None:
+            return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+        return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        option = ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE
+        if self._indent():
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=option), mimetype=self.mimetype)
+
+
+def query_tuples(conn, sql, params=()):
+    """Execute on a cursor that returns plain tuples, whatever the connection's row factory"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(sql, params)
+
+
+def column_keys(cursor):
+    return [column[0] for column in cursor.description]
+
+
+def row_dicts(cursor, rows=None):
+    """Rows of a tuple cursor (or `rows` fetched from it) as dicts"""
+    keys = column_keys(cursor)
+    return [dict(zip(keys, row)) for row in (cursor if rows is None else rows)]
+
+
+def query_json_objects(conn, table, clause='', params=()):
+    """All columns of `table` as one JSON object text per row, built by SQLite.
+
+    `clause` is the rest of the statement (WHERE / ORDER BY). The keys are the
+    table's column names, as SELECT * would return them.
+    """
+    keys = [column[1] for column in query_tuples(conn, f'PRAGMA table_info({table})')]
+    pairs = ', '.join(f"'{key}', \"{key}\"" for key in keys)
+    return query_tuples(conn, f'SELECT json_object({pairs}) FROM {table} {clause}', params)
+
+
+def _encode_rows(rows):
+    # The elements of a JSON array, without the brackets
+    return ','.join([row[0] for row in rows]).encode('utf-8')
+
+
+def rows_response(cursor, chunk_size=ROW_CHUNK_SIZE):
+    """JSON array response of a query_json_objects() cursor.
+
+    Up to `chunk_size` rows are sent as one body; beyond that the array is
+    streamed, one joined chunk at a time, while rows are read from the cursor.
+    """
+    first = cursor.fetchmany(chunk_size)
+    if len(first) < chunk_size:
+        return current_app.response_class(b'[' + _encode_rows(first) + b']', mimetype='application/json')
+
+    def generate():
+        yield b'[' + _encode_rows(first)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield b',' + _encode_rows(rows)
+        yield b']'
+
+    # stream_with_context keeps the app context (and its pooled connection) alive while streaming
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
@@ -1,7 +1,16 @@
+import csv
+import gzip
+import io
+import json
+import os
 import requests
+import sqlite3
 import time
 import sys
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
 
 BASE_URL = "http://localhost:5000"
 
@@ -14,8 +23,7 @@ def test_health():
         print(f"❌ Server check failed: {e}")
         sys.exit(1)
 
-def test_customers():
-    # Create
+def create_customer():
     unique_name = f"Test Customer {uuid.uuid4().hex[:6]}"
     customer_data = {
         "name": unique_name,
@@ -29,17 +37,68 @@ def test_customers():
         
     cid = r.json()['id']
     print(f"✅ Customer created (ID: {cid})")
+    return cid
 
-    # Get
+def test_customers(cid):
     r = requests.get(f"{BASE_URL}/api/customers/{cid}")
     assert r.status_code == 200
-    assert r.json()['name'] == unique_name
+    assert r.json()['name'].startswith("Test Customer ")
     print("✅ Customer retrieval verified")
 
-    return cid
+def test_customer_pages():
+    tag = uuid.uuid4().hex[:6]
+    r = requests.post(f"{BASE_URL}/api/customers", json=[{"name": f"Page {n}", "company": f"Pager {tag}"} for n in range(5)])
+    created = sorted((res['id'] for res in r.json()['results']), reverse=True)
+
+    def walk(query, limit):
+        ids, after = [], ''
+        while True:
+            page = requests.get(f"{BASE_URL}/api/customers?{query}&limit={limit}&after={after}").json()
+            assert len(page['customers']) <= limit
+            ids += [c['id'] for c in page['customers']]
+            if page['next'] is None:
+                return ids, page['total']
+            after = page['next']
+
+    # Keyset pages across boundaries: every row once, newest first, nothing skipped
+    ids, total = walk(f"search={tag}", 2)
+    assert ids == created and total == 5, ids
+    ids, total = walk("", 3)
+    assert ids == sorted(set(ids), reverse=True) and len(ids) == total, (len(ids), total)
+    first = requests.get(f"{BASE_URL}/api/customers?limit=6").json()['customers']
+    assert ids[:6] == [c['id'] for c in first]
+
+    # The unfiltered total follows inserts and deletes
+    cid = create_customer()
+    assert requests.get(f"{BASE_URL}/api/customers?limit=1").json()['total'] == total + 1
+    requests.delete(f"{BASE_URL}/api/customers/{cid}")
+    assert requests.get(f"{BASE_URL}/api/customers?limit=1").json()['total'] == total
+    assert requests.get(f"{BASE_URL}/api/customers?after=not-a-cursor").status_code == 400
+    print("✅ Customer keyset paging verified")
 
-def test_products():
-    # Create
+def test_customer_search():
+    tag = uuid.uuid4().hex[:6]
+    digits = f"{int(tag, 16) % 10000000:07d}"
+    r = requests.post(f"{BASE_URL}/api/customers", json={
+        "name": f"Şükrü Işıkoğlu {tag}", "company": "Ağaç İşleri", "phone": f"0 (532) {digits[:3]} {digits[3:5]} {digits[5:]}"
+    })
+    cid = r.json()['id']
+
+    def found(q):
+        r = requests.get(f"{BASE_URL}/api/customers/search", params={"q": q, "limit": 50})
+        assert r.status_code == 200, r.text
+        return cid in [c['id'] for c in r.json()]
+
+    # Turkish letters fold either way, dotted and dotless i included
+    for q in (f"sukru isikoglu {tag}", f"ŞÜKRÜ IŞIKOĞLU {tag}", f"şükrü {tag}", f"agac isleri {tag}", f"AĞAÇ {tag}"):
+        assert found(q), q
+    # Phone: the digits with or without the 0 / 90 prefix, or the last digits
+    for q in (f"0532{digits}", f"532 {digits[:3]}", f"+90 532 {digits}", digits[-4:], f"{digits[3:5]} {digits[5:]}"):
+        assert found(q), q
+    assert not found(f"{digits[1:5]}999")
+    print("✅ Customer search verified")
+
+def create_product():
     unique_code = f"TEST-{uuid.uuid4().hex[:6]}"
     product_data = {
         "code": unique_code,
@@ -55,10 +114,105 @@ def test_products():
         
     pid = r.json()['id']
     print(f"✅ Product created (ID: {pid})")
-    
     return pid
 
-def test_quote(cid, pid):
+def test_products(pid):
+    unique_code = requests.get(f"{BASE_URL}/api/products/{pid}").json()['code']
+
+    # Catalog lookups, served from the in-memory catalog
+    r = requests.get(f"{BASE_URL}/api/products?codes={unique_code},NO-SUCH-CODE")
+    assert r.status_code == 200 and r.json()[0]['id'] == pid and r.json()[1] is None, r.text
+    assert any(p['id'] == pid for p in requests.get(f"{BASE_URL}/api/products").json())
+    print("✅ Product lookup by code verified")
+
+    # Typeahead: code prefix first, then words anywhere in code, name or description
+    r = requests.get(f"{BASE_URL}/api/products/search?q={unique_code.lower()}")
+    assert r.status_code == 200 and r.json()[0]['id'] == pid, r.text
+    r = requests.get(f"{BASE_URL}/api/products/search?q=prod {unique_code[5:]}")
+    assert [p['id'] for p in r.json()] == [pid], r.text
+    print("✅ Product search verified")
+
+def test_conditional_get():
+    # Collections are revalidated with the ETag from their table's version stamp
+    for collection in ("products", "customers", "quotes"):
+        r = requests.get(f"{BASE_URL}/api/{collection}")
+        etag = r.headers['ETag']
+        assert r.status_code == 200 and etag.startswith('W/'), r.headers
+        r = requests.get(f"{BASE_URL}/api/{collection}", headers={"If-None-Match": etag})
+        assert r.status_code == 304 and r.headers['ETag'] == etag and not r.content, r.status_code
+    # A write moves the version on, so the old ETag no longer matches
+    etag = requests.get(f"{BASE_URL}/api/products").headers['ETag']
+    create_product()
+    r = requests.get(f"{BASE_URL}/api/products", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers['ETag'] != etag and r.json(), r.status_code
+    print("✅ Conditional GET verified")
+
+def test_bulk_products():
+    tag = uuid.uuid4().hex[:6]
+    items = [{"code": f"BULK-{tag}-1", "name": "Bulk 1", "price": 10}, {"code": f"BULK-{tag}-1", "name": "Dup"}, {"name": "No code"}]
+    r = requests.post(f"{BASE_URL}/api/products", json=items)
+    assert r.status_code == 200, r.text
+    result = r.json()
+    assert result['succeeded'] == 1 and result['failed'] == 2, result
+    pid = result['results'][0]['id']
+
+    # Upsert by code, as for a supplier price list
+    r = requests.post(f"{BASE_URL}/api/products?upsert=1", json=[{"code": f"BULK-{tag}-1", "name": "Bulk 1", "price": 12}])
+    assert r.json()['results'][0] == {"success": True, "id": pid, "created": False}
+    assert requests.get(f"{BASE_URL}/api/products/{pid}").json()['price'] == 12
+    print("✅ Bulk product create verified")
+
+    # Code matches on an older product outrank more recent products naming the same words
+    newer = [{"code": f"NEW{n}-{tag}", "name": f"Kamera {tag}-1 {n}"} for n in range(250)]
+    assert requests.post(f"{BASE_URL}/api/products", json=newer).json()['succeeded'] == 250
+    r = requests.get(f"{BASE_URL}/api/products/search?q={tag}-1&limit=1")
+    assert [p['id'] for p in r.json()] == [pid], r.text
+    r = requests.get(f"{BASE_URL}/api/products/search?q=bulk-{tag}-1&limit=1")
+    assert [p['id'] for p in r.json()] == [pid], r.text
+    print("✅ Product search ranks code matches verified")
+
+def test_batch(cid, pid):
+    r = requests.post(f"{BASE_URL}/api/batch", json={"requests": [
+        f"customers/{cid}", {"path": f"products?ids={pid},0"}, "customers/0", {"path": "quotes", "method": "POST"}
+    ]})
+    assert r.status_code == 200, r.text
+    responses = r.json()['responses']
+    assert responses[0]['status'] == 200 and responses[0]['body']['id'] == cid
+    assert responses[1]['status'] == 200 and responses[1]['body'][0]['id'] == pid and responses[1]['body'][1] is None
+    assert [sub['status'] for sub in responses[2:]] == [404, 405]
+    for body in ([], "customers/1", {"requests": "customers/1"}):
+        r = requests.post(f"{BASE_URL}/api/batch", json=body)
+        assert r.status_code == 400 and 'error' in r.json(), r.text
+    print("✅ Batch requests verified")
+
+def test_changes():
+    # Start from the current head: a cursor past every version returns the latest one
+    head = requests.get(f"{BASE_URL}/api/changes?since={2**62}").json()['cursor']
+    tag = uuid.uuid4().hex[:6]
+    pids = [requests.post(f"{BASE_URL}/api/products", json={"code": f"SYNC-{tag}-{n}", "name": f"Sync {n}"}).json()['id']
+            for n in range(3)]
+    cid = requests.post(f"{BASE_URL}/api/customers", json={"name": f"Sync {tag}"}).json()['id']
+    requests.put(f"{BASE_URL}/api/products/{pids[0]}", json={"code": f"SYNC-{tag}-0", "name": "Sync renamed"})
+    requests.delete(f"{BASE_URL}/api/products/{pids[1]}")
+
+    # Small pages over several tables: every change arrives once, in version order
+    cursor, more, seen, deleted = head, True, [], []
+    while more:
+        page = requests.get(f"{BASE_URL}/api/changes?since={cursor}&limit=2").json()
+        rows = [(table, row['id']) for table, table_rows in page['changes'].items() for row in table_rows]
+        tombstones = [(table, id) for table, ids in page['deleted'].items() for id in ids]
+        assert 0 < len(rows) + len(tombstones) <= 2 and page['cursor'] > cursor, page
+        seen += rows
+        deleted += tombstones
+        cursor, more = page['cursor'], page['more']
+    assert len(seen) == len(set(seen)), seen
+    assert set(seen) >= {('products', pids[0]), ('products', pids[2]), ('customers', cid)}, seen
+    assert ('products', pids[1]) not in seen and ('products', pids[1]) in deleted, deleted
+    renamed = requests.get(f"{BASE_URL}/api/changes?since={head}&tables=products").json()['changes']['products']
+    assert [p['name'] for p in renamed if p['id'] == pids[0]] == ["Sync renamed"]
+    print("✅ Change feed paging and tombstones verified")
+
+def create_quote(cid, pid):
     # Quote number
     r = requests.get(f"{BASE_URL}/api/quote-number")
     assert r.status_code == 200
@@ -91,11 +245,464 @@ def test_quote(cid, pid):
     
     return qid
 
+def test_quote_update(cid, pid):
+    qid = create_quote(cid, pid)
+    created_at = requests.get(f"{BASE_URL}/api/quotes/{qid}").json()['createdAt']
+    other = create_product()
+
+    def history(product_id):
+        return [h for h in requests.get(f"{BASE_URL}/api/price-history?productId={product_id}").json() if h['quoteId'] == qid]
+
+    # A full edit rewrites the lines and the price history, dated like the quote
+    line = {"productId": other, "productCode": "OTHER", "productName": "Other", "quantity": 3, "unitPrice": 55.0, "unit": "Adet"}
+    r = requests.put(f"{BASE_URL}/api/quotes/{qid}", json={
+        "customerId": cid, "status": "sent", "total": 165.0, "currency": "USD", "validDays": 30, "items": [line]
+    })
+    assert r.status_code == 200, r.text
+    quote = requests.get(f"{BASE_URL}/api/quotes/{qid}").json()
+    assert [(i['productId'], i['quantity'], i['unitPrice']) for i in quote['items']] == [(other, 3, 55.0)], quote
+    assert history(pid) == []
+    assert [(h['customerId'], h['price'], h['createdAt']) for h in history(other)] == [(cid, 55.0, created_at)]
+
+    # A status-only update leaves both alone (same price_history ids, so not rewritten)
+    before = history(other)
+    r = requests.put(f"{BASE_URL}/api/quotes/{qid}", json={"status": "accepted"})
+    assert r.status_code == 200, r.text
+    after = requests.get(f"{BASE_URL}/api/quotes/{qid}").json()
+    assert after['status'] == "accepted" and after['items'] == quote['items'], after
+    assert history(other) == before and history(pid) == []
+    print("✅ Quote update verified")
+
+def test_price_summary():
+    buyer, other = create_customer(), create_customer()
+    sold, unsold = create_product(), create_product()
+    for customer_id, price in ((buyer, 100.0), (other, 80.0), (buyer, 120.0)):
+        r = requests.post(f"{BASE_URL}/api/quotes", json={
+            "customerId": customer_id, "status": "draft", "total": price, "currency": "USD", "validDays": 30,
+            "items": [{"productId": sold, "productCode": "S", "productName": "Sold", "quantity": 1, "unitPrice": price}]
+        })
+        assert r.status_code == 201, r.text
+
+    # In the order of productIds, products without history included
+    r = requests.get(f"{BASE_URL}/api/price-history/summary?productIds={unsold},{sold}&customerId={buyer}")
+    assert r.status_code == 200, r.text
+    none, summary = r.json()
+    assert none['productId'] == unsold and none['count'] == 0 and none['lastPriceForCustomer'] is None, none
+    assert summary['productId'] == sold and summary['count'] == 3, summary
+    assert (summary['min'], summary['max']) == (80.0, 120.0) and abs(summary['average'] - 100.0) < 1e-9
+    assert summary['lastPriceForCustomer']['price'] == 120.0
+    # The other customers only: the buyer's own prices are left out
+    assert summary['averageForOthers'] == {'average': 80.0, 'count': 1}, summary
+
+    r = requests.get(f"{BASE_URL}/api/price-history/summary?productId={sold}&perCustomer=1")
+    assert r.json()['averageForOthers'] == {'average': 100.0, 'count': 3}
+    assert {(p['customerId'], p['price']) for p in r.json()['lastPrices']} == {(buyer, 120.0), (other, 80.0)}
+
+    for query in (f"productIds={sold},x", "productIds=", "customerId=1"):
+        r = requests.get(f"{BASE_URL}/api/price-history/summary?{query}")
+        assert r.status_code == 400 and 'error' in r.json(), query
+    print("✅ Price history summary verified")
+
+def test_quote_numbers(cid):
+    # Reservations and quotes allocating their own number, all at once: every number once, none skipped
+    quote = {"customerId": cid, "status": "draft", "total": 1.0, "currency": "USD", "validDays": 30, "allocateNumber": True}
+    def reserve(n):
+        if n % 2:
+            return requests.post(f"{BASE_URL}/api/quotes", json=quote).json()['quoteNumber']
+        return requests.post(f"{BASE_URL}/api/quote-number").json()['quoteNumber']
+    with ThreadPoolExecutor(8) as pool:
+        numbers = list(pool.map(reserve, range(40)))
+    assert len(set(numbers)) == 40, sorted(numbers)
+    sequence = sorted(int(n.rsplit('-', 1)[1]) for n in numbers)
+    assert sequence == list(range(sequence[0], sequence[0] + 40)), sequence
+    # The preview is the number after the last one handed out
+    preview = requests.get(f"{BASE_URL}/api/quote-number").json()['quoteNumber']
+    assert int(preview.rsplit('-', 1)[1]) == sequence[-1] + 1, preview
+    print("✅ Concurrent quote numbers verified")
+
+def test_quote(qid):
+    r = requests.get(f"{BASE_URL}/api/quotes/{qid}")
+    assert r.status_code == 200 and r.json()['items'][0]['quantity'] == 1, r.text
+    quote = r.json()
+    filters = {'customerId': quote['customerId'], 'productId': quote['items'][0]['productId']}
+    for name, value in filters.items():
+        listed = requests.get(f"{BASE_URL}/api/quotes", params={name: value}).json()['quotes']
+        assert qid in [q['id'] for q in listed], name
+        # Not silently dropped, which would list every quote
+        for bad in ('abc', f'{value}.5'):
+            r = requests.get(f"{BASE_URL}/api/quotes", params={name: bad})
+            assert r.status_code == 400 and r.json()['error'] == f'{name} must be an integer', r.text
+    print("✅ Quote retrieval verified")
+
+def test_metrics():
+    r = requests.get(f"{BASE_URL}/metrics")
+    assert r.status_code == 200 and 'teklif_http_request_duration_seconds' in r.text
+    # Switching collection is for logged-in users only
+    r = requests.put(f"{BASE_URL}/metrics", json={"enabled": False}, allow_redirects=False)
+    assert r.status_code == 302 and '/login' in r.headers['Location'], r.status_code
+    assert 'teklif_http_request_duration_seconds' in requests.get(f"{BASE_URL}/metrics").text
+    print("✅ Metrics endpoint verified")
+
+def test_bulk_quotes(cid):
+    quote = {"customerId": cid, "status": "draft", "total": 10.0, "currency": "USD", "validDays": 30}
+    r = requests.post(f"{BASE_URL}/api/quotes", json=[quote, {**quote, "customerId": cid + 0.7}, {**quote, "customerId": True}])
+    assert r.status_code == 200, r.text
+    results = r.json()['results']
+    assert results[0]['success'] and requests.get(f"{BASE_URL}/api/quotes/{results[0]['id']}").json()['customerId'] == cid
+    assert [res.get('error') for res in results[1:]] == ["Not an integer: customerId"] * 2, results
+    # Rejected the same way on the single-quote path, rather than truncated
+    r = requests.post(f"{BASE_URL}/api/quotes", json={**quote, "customerId": cid + 0.7})
+    assert r.status_code == 400 and 'error' in r.json(), r.text
+    print("✅ Bulk quote create verified")
+
+def test_exports(qid):
+    # CSV: UTF-8 BOM for Excel, a header row, quotes flattened to one row per line item
+    r = requests.get(f"{BASE_URL}/api/export/quotes")
+    assert r.status_code == 200 and r.headers['Content-Type'].startswith('text/csv'), r.text
+    assert 'attachment' in r.headers['Content-Disposition']
+    text = r.content.decode('utf-8')
+    assert text.startswith('\ufeff')
+    rows = [row for row in csv.DictReader(io.StringIO(text[1:])) if row['quoteId'] == str(qid)]
+    assert len(rows) == 1 and float(rows[0]['lineTotal']) == 100.0, rows
+
+    # NDJSON: one object per line
+    r = requests.get(f"{BASE_URL}/api/export/quotes?format=ndjson")
+    assert r.headers['Content-Type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [line['quantity'] for line in lines if line['quoteId'] == qid] == [1], lines[-1]
+
+    # gzip is the same export, compressed
+    plain = requests.get(f"{BASE_URL}/api/export/customers?format=ndjson").content
+    r = requests.get(f"{BASE_URL}/api/export/customers?format=ndjson&gzip=1")
+    assert r.headers['Content-Type'] == 'application/gzip' and gzip.decompress(r.content) == plain
+
+    assert requests.get(f"{BASE_URL}/api/export/users").status_code == 404
+    assert requests.get(f"{BASE_URL}/api/export/quotes?format=xml").status_code == 400
+    print("✅ CSV/NDJSON exports verified")
+
+def test_stats(qid):
+    r = requests.get(f"{BASE_URL}/api/stats")
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats['customers'] >= 1 and stats['products'] >= 1 and stats['quotes'] >= 1
+    assert len(stats['recentQuotes']) <= 5
+    # ?recent is clamped to 0..50; a negative value must not lift the LIMIT
+    assert requests.get(f"{BASE_URL}/api/stats?recent=-1").json()['recentQuotes'] == []
+    print(f"✅ Dashboard stats verified ({stats['quotes']} quotes)")
+
+class StubProductPage(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # /bad-charset: a charset Python has no codec for, read as UTF-8
+        charset = 'x-no-such-charset' if self.path.startswith('/bad-charset') else 'utf-8'
+        body = (
+            '<html><head><title>Hikvision - DS-2CD1043 - Kamera</title>'
+            '<meta property="og:image" content="/img/cam.jpg">'
+            '<meta name="description" content="4MP IP kamera"></head><body>' + 'x' * 100000 + '</body></html>'
+        ).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', f'text/html; charset={charset}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_scrape():
+    # Local stub supplier site so the scraper can be exercised offline
+    stub = HTTPServer(('127.0.0.1', 0), StubProductPage)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    page_url = f"http://127.0.0.1:{stub.server_port}/product"
+
+    r = requests.post(f"{BASE_URL}/api/scrape-product", json={"url": page_url})
+    assert r.status_code == 200, r.text
+    data = r.json()['data']
+    assert data['brand'] == 'Hikvision' and data['model'] == 'DS-2CD1043'
+    assert data['imageUrl'] == f"http://127.0.0.1:{stub.server_port}/img/cam.jpg"
+    print("✅ Product scrape verified")
+
+    r = requests.post(f"{BASE_URL}/api/scrape-product", json={"url": f"http://127.0.0.1:{stub.server_port}/bad-charset"})
+    assert r.status_code == 200 and r.json()['data']['model'] == 'DS-2CD1043', r.text
+    for body in ([page_url], page_url):
+        r = requests.post(f"{BASE_URL}/api/scrape-product", json=body)
+        assert r.status_code == 400 and 'error' in r.json(), r.text
+
+    r = requests.post(f"{BASE_URL}/api/scrape-products", json={"urls": [page_url, "http://127.0.0.1:1/none"]})
+    assert r.status_code == 200
+    results = r.json()['results']
+    assert results[0]['success'] and not results[1]['success']
+    print("✅ Bulk scrape verified")
+
+    for body in ([page_url], page_url):
+        r = requests.post(f"{BASE_URL}/api/scrape-products", json=body)
+        assert r.status_code == 400 and 'error' in r.json(), r.text
+    stub.shutdown()
+
+class StubImage(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        if self.path.startswith('/huge'):
+            self.send_header('Content-Length', str(30 * 1024 * 1024))
+        self.end_headers()
+        try:
+            if self.path.startswith('/slow'):
+                # The first part, then a pause: the proxy should pass it on at once
+                self.wfile.write(b'\x89PNG' + b'a' * 4096)
+                self.wfile.flush()
+                time.sleep(1.5)
+                self.wfile.write(b'b' * 4096)
+            else:
+                # Until the proxy gives up and closes the connection
+                deadline = time.monotonic() + 10
+                while time.monotonic() < deadline:
+                    self.wfile.write(b'x' * 65536)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+def test_proxy_image():
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), StubImage)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{stub.server_port}"
+    tag = uuid.uuid4().hex[:6]
+
+    started = time.monotonic()
+    r = requests.get(f"{BASE_URL}/api/proxy-image", params={"url": f"{base}/slow-{tag}.png"}, stream=True)
+    assert r.status_code == 200 and r.headers['Content-Type'] == 'image/png', r.text
+    chunks = r.iter_content(None)
+    first = next(chunks)
+    first_byte = time.monotonic() - started
+    body = first + b''.join(chunks)
+    assert first_byte < 1.0 and time.monotonic() - started >= 1.5, first_byte
+    assert len(body) == 4 + 8192
+    # Served from the cache the second time
+    r = requests.get(f"{BASE_URL}/api/proxy-image", params={"url": f"{base}/slow-{tag}.png"})
+    assert r.content == body and r.headers.get('ETag'), r.headers
+    print(f"✅ Image proxy streaming verified (first byte after {first_byte * 1000:.0f} ms)")
+
+    # Over the size cap: refused from the declared length, or cut off once the cap is passed
+    started = time.monotonic()
+    r = requests.get(f"{BASE_URL}/api/proxy-image", params={"url": f"{base}/huge-{tag}.png"})
+    assert r.status_code == 400 and r.json()['error'] == 'Image too large', r.text
+    try:
+        r = requests.get(f"{BASE_URL}/api/proxy-image", params={"url": f"{base}/endless-{tag}.png"})
+        assert len(r.content) <= 20 * 1024 * 1024, len(r.content)
+    except requests.exceptions.ChunkedEncodingError:
+        pass
+    assert time.monotonic() - started < 8
+    stub.shutdown()
+    print("✅ Image size cap verified")
+
+def test_import():
+    tag = uuid.uuid4().hex[:6]
+    csv_data = (
+        "Firma;Ad Soyad;Telefon;E-posta\n"
+        f"Import Co;Import {tag};;import-{tag}@example.com\n"
+        f"Import Co;Import {tag} Dup;;IMPORT-{tag}@example.com\n"
+        "Import Co;;;\n"
+    ).encode('utf-8')
+    r = requests.post(f"{BASE_URL}/api/customers/import", files={"file": ("customers.csv", csv_data)})
+    assert r.status_code == 200, r.text
+    result = r.json()
+    assert result['inserted'] == 1 and result['duplicates'] == 1 and result['errorCount'] == 1, result
+    print("✅ Customer import verified")
+
+def test_import_job():
+    tag = uuid.uuid4().hex[:6]
+    csv_data = f"Ad Soyad;Telefon\nJob {tag};0532 {int(tag, 16) % 10000000:07d}\n".encode('utf-8')
+    r = requests.post(f"{BASE_URL}/api/customers/import?async=1", files={"file": ("customers.csv", csv_data)})
+    assert r.status_code == 202, r.text
+    status_url = r.headers['Location']
+    for _ in range(50):
+        job = requests.get(f"{BASE_URL}{status_url}").json()
+        if job['status'] in ('succeeded', 'failed'):
+            break
+        time.sleep(0.2)
+    assert job['status'] == 'succeeded' and job['result']['inserted'] == 1, job
+    print("✅ Background import job verified")
+
+def test_metrics_timings(caplog):
+    # In-process only: reads the slow-request log and switches metrics directly
+    import re
+    import web
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), StubImage)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    slow_ms, web.metrics.slow_ms = web.metrics.slow_ms, 0
+    try:
+        url = f"http://127.0.0.1:{stub.server_port}/slow-{uuid.uuid4().hex[:6]}.png"
+        r = requests.get(f"{BASE_URL}/api/proxy-image", params={"url": url, "w": 80})
+        assert r.status_code == 200, r.text
+    finally:
+        web.metrics.slow_ms = slow_ms
+        stub.shutdown()
+    # The wait on the fetch thread is counted against the request
+    logged = [m for m in (record.getMessage() for record in caplog.records) if m.startswith('Slow request: GET /api/proxy-image')]
+    assert logged and float(re.search(r'http ([\d.]+) ms', logged[-1]).group(1)) >= 1000, logged
+
+    # Switched off, new connections skip the timing wrappers
+    web.metrics.enabled = False
+    try:
+        conn = web.get_db_connection()
+        assert type(conn) is sqlite3.Connection
+        conn.close()
+    finally:
+        web.metrics.enabled = True
+
+def test_image_cache(tmp_path):
+    # In-process only: thumbnails on first request, index files counted and evicted with their blob
+    from PIL import Image
+    from image_cache import ImageCache
+
+    def png(shade):
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300), (shade, 0, 0)).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def store(cache, url, body):
+        writer, created = cache.download(url)
+        assert created
+        writer.start('image/png')
+        writer.write(body)
+        writer.commit()
+
+    cache = ImageCache(str(tmp_path / 'cache'))
+    store(cache, 'http://img/a.png', png(10))
+    original = cache.lookup('http://img/a.png')
+    assert os.listdir(os.path.dirname(original.path)) == [os.path.basename(original.path)]
+    thumb = cache.lookup('http://img/a.png', 50)
+    assert thumb.path == original.path + '.w80' and thumb.content_type == 'image/jpeg'
+    with Image.open(thumb.path) as image:
+        assert image.width == 80
+    # Not a raster image: the original, without trying again
+    store(cache, 'http://img/b.svg', b'<svg/>')
+    assert cache.lookup('http://img/b.svg', 80).content_type == 'image/png'
+    assert cache._size == cache._disk_usage() > 0
+
+    small = ImageCache(str(tmp_path / 'small'), max_bytes=len(png(1)) * 2)
+    small._account(0)
+    for shade in range(1, 5):
+        store(small, f'http://img/{shade}.png', png(shade))
+        time.sleep(0.01)  # distinct mtimes for the LRU order
+    assert small._size == small._disk_usage() <= small.max_bytes
+    assert small.lookup('http://img/1.png') is None and small.lookup('http://img/4.png') is not None
+    assert len(os.listdir(os.path.join(small.root, 'index'))) < 4
+    print("✅ Image cache thumbnails and eviction verified")
+
+def test_catalog_cache():
+    # In-process only: a separate cache over the test database, refreshed after writes
+    import web
+    from catalog import CatalogCache
+    cache = CatalogCache(web.app.json.dumps_bytes)
+    conn = web.get_db_connection()
+    try:
+        assert cache.get(conn) is not None
+        kept, renamed, deleted = create_product(), create_product(), create_product()
+        code = requests.get(f"{BASE_URL}/api/products/{renamed}").json()['code']
+        requests.put(f"{BASE_URL}/api/products/{renamed}", json={"code": code + "-R", "name": "Renamed"})
+        requests.delete(f"{BASE_URL}/api/products/{deleted}")
+        assert cache.current(conn) is None
+
+        # Only the changed rows and tombstones are read, not the whole table
+        statements = []
+        conn.set_trace_callback(statements.append)
+        snapshot = cache.get(conn)
+        conn.set_trace_callback(None)
+        assert all('version >' in sql for sql in statements if 'FROM products' in sql), statements
+        assert snapshot.by_id[renamed]['name'] == "Renamed" and snapshot.by_code[code + "-R"]['id'] == renamed
+        assert code not in snapshot.by_code and deleted not in snapshot.by_id and kept in snapshot.by_id
+        assert cache.current(conn) is snapshot
+        expected = [dict(row) for row in conn.execute('SELECT * FROM products ORDER BY id DESC')]
+        assert json.loads(cache.body(snapshot)) == expected
+
+        # Over max_bytes nothing is kept
+        assert CatalogCache(web.app.json.dumps_bytes, max_bytes=1).get(conn) is None
+    finally:
+        conn.close()
+
+def test_migrations(tmp_path):
+    # In-process only: a database left at schema v1 is brought up to date by init_db()
+    import web
+    from migrations import migrate, schema_version
+    path = str(tmp_path / 'v1.db')
+    conn = web.get_db_connection(path)
+    assert migrate(conn, web.MIGRATIONS[:1]) == [1]
+    conn.execute("INSERT INTO products (code, name, createdAt) VALUES ('OLD-4MP-1', 'Eski Kamera', '2024-01-01')")
+    conn.commit()
+    conn.close()
+
+    web.init_db(path)
+    conn = web.get_db_connection(path)
+    try:
+        assert schema_version(conn) == web.MIGRATIONS[-1][0]
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'idx_quotes_created', 'idx_products_code_nocase'} <= indexes, indexes
+        # Rows from before v3 are backfilled into the trigram index
+        assert [row[0] for row in conn.execute("SELECT code FROM products_fts WHERE products_fts MATCH '4mp'")] == ['OLD-4MP-1']
+        # A current database is left alone
+        assert migrate(conn, web.MIGRATIONS) == []
+    finally:
+        conn.close()
+
+    # A database from before migrations (user_version 0) ends up with the same
+    # schema as a new one, its rows carried over
+    def schema(path):
+        conn = web.get_db_connection(path)
+        try:
+            return sorted(tuple(row) for row in conn.execute('SELECT type, name, sql FROM sqlite_master'))
+        finally:
+            conn.close()
+
+    fresh, old = str(tmp_path / 'fresh.db'), str(tmp_path / 'old.db')
+    web.init_db(fresh)
+    conn = web.get_db_connection(old)
+    web.schema_v1(conn)
+    conn.execute("INSERT INTO customers (name, phone, createdAt) VALUES ('Şükrü Işık', '0 (532) 111 22 33', '2024-01-01')")
+    conn.execute("""INSERT INTO quotes (quoteNumber, customerId, status, total, currency, items, createdAt)
+                    VALUES ('TKL-2024-0001', 1, 'accepted', 50, 'TRY', '[{"productName": "Kablo", "quantity": 2, "unitPrice": 25}]', '2024-01-01')""")
+    conn.commit()
+    conn.close()
+    web.init_db(old)
+    assert schema(old) == schema(fresh)
+    conn = web.get_db_connection(old)
+    try:
+        for search in ('ışık', 'sukru', '2233'):
+            assert [row[0] for row in conn.execute('SELECT rowid FROM customers_fts WHERE customers_fts MATCH ?',
+                                                   (web.customer_match_query(search),))] == [1], search
+        assert [tuple(row) for row in conn.execute('SELECT productName, quantity FROM quote_items')] == [('Kablo', 2)]
+        assert tuple(conn.execute("SELECT total, quoteCount FROM revenue_stats WHERE currency = 'TRY'").fetchone()) == (50, 1)
+        assert conn.execute("SELECT rowCount FROM table_stats WHERE tableName = 'customers'").fetchone()[0] == 1
+        assert conn.execute('SELECT version FROM customers').fetchone()[0] > 0
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
     # Wait for server to start
     time.sleep(1)
     test_health()
-    cid = test_customers()
-    pid = test_products()
-    test_quote(cid, pid)
+    cid = create_customer()
+    test_customers(cid)
+    test_customer_pages()
+    test_customer_search()
+    pid = create_product()
+    test_products(pid)
+    test_conditional_get()
+    test_bulk_products()
+    test_batch(cid, pid)
+    test_changes()
+    qid = create_quote(cid, pid)
+    test_quote(qid)
+    test_quote_update(cid, pid)
+    test_price_summary()
+    test_quote_numbers(cid)
+    test_bulk_quotes(cid)
+    test_exports(qid)
+    test_stats(qid)
+    test_metrics()
+    test_scrape()
+    test_proxy_image()
+    test_import()
+    test_import_job()
     print("\n🎉 All API tests passed!")
@@ -1,16 +1,64 @@
 import os
 import sqlite3
 import json
+import base64
+import re
+import threading
+import mimetypes
+import csv
+import io
+import zlib
+import time
+import tempfile
 import requests
-from bs4 import BeautifulSoup
-from flask import Flask, jsonify, request, send_from_directory, Response, session, redirect, url_for
+import urllib3
+from flask import Flask, jsonify, request, send_from_directory, send_file, Response, make_response, stream_with_context, session, redirect, url_for, g
 from datetime import datetime
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse, urlsplit, parse_qs
 from functools import wraps
+from werkzeug.exceptions import NotFound
+from scraper import FetchBusy, FetchExecutor, Scraper, ScrapeError, SessionPool, TTLCache
+from image_cache import ImageCache, ImageTooLarge
+from importer import import_customers, read_rows, ImportFormatError, CREATE_STAGING, INSERT_STAGING, MOVE_STAGING
+from jobs import JobQueue, JobFailed, JobInterrupted
+import assets
+from metrics import Metrics
+from migrations import migrate, schema_version
+from catalog import CatalogCache
+from serialization import FastJSONProvider, query_json_objects, query_tuples, row_dicts, rows_response
 
 app = Flask(__name__, static_url_path='', static_folder='.')
+# orjson-backed when installed; set before metrics.init_app, which times it
+app.json = FastJSONProvider(app)
 app.secret_key = 'nextai-teklif-sistemi-2026-secret-key'
-DB_NAME = 'sales_quote.db'
+DB_NAME = os.environ.get('TEKLIF_DB', 'sales_quote.db')
+
+# Connection pooling; TEKLIF_DB_POOL=0 opens a fresh connection per request (used by the benchmarks)
+app.config['DB_POOL'] = os.environ.get('TEKLIF_DB_POOL', '1') != '0'
+app.config['DB_POOL_SIZE'] = int(os.environ.get('TEKLIF_DB_POOL_SIZE', 8))
+
+# Request/SQL/HTTP timings at /metrics; TEKLIF_METRICS=0 starts with them off (PUT /metrics toggles, logged in)
+metrics = Metrics(
+    enabled=os.environ.get('TEKLIF_METRICS', '1') != '0',
+    slow_ms=float(os.environ.get('TEKLIF_SLOW_MS', 500))
+)
+metrics.init_app(app)
+
+# Product catalog kept in memory per worker, invalidated by the products version
+catalog = metrics.add(CatalogCache(
+    app.json.dumps_bytes,
+    max_bytes=int(os.environ.get('CATALOG_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+))
+
+# Per-connection tuning, applied whenever a connection is opened
+DB_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -20000',     # 20 MB page cache
+    'PRAGMA mmap_size = 268435456',   # 256 MB memory map
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA analysis_limit = 1000',   # ANALYZE samples, so it stays quick on big tables
+)
 
 # Login credentials - multiple users
 VALID_USERS = {
@@ -26,15 +74,374 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
+def get_db_connection(db_name=None):
+    # Pooled connections move between request threads, never used by two at once
+    conn = sqlite3.connect(db_name or DB_NAME, factory=metrics.connection_class, check_same_thread=False, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    conn = get_db_connection()
+def close_db_connection(conn):
+    # Refreshes the statistics of tables this connection's queries found stale
+    try:
+        conn.execute('PRAGMA optimize')
+    except sqlite3.Error:
+        pass
+    conn.close()
+
+class ConnectionPool:
+    """Idle SQLite connections shared by the request threads of one worker process"""
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the inherited connections belong to the parent
+                self._idle = []
+                self._pid = os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        return get_db_connection()
+
+    def release(self, conn):
+        # A connection opened before metrics were switched on or off is replaced,
+        # so a disabled process runs on plain sqlite3 connections
+        current = type(conn) is metrics.connection_class
+        with self._lock:
+            if current and self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        close_db_connection(conn)
+
+db_pool = ConnectionPool(app.config['DB_POOL_SIZE'])
+
+def get_db():
+    """Connection for the current app context; returned to the pool on teardown"""
+    if 'db' not in g:
+        g.db = db_pool.acquire() if app.config['DB_POOL'] else get_db_connection()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop('db', None)
+    if conn is None:
+        return
+    if conn.in_transaction:
+        conn.rollback()
+    if app.config['DB_POOL']:
+        db_pool.release(conn)
+    else:
+        close_db_connection(conn)
+
+# Background jobs (see jobs.py), run by JOB_WORKERS threads per process. They
+# start with the first request a process serves, so scripts importing this
+# module (importer.py, benchmark.py) never pick up jobs.
+job_queue = JobQueue(
+    get_db_connection,
+    workers=int(os.environ.get('JOB_WORKERS', 2)),
+    shutdown_timeout=float(os.environ.get('JOB_SHUTDOWN_TIMEOUT', 20))
+)
+job_queue.logger = app.logger
+app.before_request(job_queue.start)
+JOB_FILES_DIR = os.environ.get('JOB_FILES_DIR', 'job_files')
+
+def wants_async():
+    return request.args.get('async') == '1'
+
+def job_accepted(job_id):
+    """202 pointing at the job's status URL"""
+    status_url = url_for('get_job', id=job_id)
+    response = jsonify({'jobId': job_id, 'status': 'queued', 'statusUrl': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+def parse_ids(value, max_ids=500):
+    """Parse a comma separated id list such as '1,2,3'; returns None if it is invalid"""
+    try:
+        ids = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        return None
+    return ids if 0 < len(ids) <= max_ids else None
+
+def add_date_range(where, params, column):
+    """Apply ?dateFrom= / ?dateTo= to `column`; a bare YYYY-MM-DD dateTo includes that whole day"""
+    # createdAt is stored as an ISO string, so date bounds compare lexically
+    date_from = request.args.get('dateFrom', '', type=str)
+    if date_from:
+        where.append(f'{column} >= ?')
+        params.append(date_from)
+    date_to = request.args.get('dateTo', '', type=str)
+    if date_to:
+        where.append(f'{column} < ?')
+        params.append(date_to + '\uffff' if len(date_to) == 10 else date_to)
+
+# Tables with change tracking (updatedAt, version, tombstones) for /api/changes
+SYNC_TABLES = ('customers', 'products', 'quotes')
+
+# Tables each collection response is built from; quote rows embed the customer name
+COLLECTION_SOURCES = {
+    'customers': ('customers',),
+    'products': ('products',),
+    'quotes': ('quotes', 'customers'),
+}
+
+def collection_etag(conn, collection):
+    tables = COLLECTION_SOURCES[collection]
+    placeholders = ','.join('?' * len(tables))
+    versions = dict(conn.execute(f'SELECT tableName, version FROM table_stats WHERE tableName IN ({placeholders})', tables).fetchall())
+    return f"{collection}-{'.'.join(str(versions.get(t, 0)) for t in tables)}"
+
+def versioned(collection):
+    """Weak ETag from the table version stamps; If-None-Match is answered with 304 before the view runs"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            etag = collection_etag(get_db(), collection)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # Cacheable, but only after revalidating
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+def fetch_by_ids(conn, table, ids):
+    """Fetch rows of `table` in the order of `ids`, with None for ids that do not exist"""
+    if table == 'products':
+        # Not worth refreshing the catalog for; behind a write, SQLite answers
+        snapshot = catalog.current(conn)
+        if snapshot is not None:
+            return [snapshot.by_id.get(i) for i in ids]
+    placeholders = ','.join('?' * len(ids))
+    rows = {row['id']: dict(row) for row in conn.execute(f'SELECT * FROM {table} WHERE id IN ({placeholders})', ids)}
+    result = [rows.get(i) for i in ids]
+    if table == 'quotes':
+        attach_quote_items(conn, [d for d in result if d])
+    return result
+
+def multi_get(table):
+    """Handle the ?ids=1,2,3 shortcut of a collection endpoint"""
+    ids = parse_ids(request.args.get('ids', '', type=str))
+    if ids is None:
+        return jsonify({'error': 'ids must be a comma separated list of up to 500 integers'}), 400
+    conn = get_db()
+    result = fetch_by_ids(conn, table, ids)
+    return jsonify(result)
+
+# Bulk POSTs: a JSON array instead of one object. Items are validated first;
+# the valid ones are written in one transaction and the response carries one
+# result per item, in request order.
+MAX_BULK_ITEMS = 5000
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def validate_bulk_items(items, required, numeric=(), integer=()):
+    """Errors by item index, for items that are not objects or lack a required field, number or integer"""
+    errors = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[index] = 'Item must be an object'
+            continue
+        missing = [f for f in required if item.get(f) in (None, '')]
+        if missing:
+            errors[index] = f"Missing {', '.join(missing)}"
+            continue
+        invalid = [f for f in numeric if item.get(f) is not None and not is_number(item[f])]
+        if invalid:
+            errors[index] = f"Not a number: {', '.join(invalid)}"
+            continue
+        invalid = [f for f in integer if item.get(f) is not None and not is_integer(item[f])]
+        if invalid:
+            errors[index] = f"Not an integer: {', '.join(invalid)}"
+    return errors
+
+def mark_duplicates(errors, keys, message):
+    """Flag items whose key (index -> key) repeats one earlier in the request"""
+    seen = set()
+    for index, key in keys.items():
+        if key in seen:
+            errors.setdefault(index, message)
+        seen.add(key)
+
+def existing_values(conn, table, column, values):
+    """The subset of `values` already present in table.column"""
+    return {row[0] for row in conn.execute(
+        f'SELECT {column} FROM {table} WHERE {column} IN (SELECT value FROM json_each(?))', (json.dumps(list(values)),))}
+
+def inserted_ids(conn, table, count):
+    """Ids of the last `count` rows inserted into an AUTOINCREMENT table.
+
+    Only valid inside the write transaction that inserted them, which
+    allocates consecutive ids.
+    """
+    last = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()[0]
+    return range(last - count + 1, last + 1)
+
+def bulk_response(size, errors, written):
+    """`written` maps the index of each stored item to the fields of its result"""
+    results = [{'success': False, 'error': errors[i]} if i in errors else {'success': True, **written[i]}
+               for i in range(size)]
+    return jsonify({'results': results, 'succeeded': len(written), 'failed': len(errors)})
+
+def bulk_size_error():
+    return jsonify({'error': f'Expected an array of 1 to {MAX_BULK_ITEMS} items'}), 400
+
+def phone_digits_sql(expr):
+    """SQL expression stripping the usual phone number punctuation from `expr`"""
+    for ch in ' -().+/':
+        expr = f"replace({expr}, '{ch}', '')"
+    return expr
+
+# E.164 numbers have at most 15 digits
+PHONE_MAX_DIGITS = 15
+
+def reversed_sql(expr, length=PHONE_MAX_DIGITS):
+    """SQL expression reversing the first `length` characters of `expr` (SQLite has no reverse())"""
+    return ' || '.join(f'substr({expr}, {i}, 1)' for i in range(length, 0, -1))
+
+def customer_fts_insert_sql(where):
+    """INSERT feeding customers_fts from the customers rows matched by `where`"""
+    return f'''
+        INSERT INTO customers_fts (rowid, name, company, phone)
+        SELECT id, replace(name, 'ı', 'i'), replace(COALESCE(company, ''), 'ı', 'i'),
+               CASE WHEN d = '' THEN '' ELSE d || ' ' ||
+                   CASE WHEN length(d) = 12 AND substr(d, 1, 2) = '90' THEN substr(d, 3) ELSE ltrim(d, '0') END
+                   || ' r' || {reversed_sql('d')}
+               END
+        FROM (SELECT id, name, company, {phone_digits_sql("COALESCE(phone, '')")} AS d FROM customers {where})
+    '''
+
+def create_customer_fts_triggers(c):
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers
+        BEGIN
+            {customer_fts_insert_sql('WHERE id = new.id')};
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers
+        BEGIN
+            DELETE FROM customers_fts WHERE rowid = old.id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE OF name, company, phone ON customers
+        BEGIN
+            DELETE FROM customers_fts WHERE rowid = old.id;
+            {customer_fts_insert_sql('WHERE id = new.id')};
+        END
+    ''')
+
+def customer_match_query(search):
+    """Build an FTS5 MATCH expression for free-text customer search, or None if nothing is searchable"""
+    search = search.replace('ı', 'i')
+    if re.fullmatch(r'[\d\s().+/-]+', search):
+        # Phone number: match the digits-only form, with or without the 0 / 90 prefix,
+        # or its last digits ('8556'), kept reversed behind an 'r' so they are a prefix too
+        digits = re.sub(r'\D', '', search)
+        variants = {digits, digits.lstrip('0'), digits[2:] if digits.startswith('90') else ''} - {''}
+        if digits:
+            variants.add('r' + digits[::-1])
+        return 'phone : (' + ' OR '.join(f'"{v}"*' for v in sorted(variants)) + ')' if variants else None
+    tokens = re.findall(r'\w+', search)
+    return ' '.join(f'"{t}"*' for t in tokens) or None
+
+# Turkish letters are folded to ASCII in products_fts and in product searches;
+# the trigram tokenizer folds case but not diacritics
+PRODUCT_SEARCH_FOLD = {'ç': 'c', 'ğ': 'g', 'ı': 'i', 'ö': 'o', 'ş': 's', 'ü': 'u',
+                       'Ç': 'c', 'Ğ': 'g', 'İ': 'i', 'Ö': 'o', 'Ş': 's', 'Ü': 'u'}
+
+def product_fold_sql(expr):
+    """SQL expression applying PRODUCT_SEARCH_FOLD to `expr`"""
+    for ch, ascii_ch in PRODUCT_SEARCH_FOLD.items():
+        expr = f"replace({expr}, '{ch}', '{ascii_ch}')"
+    return expr
+
+def product_fts_insert_sql(where):
+    """INSERT feeding products_fts from the products rows matched by `where`"""
+    return f'''
+        INSERT INTO products_fts (rowid, code, name, description)
+        SELECT id, {product_fold_sql("COALESCE(code, '')")}, {product_fold_sql('name')},
+               {product_fold_sql("COALESCE(description, '')")}
+        FROM products {where}
+    '''
+
+def product_search_terms(search):
+    """FTS5 MATCH of the words of 3+ characters in a product search (None if there are none),
+    and all of its words, folded as products_fts holds them"""
+    words = search.translate(str.maketrans(PRODUCT_SEARCH_FOLD)).lower().split()
+    match = ' '.join('"' + w.replace('"', '""') + '"' for w in words if len(w) >= 3)
+    return match or None, words
+
+QUOTE_ITEM_FIELDS = ('productId', 'productCode', 'productName', 'quantity', 'unitPrice', 'unit')
+QUOTE_ITEM_INSERT = f'''
+    INSERT INTO quote_items (quoteId, position, {', '.join(QUOTE_ITEM_FIELDS)})
+    VALUES (?, ?, {', '.join('?' * len(QUOTE_ITEM_FIELDS))})
+'''
+
+def quote_item_rows(quote_id, items):
+    return [(quote_id, position) + tuple(item.get(f) for f in QUOTE_ITEM_FIELDS)
+            for position, item in enumerate(items) if isinstance(item, dict)]
+
+PRICE_HISTORY_INSERT = '''
+    INSERT INTO price_history (productId, customerId, quoteId, price, createdAt)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+def price_history_rows(quote_id, customer_id, items, created_at):
+    return [(item['productId'], customer_id, quote_id, item.get('unitPrice'), created_at)
+            for item in items if isinstance(item, dict) and item.get('productId') is not None]
+
+def write_quote_items(conn, quote_id, customer_id, items, created_at):
+    """Replace a quote's lines and the price history derived from them; caller commits"""
+    conn.execute('DELETE FROM quote_items WHERE quoteId = ?', (quote_id,))
+    conn.execute('DELETE FROM price_history WHERE quoteId = ?', (quote_id,))
+    conn.executemany(QUOTE_ITEM_INSERT, quote_item_rows(quote_id, items))
+    conn.executemany(PRICE_HISTORY_INSERT, price_history_rows(quote_id, customer_id, items, created_at))
+
+def attach_quote_items(conn, quotes):
+    """Load the lines of `quotes` (dicts with an id) with one query and set their 'items'"""
+    by_id = {d['id']: d for d in quotes}
+    for d in quotes:
+        d['items'] = []
+    if not by_id:
+        return quotes
+    placeholders = ','.join('?' * len(by_id))
+    for row in conn.execute(f'''
+        SELECT quoteId, {', '.join(QUOTE_ITEM_FIELDS)} FROM quote_items
+        WHERE quoteId IN ({placeholders}) ORDER BY quoteId, position
+    ''', list(by_id)):
+        by_id[row['quoteId']]['items'].append({f: row[f] for f in QUOTE_ITEM_FIELDS})
+    return quotes
+
+# --- Schema ---
+# Ordered migrations, applied by migrations.migrate() on PRAGMA user_version.
+# A new database and one from before migrations (user_version 0, the tables of
+# schema_v1 already there) go through the same steps. Every step is
+# re-runnable, so databases stamped by the earlier layout, where schema_v1
+# built everything up to the job queue, simply repeat the later ones.
+# Append new ones; never edit one that has shipped.
+
+def schema_v1(conn):
+    """The tables the app had before migrations"""
     c = conn.cursor()
-    
+
     # Customers table
     c.execute('''
         CREATE TABLE IF NOT EXISTS customers (
@@ -72,7 +479,7 @@ def init_db():
             status TEXT,
             total REAL,
             currency TEXT,
-            items TEXT, -- JSON string
+            items TEXT, -- legacy JSON blob, migrated to quote_items
             validDays INTEGER,
             notes TEXT,
             createdAt TEXT,
@@ -94,9 +501,330 @@ def init_db():
             FOREIGN KEY (quoteId) REFERENCES quotes (id)
         )
     ''')
-    
-    conn.commit()
-    conn.close()
+
+def schema_v2(conn):
+    """Dashboard counters, kept up to date by triggers so /api/stats never scans the data tables"""
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS table_stats (
+            tableName TEXT PRIMARY KEY,
+            rowCount INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS revenue_stats (
+            currency TEXT PRIMARY KEY,
+            total REAL NOT NULL DEFAULT 0,
+            quoteCount INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    for table in ('customers', 'products', 'quotes'):
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_stats_ai AFTER INSERT ON {table}
+            BEGIN
+                UPDATE table_stats SET rowCount = rowCount + 1 WHERE tableName = '{table}';
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_stats_ad AFTER DELETE ON {table}
+            BEGIN
+                UPDATE table_stats SET rowCount = rowCount - 1 WHERE tableName = '{table}';
+            END
+        ''')
+
+    # Accepted revenue per currency
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS quotes_revenue_ai AFTER INSERT ON quotes
+        WHEN new.status = 'accepted'
+        BEGIN
+            INSERT INTO revenue_stats (currency, total, quoteCount)
+            VALUES (COALESCE(new.currency, 'USD'), COALESCE(new.total, 0), 1)
+            ON CONFLICT(currency) DO UPDATE SET total = total + excluded.total, quoteCount = quoteCount + 1;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS quotes_revenue_ad AFTER DELETE ON quotes
+        WHEN old.status = 'accepted'
+        BEGIN
+            UPDATE revenue_stats SET total = total - COALESCE(old.total, 0), quoteCount = quoteCount - 1
+            WHERE currency = COALESCE(old.currency, 'USD');
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS quotes_revenue_au AFTER UPDATE OF status, total, currency ON quotes
+        WHEN old.status = 'accepted' OR new.status = 'accepted'
+        BEGIN
+            UPDATE revenue_stats SET total = total - COALESCE(old.total, 0), quoteCount = quoteCount - 1
+            WHERE old.status = 'accepted' AND currency = COALESCE(old.currency, 'USD');
+            INSERT INTO revenue_stats (currency, total, quoteCount)
+            SELECT COALESCE(new.currency, 'USD'), COALESCE(new.total, 0), 1 WHERE new.status = 'accepted'
+            ON CONFLICT(currency) DO UPDATE SET total = total + excluded.total, quoteCount = quoteCount + 1;
+        END
+    ''')
+
+    # Seed the counters once; the triggers above already exist at this point,
+    # so rows written concurrently are either counted here or by the triggers
+    seeded = c.execute('SELECT COUNT(*) FROM table_stats').fetchone()[0]
+    for table in ('customers', 'products', 'quotes'):
+        c.execute(f'''
+            INSERT OR IGNORE INTO table_stats (tableName, rowCount)
+            SELECT '{table}', COUNT(*) FROM {table}
+        ''')
+    if not seeded:
+        c.execute('''
+            INSERT OR IGNORE INTO revenue_stats (currency, total, quoteCount)
+            SELECT COALESCE(currency, 'USD'), SUM(COALESCE(total, 0)), COUNT(*)
+            FROM quotes WHERE status = 'accepted' GROUP BY COALESCE(currency, 'USD')
+        ''')
+
+def schema_v3(conn):
+    """Quote listing filters by customer while walking ids newest first"""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quotes_customer ON quotes (customerId, id)')
+
+def schema_v4(conn):
+    """Customer search index"""
+    # unicode61 with remove_diacritics folds case and İ/Ş/Ğ/Ü/Ö/Ç; the dotless ı
+    # is mapped to i explicitly. The phone column holds the digits-only number
+    # plus its national form so '532...' matches '0 (532) ...'
+    fts_existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'customers_fts'").fetchone()
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+            name, company, phone,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+    create_customer_fts_triggers(conn)
+    if not fts_existed:
+        conn.execute(customer_fts_insert_sql('WHERE id NOT IN (SELECT rowid FROM customers_fts)'))
+
+def schema_v5(conn):
+    """Per-year quote number sequence; rows are created on first use of a year"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quote_sequences (
+            year INTEGER PRIMARY KEY,
+            lastNumber INTEGER NOT NULL
+        )
+    ''')
+
+def schema_v6(conn):
+    """Price lookups by product (and customer)"""
+    # price is included so the summary aggregates are answered from the index alone
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_price_history_product ON price_history (productId, customerId, createdAt, price)')
+
+def schema_v7(conn):
+    """Quote lines, one row each; replaces the JSON blob in quotes.items"""
+    items_existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'quote_items'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quote_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quoteId INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            productId INTEGER,
+            productCode TEXT,
+            productName TEXT,
+            quantity NUMERIC,
+            unitPrice REAL,
+            unit TEXT,
+            FOREIGN KEY (quoteId) REFERENCES quotes (id),
+            FOREIGN KEY (productId) REFERENCES products (id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quote_items_quote ON quote_items (quoteId, position)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quote_items_product ON quote_items (productId, quoteId)')
+    if not items_existed:
+        for row in conn.execute('SELECT id, items FROM quotes WHERE items IS NOT NULL').fetchall():
+            try:
+                items = json.loads(row['items']) or []
+            except ValueError:
+                items = []
+            conn.executemany(QUOTE_ITEM_INSERT, quote_item_rows(row['id'], items))
+        conn.execute('UPDATE quotes SET items = NULL WHERE items IS NOT NULL')
+
+def schema_v8(conn):
+    """Change tracking: version stamps for ETags and /api/changes, tombstones for deletes"""
+    c = conn.cursor()
+
+    # updatedAt for people, version (a value of the shared counter in
+    # table_stats) for sync cursors
+    backfill_versions = []
+    for table in SYNC_TABLES:
+        columns = {row[1] for row in c.execute(f'PRAGMA table_info({table})')}
+        if 'updatedAt' not in columns:
+            c.execute(f'ALTER TABLE {table} ADD COLUMN updatedAt TEXT')
+        if 'version' not in columns:
+            c.execute(f'ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+            backfill_versions.append(table)
+        c.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_version ON {table} (version)')
+    if 'version' not in {row[1] for row in c.execute('PRAGMA table_info(table_stats)')}:
+        c.execute('ALTER TABLE table_stats ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+    # Tombstones: one row per deleted record, stamped like the changes
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS deleted_rows (
+            version INTEGER PRIMARY KEY,
+            tableName TEXT NOT NULL,
+            rowId INTEGER NOT NULL,
+            deletedAt TEXT
+        )
+    ''')
+
+    # Any write moves the table (ETags) and the written row (/api/changes) to
+    # the next value of one counter shared by all tables. The row stamp is an
+    # UPDATE of version/updatedAt only, which the UPDATE OF triggers below do
+    # not react to.
+    bump_version = """
+        UPDATE table_stats SET version = (SELECT MAX(version) FROM table_stats) + 1 WHERE tableName = '{table}';
+    """
+    stamp_row = """
+        UPDATE {table} SET version = (SELECT version FROM table_stats WHERE tableName = '{table}'),
+                           updatedAt = strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')
+        WHERE id = new.id;
+    """
+    for table in SYNC_TABLES:
+        for suffix in ('ai', 'au', 'ad'):
+            c.execute(f'DROP TRIGGER IF EXISTS {table}_version_{suffix}')  # superseded by {table}_changes_*
+        data_columns = [row[1] for row in c.execute(f'PRAGMA table_info({table})') if row[1] not in ('id', 'version', 'updatedAt')]
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_changes_ai AFTER INSERT ON {table}
+            BEGIN
+                {bump_version.format(table=table)}
+                {stamp_row.format(table=table)}
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_changes_au AFTER UPDATE OF {', '.join(data_columns)} ON {table}
+            BEGIN
+                {bump_version.format(table=table)}
+                {stamp_row.format(table=table)}
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_changes_ad AFTER DELETE ON {table}
+            BEGIN
+                {bump_version.format(table=table)}
+                INSERT INTO deleted_rows (version, tableName, rowId, deletedAt)
+                VALUES ((SELECT version FROM table_stats WHERE tableName = '{table}'), '{table}', old.id,
+                        strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+            END
+        ''')
+
+    # Rows that predate change tracking get distinct versions above the
+    # counter, so a full sync can page through them by version
+    for table in backfill_versions:
+        c.execute(f'''
+            UPDATE {table} SET version = (SELECT COALESCE(MAX(version), 0) FROM table_stats) + id,
+                               updatedAt = COALESCE(updatedAt, createdAt)
+        ''')
+        c.execute(f'''
+            UPDATE table_stats SET version = (SELECT COALESCE(MAX(version), 0) FROM {table})
+            WHERE tableName = '{table}' AND EXISTS (SELECT 1 FROM {table})
+        ''')
+
+def schema_v9(conn):
+    """Background jobs (see jobs.py); runAt and heartbeatAt are unix times"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            maxAttempts INTEGER NOT NULL DEFAULT 3,
+            runAt REAL NOT NULL,
+            lockedBy TEXT,
+            heartbeatAt REAL,
+            createdAt TEXT,
+            startedAt TEXT,
+            finishedAt TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, runAt)')
+
+def schema_v10(conn):
+    """Indexes for lookups that scanned whole tables"""
+    # delete_quote removes a quote's price history
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_price_history_quote ON price_history (quoteId)')
+    # Customer search without a term lists by name
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_customers_name ON customers (name)')
+    # Date-filtered quote listing and exports
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quotes_created ON quotes (createdAt)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_price_history_created ON price_history (createdAt)')
+
+def schema_v11(conn):
+    """Product search: code prefix index and trigram index on code, name and description"""
+    # Case-insensitive code prefixes are range scans on this index
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_products_code_nocase ON products (code COLLATE NOCASE)')
+    # Trigrams match any substring of 3+ characters ('4mp', '2cd20')
+    fts_existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone()
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            code, name, description,
+            tokenize = 'trigram'
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products
+        BEGIN
+            {product_fts_insert_sql('WHERE id = new.id')};
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products
+        BEGIN
+            DELETE FROM products_fts WHERE rowid = old.id;
+        END
+    ''')
+    # Price list upserts write the text columns back unchanged; those rows keep their index entries
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF code, name, description ON products
+        WHEN old.code IS NOT new.code OR old.name IS NOT new.name OR old.description IS NOT new.description
+        BEGIN
+            DELETE FROM products_fts WHERE rowid = old.id;
+            {product_fts_insert_sql('WHERE id = new.id')};
+        END
+    ''')
+    if not fts_existed:
+        conn.execute(product_fts_insert_sql(''))
+
+def schema_v12(conn):
+    """Customer phone search by the last digits: the reversed number joins the phone column"""
+    for suffix in ('ai', 'ad', 'au'):
+        conn.execute(f'DROP TRIGGER IF EXISTS customers_fts_{suffix}')
+    create_customer_fts_triggers(conn)
+    conn.execute('DELETE FROM customers_fts')
+    conn.execute(customer_fts_insert_sql(''))
+
+MIGRATIONS = [
+    (1, schema_v1),
+    (2, schema_v2),
+    (3, schema_v3),
+    (4, schema_v4),
+    (5, schema_v5),
+    (6, schema_v6),
+    (7, schema_v7),
+    (8, schema_v8),
+    (9, schema_v9),
+    (10, schema_v10),
+    (11, schema_v11),
+    (12, schema_v12),
+]
+
+def init_db(db_name=None):
+    """Bring the database up to the latest schema; a current one is left untouched"""
+    conn = get_db_connection(db_name)
+    try:
+        if schema_version(conn) < MIGRATIONS[-1][0]:
+            # WAL is persistent; lets readers run alongside a writer across gunicorn workers.
+            # Set outside the migration transaction, which it cannot run in.
+            conn.execute('PRAGMA journal_mode = WAL')
+            migrate(conn, MIGRATIONS)
+    finally:
+        conn.close()
 
 # Initialize DB on start
 init_db()
@@ -167,49 +895,116 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
+@app.route('/metrics', methods=['PUT'])
+@login_required
+def configure_metrics():
+    """Switch metrics collection on or off, or change the slow-request threshold"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object with enabled and/or slowMs'}), 400
+    try:
+        return jsonify(metrics.configure(data))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# Fingerprinted assets (see assets.py), rebuilt at startup when a source changed.
+# Raw sources stay reachable through the static folder, e.g. for the login page.
+ASSET_BUILD_DIR = os.path.abspath(os.environ.get('ASSET_BUILD_DIR', os.path.join(app.root_path, 'build')))
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+try:
+    asset_manifest = assets.ensure_built(app.root_path, ASSET_BUILD_DIR)
+except OSError as e:
+    # e.g. a read-only checkout: fall back to serving the unbuilt index.html
+    print(f"Asset build failed, serving raw assets: {e}")
+    asset_manifest = None
+
 @app.route('/')
 @login_required
 def index():
-    return send_from_directory('.', 'index.html')
+    if asset_manifest is not None:
+        response = send_from_directory(ASSET_BUILD_DIR, 'index.html')
+    else:
+        response = send_from_directory('.', 'index.html')
+    # The page itself must always be revalidated; it names the current asset versions
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Hashed build output, cached forever; precompressed variant if the client accepts it"""
+    assets_dir = os.path.join(ASSET_BUILD_DIR, 'assets')
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if not request.accept_encodings[encoding]:
+            continue
+        try:
+            response = send_from_directory(assets_dir, filename + suffix, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+        except NotFound:
+            continue
+        response.headers['Content-Encoding'] = encoding
+        break
+    else:
+        response = send_from_directory(assets_dir, filename, mimetype=mimetype, max_age=ASSET_MAX_AGE)
 
-# Static file serving handled by Flask configuration
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
 
 # --- API Endpoints ---
 
 # CUSTOMERS
 @app.route('/api/customers', methods=['GET'])
+@versioned('customers')
 def get_customers():
-    # Pagination parameters
+    if 'ids' in request.args:
+        return multi_get('customers')
+
+    # Pagination parameters; `after` is the keyset cursor returned as `next`,
+    # `page` is kept for older clients
     page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 50, type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
     search = request.args.get('search', '', type=str)
+    after = request.args.get('after', '', type=str)
+
+    after_id = None
+    if after:
+        after_id = decode_cursor(after)
+        if after_id is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    offset = 0 if after_id is not None else (max(page, 1) - 1) * limit
+    position = 'AND f.rowid < ?' if after_id is not None else ''
+    match = customer_match_query(search)
+    conn = get_db()
     
-    offset = (page - 1) * limit
-    conn = get_db_connection()
-    
-    if search:
-        # Search in name, company, phone
-        search_param = f'%{search}%'
-        customers = conn.execute(
-            'SELECT * FROM customers WHERE name LIKE ? OR company LIKE ? OR phone LIKE ? ORDER BY id DESC LIMIT ? OFFSET ?',
-            (search_param, search_param, search_param, limit, offset)
-        ).fetchall()
-        total = conn.execute(
-            'SELECT COUNT(*) FROM customers WHERE name LIKE ? OR company LIKE ? OR phone LIKE ?',
-            (search_param, search_param, search_param)
-        ).fetchone()[0]
+    if search.strip() and not match:
+        customers, total = [], 0
+    elif match:
+        # Search in name, company, phone through the full-text index
+        params = [match] + ([after_id] if after_id is not None else []) + [limit + 1, offset]
+        customers = conn.execute(f'''
+            SELECT c.* FROM customers_fts f JOIN customers c ON c.id = f.rowid
+            WHERE customers_fts MATCH ? {position} ORDER BY f.rowid DESC LIMIT ? OFFSET ?
+        ''', params).fetchall()
+        total = conn.execute('SELECT COUNT(*) FROM customers_fts WHERE customers_fts MATCH ?', (match,)).fetchone()[0]
     else:
-        customers = conn.execute('SELECT * FROM customers ORDER BY id DESC LIMIT ? OFFSET ?', (limit, offset)).fetchall()
-        total = conn.execute('SELECT COUNT(*) FROM customers').fetchone()[0]
-    
-    conn.close()
+        params = ([after_id] if after_id is not None else []) + [limit + 1, offset]
+        customers = conn.execute(f'''
+            SELECT * FROM customers {'WHERE id < ?' if after_id is not None else ''} ORDER BY id DESC LIMIT ? OFFSET ?
+        ''', params).fetchall()
+        # Unfiltered total comes from the trigger-maintained counter, not a scan
+        total = conn.execute("SELECT rowCount FROM table_stats WHERE tableName = 'customers'").fetchone()[0]
+
+    has_more = len(customers) > limit
+    customers = customers[:limit]
     
     return jsonify({
         'customers': [dict(row) for row in customers],
         'total': total,
         'page': page,
         'limit': limit,
-        'pages': (total + limit - 1) // limit
+        'pages': (total + limit - 1) // limit,
+        'next': encode_cursor(customers[-1]['id']) if has_more else None
     })
 
 @app.route('/api/customers/search', methods=['GET'])
@@ -217,24 +1012,25 @@ def search_customers():
     query = request.args.get('q', '', type=str)
     limit = request.args.get('limit', 10, type=int)
     
-    conn = get_db_connection()
-    if query:
-        search_param = f'%{query}%'
-        customers = conn.execute(
-            'SELECT id, name, company, phone FROM customers WHERE name LIKE ? OR company LIKE ? OR phone LIKE ? ORDER BY name LIMIT ?',
-            (search_param, search_param, search_param, limit)
-        ).fetchall()
+    match = customer_match_query(query)
+    conn = get_db()
+    if query.strip() and not match:
+        customers = []
+    elif match:
+        # Best matches first; name hits weigh more than company or phone hits
+        customers = conn.execute('''
+            SELECT c.id, c.name, c.company, c.phone FROM customers_fts f JOIN customers c ON c.id = f.rowid
+            WHERE customers_fts MATCH ? ORDER BY bm25(customers_fts, 10.0, 5.0, 1.0), c.name LIMIT ?
+        ''', (match, limit)).fetchall()
     else:
         customers = conn.execute('SELECT id, name, company, phone FROM customers ORDER BY name LIMIT ?', (limit,)).fetchall()
-    conn.close()
     
     return jsonify([dict(row) for row in customers])
 
 @app.route('/api/customers/<int:id>', methods=['GET'])
 def get_customer(id):
-    conn = get_db_connection()
+    conn = get_db()
     customer = conn.execute('SELECT * FROM customers WHERE id = ?', (id,)).fetchone()
-    conn.close()
     if customer:
         return jsonify(dict(customer))
     return jsonify({'error': 'Customer not found'}), 404
@@ -242,8 +1038,10 @@ def get_customer(id):
 @app.route('/api/customers', methods=['POST'])
 def create_customer():
     data = request.json
+    if isinstance(data, list):
+        return create_customers(data)
     data['createdAt'] = datetime.now().isoformat()
-    conn = get_db_connection()
+    conn = get_db()
     cur = conn.cursor()
     cur.execute('''
         INSERT INTO customers (name, company, email, phone, address, createdAt)
@@ -251,51 +1049,162 @@ def create_customer():
     ''', (data['name'], data.get('company'), data.get('email'), data.get('phone'), data.get('address'), data['createdAt']))
     conn.commit()
     new_id = cur.lastrowid
-    conn.close()
     return jsonify({'id': new_id, **data}), 201
 
+def create_customers(items):
+    """Bulk create; rows go through the importer's staging table (one FTS flush for the batch)"""
+    if not 0 < len(items) <= MAX_BULK_ITEMS:
+        return bulk_size_error()
+    errors = validate_bulk_items(items, ('name',))
+    for index, item in enumerate(items):
+        if index not in errors and item.get('email') and '@' not in str(item['email']):
+            errors[index] = f"Invalid e-mail: {item['email']}"
+    valid = [i for i in range(len(items)) if i not in errors]
+    created_at = datetime.now().isoformat()
+
+    conn = get_db()
+    conn.execute(CREATE_STAGING)
+    conn.execute('BEGIN IMMEDIATE')
+    conn.executemany(INSERT_STAGING, [
+        (items[i]['name'], items[i].get('company'), items[i].get('email'), items[i].get('phone'),
+         items[i].get('address'), created_at) for i in valid
+    ])
+    conn.execute(MOVE_STAGING)
+    conn.execute('DELETE FROM temp.customer_import')
+    ids = inserted_ids(conn, 'customers', len(valid)) if valid else []
+    conn.commit()
+    return bulk_response(len(items), errors, {i: {'id': id} for i, id in zip(valid, ids)})
+
+@app.route('/api/customers/import', methods=['POST'])
+def import_customers_file():
+    """Bulk import from an uploaded .xlsx/.csv ('file'); ?columns=name,phone overrides the mapping, ?async=1 runs it as a job"""
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'file is required'}), 400
+    columns = request.args.get('columns')
+    if wants_async():
+        # ?async=1: the upload is kept on disk and imported by a job
+        os.makedirs(JOB_FILES_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(upload.filename or '')[1], dir=JOB_FILES_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            upload.save(f)
+        payload = {'path': path, 'filename': upload.filename, 'columns': columns.split(',') if columns else None}
+        return job_accepted(job_queue.enqueue(get_db(), 'import-customers', payload))
+    try:
+        rows = read_rows(upload.stream, upload.filename)
+        result = import_customers(get_db(), rows, columns.split(',') if columns else None)
+    except (ImportFormatError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
 @app.route('/api/customers/<int:id>', methods=['PUT'])
 def update_customer(id):
     data = request.json
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute('''
         UPDATE customers SET name=?, company=?, email=?, phone=?, address=?
         WHERE id=?
     ''', (data['name'], data.get('company'), data.get('email'), data.get('phone'), data.get('address'), id))
     conn.commit()
-    conn.close()
     return jsonify({'id': id, **data})
 
 @app.route('/api/customers/<int:id>', methods=['DELETE'])
 def delete_customer(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute('DELETE FROM customers WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 # PRODUCTS
 @app.route('/api/products', methods=['GET'])
+@versioned('products')
 def get_products():
-    conn = get_db_connection()
-    products = conn.execute('SELECT * FROM products ORDER BY id DESC').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in products])
+    if 'ids' in request.args:
+        return multi_get('products')
+    if 'codes' in request.args:
+        codes = [c for c in request.args.get('codes', '', type=str).split(',') if c]
+        if not 0 < len(codes) <= 500:
+            return jsonify({'error': 'codes must be a comma separated list of up to 500 product codes'}), 400
+        return jsonify(fetch_products_by_code(get_db(), codes))
+    conn = get_db()
+    snapshot = catalog.get(conn)
+    body = catalog.body(snapshot) if snapshot is not None else None
+    if body is not None:
+        # Encoded once per catalog version
+        return app.response_class(body, mimetype='application/json')
+    # Encoded by SQLite and streamed; the full catalog is the largest response
+    return rows_response(query_json_objects(conn, 'products', 'ORDER BY id DESC'))
+
+def fetch_products_by_code(conn, codes):
+    """Products in the order of `codes`, with None for unknown codes"""
+    snapshot = catalog.get(conn)
+    if snapshot is not None:
+        return [snapshot.by_code.get(code) for code in codes]
+    placeholders = ','.join('?' * len(codes))
+    rows = {row['code']: dict(row) for row in conn.execute(f'SELECT * FROM products WHERE code IN ({placeholders})', codes)}
+    return [rows.get(code) for code in codes]
+
+# Text matches ranked per request; a common word ('kamera') matches most of the catalog
+PRODUCT_SEARCH_CANDIDATES = 200
+
+@app.route('/api/products/search', methods=['GET'])
+def search_products():
+    """Typeahead: products whose code starts with the query (exact code first), then
+    products containing every word, ranked by where the words occur (code first)"""
+    query = request.args.get('q', '', type=str).strip()
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    if not query:
+        return jsonify([])
+
+    conn = get_db()
+    # A range scan of idx_products_code_nocase; an exact match is the shortest code, so it sorts first
+    ids = [row[0] for row in conn.execute('''
+        SELECT id FROM products WHERE code >= ? COLLATE NOCASE AND code < ? COLLATE NOCASE
+        ORDER BY code COLLATE NOCASE LIMIT ?
+    ''', (query, query + '\U0010ffff', limit))]
+
+    # Words under 3 characters have no trigrams; a query of only those matches codes alone
+    match, words = product_search_terms(query)
+    if match and len(ids) < limit:
+        # Newest first, so the trigram lookup stops after the candidates; bm25() is not
+        # used, it first counts the documents containing each word across the catalog.
+        # Matches in the code are looked up on their own first, so they are ranked
+        # however many newer products have the words only in their name or description.
+        candidates = []
+        for column_match in (f'code : ({match})', match):
+            candidates += conn.execute('''
+                SELECT rowid, code, name, description FROM products_fts WHERE products_fts MATCH ?
+                ORDER BY rowid DESC LIMIT ?
+            ''', (column_match, PRODUCT_SEARCH_CANDIDATES)).fetchall()
+        ranked = []
+        seen = set(ids)
+        for id, *columns in candidates:
+            if id in seen:
+                continue
+            seen.add(id)
+            # A word in the code weighs most, then in the name, then in the description;
+            # words under 3 characters are only checked here
+            columns = [c.lower() for c in columns]
+            weights = [max((w for w, c in zip((3, 2, 1), columns) if word in c), default=0) for word in words]
+            if all(weights):
+                ranked.append((-sum(weights), len(columns[1]), -id))
+        ids += [-key[2] for key in sorted(ranked)[:limit - len(ids)]]
+    return jsonify([p for p in fetch_by_ids(conn, 'products', ids) if p])
 
 @app.route('/api/products/<int:id>', methods=['GET'])
 def get_product(id):
-    conn = get_db_connection()
-    product = conn.execute('SELECT * FROM products WHERE id = ?', (id,)).fetchone()
-    conn.close()
+    product = fetch_by_ids(get_db(), 'products', [id])[0]
     if product:
-        return jsonify(dict(product))
+        return jsonify(product)
     return jsonify({'error': 'Product not found'}), 404
 
 @app.route('/api/products', methods=['POST'])
 def create_product():
     data = request.json
+    if isinstance(data, list):
+        return create_products(data)
     data['createdAt'] = datetime.now().isoformat()
-    conn = get_db_connection()
+    conn = get_db()
     cur = conn.cursor()
     try:
         cur.execute('''
@@ -304,273 +1213,885 @@ def create_product():
         ''', (data['code'], data['name'], data.get('description'), data.get('price'), data.get('currency'), data.get('unit'), data.get('imageUrl'), data['createdAt']))
         conn.commit()
         new_id = cur.lastrowid
-        conn.close()
         return jsonify({'id': new_id, **data}), 201
     except sqlite3.IntegrityError:
-        conn.close()
         return jsonify({'error': 'Product code must be unique'}), 400
 
+PRODUCT_FIELDS = ('code', 'name', 'description', 'price', 'currency', 'unit', 'imageUrl')
+
+def create_products(items):
+    """Bulk create; with ?upsert=1 products whose code exists are updated instead (e.g. a supplier price list)"""
+    if not 0 < len(items) <= MAX_BULK_ITEMS:
+        return bulk_size_error()
+    upsert = request.args.get('upsert') == '1'
+    errors = validate_bulk_items(items, ('code', 'name'), numeric=('price',))
+    codes = {i: str(item['code']).strip() for i, item in enumerate(items) if i not in errors}
+    mark_duplicates(errors, codes, 'Duplicate code in request')
+    created_at = datetime.now().isoformat()
+
+    # One statement over a JSON array of rows: products_fts is flushed once per
+    # statement, so row-by-row inserts spend most of their time in the index.
+    # (WHERE true keeps ON CONFLICT from parsing as a join constraint.)
+    columns = PRODUCT_FIELDS + ('createdAt',)
+    sql = f'''
+        INSERT INTO products ({', '.join(columns)})
+        SELECT {', '.join(f"json_extract(value, '$[{n}]')" for n in range(len(columns)))}
+        FROM json_each(?) WHERE true
+    '''
+    if upsert:
+        # Fields left out of an item keep their stored value
+        sql += 'ON CONFLICT (code) DO UPDATE SET name = excluded.name, ' + ', '.join(
+            f'{f} = COALESCE(excluded.{f}, {f})' for f in PRODUCT_FIELDS[2:])
+
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    existing = existing_values(conn, 'products', 'code', [codes[i] for i in codes if i not in errors])
+    if not upsert:
+        for i, code in codes.items():
+            if code in existing:
+                errors.setdefault(i, 'Product code must be unique')
+    valid = [i for i in codes if i not in errors]
+    conn.execute(sql, (json.dumps([
+        [codes[i]] + [items[i].get(f) for f in PRODUCT_FIELDS[1:]] + [created_at] for i in valid
+    ]),))
+    ids = dict(conn.execute('SELECT code, id FROM products WHERE code IN (SELECT value FROM json_each(?))',
+                            (json.dumps([codes[i] for i in valid]),)).fetchall())
+    conn.commit()
+    return bulk_response(len(items), errors,
+                         {i: {'id': ids[codes[i]], 'created': codes[i] not in existing} for i in valid})
+
 @app.route('/api/products/<int:id>', methods=['PUT'])
 def update_product(id):
     data = request.json
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute('''
         UPDATE products SET code=?, name=?, description=?, price=?, currency=?, unit=?, imageUrl=?
         WHERE id=?
     ''', (data['code'], data['name'], data.get('description'), data.get('price'), data.get('currency'), data.get('unit'), data.get('imageUrl'), id))
     conn.commit()
-    conn.close()
     return jsonify({'id': id, **data})
 
 @app.route('/api/products/<int:id>', methods=['DELETE'])
 def delete_product(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute('DELETE FROM products WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 # QUOTES
+QUOTE_LIST_FIELDS = ('id', 'quoteNumber', 'customerId', 'customerName', 'status', 'total', 'currency', 'validDays', 'notes', 'createdAt')
+QUOTE_FIELD_SQL = {f: f'q.{f}' for f in QUOTE_LIST_FIELDS}
+QUOTE_FIELD_SQL['customerName'] = 'c.name AS customerName'
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(f'id:{last_id}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return the id encoded in a pagination cursor, or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        kind, value = raw.split(':', 1)
+        return int(value) if kind == 'id' else None
+    except (ValueError, UnicodeDecodeError):
+        return None
+
 @app.route('/api/quotes', methods=['GET'])
+@versioned('quotes')
 def get_quotes():
-    conn = get_db_connection()
-    # Join with customers to get customer name if needed, but for now just raw quotes
-    # The frontend might expect customer details embedded or fetch them separately.
-    # Looking at the frontend code, it often displays customer name. 
-    # Let's return raw quotes first, frontend likely handles joins or stores customer name in UI models.
-    # Actually, in `quotes.js`, it performs lookups.
-    quotes = conn.execute('SELECT * FROM quotes ORDER BY id DESC').fetchall()
-    
-    # Parse items JSON
-    result = []
-    for row in quotes:
-        d = dict(row)
-        if d['items']:
-            try:
-                d['items'] = json.loads(d['items'])
-            except:
-                d['items'] = []
-        result.append(d)
-        
-    conn.close()
-    return jsonify(result)
+    """List quotes newest first, one keyset page at a time, with the customer name joined in"""
+    if 'ids' in request.args:
+        return multi_get('quotes')
+
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    after = request.args.get('after', '', type=str)
+    fields = [f.strip() for f in request.args.get('fields', '', type=str).split(',') if f.strip()] or list(QUOTE_LIST_FIELDS)
+    with_items = 'items' in fields
+    fields = [f for f in fields if f != 'items']
+    unknown = [f for f in fields if f not in QUOTE_FIELD_SQL]
+    if unknown:
+        return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+
+    # A filter that is not an integer is an error, not a reason to list everything
+    for name in ('customerId', 'productId'):
+        if request.args.get(name) and request.args.get(name, type=int) is None:
+            return jsonify({'error': f'{name} must be an integer'}), 400
+
+    where = []
+    params = []
+    if after:
+        after_id = decode_cursor(after)
+        if after_id is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        where.append('q.id < ?')
+        params.append(after_id)
+
+    statuses = [s for s in request.args.get('status', '', type=str).split(',') if s]
+    if statuses:
+        where.append(f'q.status IN ({",".join("?" * len(statuses))})')
+        params.extend(statuses)
+
+    customer_id = request.args.get('customerId', type=int)
+    if customer_id is not None:
+        where.append('q.customerId = ?')
+        params.append(customer_id)
+
+    add_date_range(where, params, 'q.createdAt')
+
+    # Quotes containing a given product
+    product_id = request.args.get('productId', type=int)
+    if product_id is not None:
+        where.append('q.id IN (SELECT quoteId FROM quote_items WHERE productId = ?)')
+        params.append(product_id)
+
+    search = request.args.get('q', '', type=str).strip()
+    if search:
+        where.append('(q.quoteNumber LIKE ? OR c.name LIKE ?)')
+        params.extend([f'%{search}%', f'%{search}%'])
+
+    sql = f'SELECT {", ".join(QUOTE_FIELD_SQL[f] for f in fields)} FROM quotes q LEFT JOIN customers c ON c.id = q.customerId'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY q.id DESC LIMIT ?'
+    params.append(limit + 1)
+
+    conn = get_db()
+    cursor = query_tuples(conn, sql, params)
+    quotes = row_dicts(cursor)
+
+    has_more = len(quotes) > limit
+    quotes = quotes[:limit]
+    if with_items:
+        attach_quote_items(conn, quotes)
+
+    return jsonify({
+        'quotes': quotes,
+        'limit': limit,
+        'next': encode_cursor(quotes[-1]['id']) if has_more else None
+    })
 
 @app.route('/api/quotes/<int:id>', methods=['GET'])
 def get_quote(id):
-    conn = get_db_connection()
+    conn = get_db()
     quote = conn.execute('SELECT * FROM quotes WHERE id = ?', (id,)).fetchone()
-    conn.close()
     
     if quote:
-        d = dict(quote)
-        if d['items']:
-            try:
-                d['items'] = json.loads(d['items'])
-            except:
-                d['items'] = []
-        return jsonify(d)
+        return jsonify(attach_quote_items(conn, [dict(quote)])[0])
     return jsonify({'error': 'Quote not found'}), 404
 
 @app.route('/api/quotes', methods=['POST'])
 def create_quote():
     data = request.json
+    if isinstance(data, list):
+        return create_quotes(data)
+    if not is_integer(data.get('customerId')):
+        return jsonify({'error': 'customerId must be an integer'}), 400
     data['createdAt'] = datetime.now().isoformat()
-    conn = get_db_connection()
+    conn = get_db()
     cur = conn.cursor()
     
-    items_json = json.dumps(data.get('items', []))
-    
     try:
+        # Number allocation and the insert share one write transaction
+        conn.execute('BEGIN IMMEDIATE')
+        if data.pop('allocateNumber', False) or not data.get('quoteNumber'):
+            data['quoteNumber'] = allocate_quote_number(conn)
+        else:
+            sync_quote_sequence(conn, data['quoteNumber'])
         cur.execute('''
-            INSERT INTO quotes (quoteNumber, customerId, status, total, currency, items, validDays, notes, createdAt)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (data['quoteNumber'], data['customerId'], data['status'], data['total'], data['currency'], items_json, data['validDays'], data.get('notes'), data['createdAt']))
+            INSERT INTO quotes (quoteNumber, customerId, status, total, currency, validDays, notes, createdAt)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (data['quoteNumber'], data['customerId'], data['status'], data['total'], data['currency'], data['validDays'], data.get('notes'), data['createdAt']))
         quote_id = cur.lastrowid
         
-        # Add price history
-        for item in data.get('items', []):
-            if 'productId' in item:
-                cur.execute('''
-                    INSERT INTO price_history (productId, customerId, quoteId, price, createdAt)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (item['productId'], data['customerId'], quote_id, item['unitPrice'], data['createdAt']))
+        # Quote lines and price history
+        write_quote_items(conn, quote_id, data['customerId'], data.get('items', []), data['createdAt'])
         
         conn.commit()
-        conn.close()
         return jsonify({'id': quote_id, **data}), 201
     except sqlite3.IntegrityError:
-        conn.close()
         return jsonify({'error': 'Quote number must be unique'}), 400
 
+QUOTE_REQUIRED = ('customerId', 'status', 'total', 'currency', 'validDays')
+
+def create_quotes(items):
+    """Bulk create; numbers are allocated like POST /api/quotes, lines and price history written with the quotes"""
+    if not 0 < len(items) <= MAX_BULK_ITEMS:
+        return bulk_size_error()
+    errors = validate_bulk_items(items, QUOTE_REQUIRED, numeric=('total', 'validDays'), integer=('customerId',))
+    for index, item in enumerate(items):
+        if index not in errors and not isinstance(item.get('items', []), list):
+            errors[index] = 'items must be a list'
+    numbers = {i: str(item['quoteNumber']) for i, item in enumerate(items)
+               if i not in errors and item.get('quoteNumber') and not item.get('allocateNumber')}
+    mark_duplicates(errors, numbers, 'Duplicate quote number in request')
+    created_at = datetime.now().isoformat()
+
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    customers = existing_values(conn, 'customers', 'id', {item['customerId'] for i, item in enumerate(items) if i not in errors})
+    taken = existing_values(conn, 'quotes', 'quoteNumber', [n for i, n in numbers.items() if i not in errors])
+    for index, item in enumerate(items):
+        if index in errors:
+            continue
+        if item['customerId'] not in customers:
+            errors[index] = f"Customer {item['customerId']} not found"
+        elif numbers.get(index) in taken:
+            errors[index] = 'Quote number must be unique'
+    valid = [i for i in range(len(items)) if i not in errors]
+
+    # Client-chosen numbers first, so the sequence is past them before allocating
+    for i in valid:
+        if i in numbers:
+            sync_quote_sequence(conn, numbers[i])
+    for i in valid:
+        if i not in numbers:
+            numbers[i] = allocate_quote_number(conn)
+    conn.executemany('''
+        INSERT INTO quotes (quoteNumber, customerId, status, total, currency, validDays, notes, createdAt)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(numbers[i], items[i]['customerId'], items[i]['status'], items[i]['total'], items[i]['currency'],
+           items[i]['validDays'], items[i].get('notes'), created_at) for i in valid])
+    ids = dict(zip(valid, inserted_ids(conn, 'quotes', len(valid)) if valid else []))
+    conn.executemany(QUOTE_ITEM_INSERT, [
+        row for i in valid for row in quote_item_rows(ids[i], items[i].get('items', []))
+    ])
+    conn.executemany(PRICE_HISTORY_INSERT, [
+        row for i in valid for row in price_history_rows(ids[i], items[i]['customerId'], items[i].get('items', []), created_at)
+    ])
+    conn.commit()
+    return bulk_response(len(items), errors, {i: {'id': ids[i], 'quoteNumber': numbers[i]} for i in valid})
+
 @app.route('/api/quotes/<int:id>', methods=['PUT'])
 def update_quote(id):
     data = request.json
-    conn = get_db_connection()
+    conn = get_db()
     
     # If status is updated only
     if 'status' in data and len(data) == 1:
         conn.execute('UPDATE quotes SET status=? WHERE id=?', (data['status'], id))
         conn.commit()
-        conn.close()
         return jsonify({'id': id, 'status': data['status']})
         
-    items_json = json.dumps(data.get('items', []))
-    conn.execute('''
-        UPDATE quotes SET customerId=?, status=?, total=?, currency=?, items=?, validDays=?, notes=?
-        WHERE id=?
-    ''', (data['customerId'], data['status'], data['total'], data['currency'], items_json, data['validDays'], data.get('notes'), id))
+    conn.execute('BEGIN IMMEDIATE')
+    updated = conn.execute('''
+        UPDATE quotes SET customerId=?, status=?, total=?, currency=?, validDays=?, notes=?
+        WHERE id=? RETURNING createdAt
+    ''', (data['customerId'], data['status'], data['total'], data['currency'], data['validDays'], data.get('notes'), id)).fetchall()
+    if not updated:
+        conn.rollback()
+        return jsonify({'error': 'Quote not found'}), 404
+    # Lines and price history are rewritten together so they never go stale
+    write_quote_items(conn, id, data['customerId'], data.get('items', []), updated[0]['createdAt'])
     conn.commit()
-    conn.close()
     return jsonify({'id': id, **data})
 
 @app.route('/api/quotes/<int:id>', methods=['DELETE'])
 def delete_quote(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute('DELETE FROM quotes WHERE id = ?', (id,))
+    conn.execute('DELETE FROM quote_items WHERE quoteId = ?', (id,))
     conn.execute('DELETE FROM price_history WHERE quoteId = ?', (id,))
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 # AUXILIARY ENDPOINTS
 
+QUOTE_NUMBER_PREFIX = 'TKL-{year}-'
+
+def format_quote_number(year, number):
+    return f"{QUOTE_NUMBER_PREFIX.format(year=year)}{str(number).zfill(4)}"
+
+def last_used_quote_number(conn, year):
+    """Highest TKL-YYYY-NNNN suffix already stored in quotes (index range scan, only used to seed a year)"""
+    prefix = QUOTE_NUMBER_PREFIX.format(year=year)
+    return conn.execute('''
+        SELECT COALESCE(MAX(CAST(substr(quoteNumber, ?) AS INTEGER)), 0) FROM quotes
+        WHERE quoteNumber >= ? AND quoteNumber < ? AND substr(quoteNumber, ?) NOT GLOB '*[^0-9]*'
+    ''', (len(prefix) + 1, prefix, prefix[:-1] + '.', len(prefix) + 1)).fetchone()[0]
+
+def allocate_quote_number(conn, year=None):
+    """Reserve the next quote number of `year`; must run inside a BEGIN IMMEDIATE transaction"""
+    year = year or datetime.now().year
+    row = conn.execute(
+        'UPDATE quote_sequences SET lastNumber = lastNumber + 1 WHERE year = ? RETURNING lastNumber', (year,)
+    ).fetchall()
+    if row:
+        number = row[0][0]
+    else:
+        number = last_used_quote_number(conn, year) + 1
+        conn.execute('INSERT INTO quote_sequences (year, lastNumber) VALUES (?, ?)', (year, number))
+    return format_quote_number(year, number)
+
+def sync_quote_sequence(conn, quote_number):
+    """Keep the sequence ahead of a client-chosen TKL-YYYY-NNNN number"""
+    match = re.fullmatch(r'TKL-(\d{4})-(\d+)', quote_number or '')
+    if match:
+        year, number = int(match.group(1)), int(match.group(2))
+        updated = conn.execute(
+            'UPDATE quote_sequences SET lastNumber = MAX(lastNumber, ?) WHERE year = ?', (number, year)
+        ).rowcount
+        if not updated:
+            conn.execute(
+                'INSERT INTO quote_sequences (year, lastNumber) VALUES (?, ?)',
+                (year, max(number, last_used_quote_number(conn, year)))
+            )
+
 @app.route('/api/quote-number', methods=['GET'])
 def get_next_quote_number():
-    conn = get_db_connection()
+    """Preview the next quote number without reserving it"""
+    conn = get_db()
     year = datetime.now().year
-    prefix = f"TKL-{year}-"
-    
-    # Get all quote numbers starting with prefix
-    # SQLite doesn't have regex, so we fetch and filter or use LIKE
-    quotes = conn.execute("SELECT quoteNumber FROM quotes WHERE quoteNumber LIKE ?", (f"{prefix}%",)).fetchall()
-    
-    max_num = 0
-    for row in quotes:
-        try:
-            num_part = row['quoteNumber'].replace(prefix, '')
-            num = int(num_part)
-            if num > max_num:
-                max_num = num
-        except:
-            pass
-            
-    conn.close()
-    return jsonify({'quoteNumber': f"{prefix}{str(max_num + 1).zfill(4)}"})
+    row = conn.execute('SELECT lastNumber FROM quote_sequences WHERE year = ?', (year,)).fetchone()
+    last = row['lastNumber'] if row else last_used_quote_number(conn, year)
+    return jsonify({'quoteNumber': format_quote_number(year, last + 1)})
+
+@app.route('/api/quote-number', methods=['POST'])
+def reserve_quote_number():
+    """Reserve a quote number atomically; safe across gunicorn workers"""
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    quote_number = allocate_quote_number(conn)
+    conn.commit()
+    return jsonify({'quoteNumber': quote_number}), 201
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Dashboard summary read from the trigger-maintained stats tables"""
+    recent = max(0, min(request.args.get('recent', 5, type=int), 50))
+    conn = get_db()
+
+    counts = {row['tableName']: row['rowCount'] for row in conn.execute('SELECT tableName, rowCount FROM table_stats')}
+    revenue_rows = conn.execute('SELECT currency, total, quoteCount FROM revenue_stats WHERE quoteCount > 0').fetchall()
+    recent_quotes = conn.execute('''
+        SELECT q.id, q.quoteNumber, q.customerId, c.name AS customerName, q.status, q.total, q.currency, q.createdAt
+        FROM quotes q LEFT JOIN customers c ON c.id = q.customerId
+        ORDER BY q.id DESC LIMIT ?
+    ''', (recent,)).fetchall()
+
+    return jsonify({
+        'customers': counts.get('customers', 0),
+        'products': counts.get('products', 0),
+        'quotes': counts.get('quotes', 0),
+        'revenue': {row['currency']: round(row['total'], 2) for row in revenue_rows},
+        'acceptedQuotes': sum(row['quoteCount'] for row in revenue_rows),
+        'recentQuotes': [dict(row) for row in recent_quotes]
+    })
 
 @app.route('/api/price-history', methods=['GET'])
 def get_price_history():
     product_id = request.args.get('productId')
-    conn = get_db_connection()
-    
-    if product_id:
-        history = conn.execute('SELECT * FROM price_history WHERE productId = ?', (product_id,)).fetchall()
-    else:
-        history = []
-        
-    conn.close()
-    return jsonify([dict(row) for row in history])
+    customer_id = request.args.get('customerId')
+    if not product_id:
+        return jsonify([])
+    return rows_response(query_json_objects(get_db(), 'price_history', *price_history_clause(product_id, customer_id)))
+
+def price_history_clause(product_id, customer_id=None):
+    """WHERE / ORDER BY for one product's price_history rows, with its params"""
+    if customer_id:
+        return 'WHERE productId = ? AND customerId = ? ORDER BY createdAt', (product_id, customer_id)
+    return 'WHERE productId = ? ORDER BY customerId, createdAt', (product_id,)
+
+def fetch_price_history(conn, product_id, customer_id=None):
+    if not product_id:
+        return []
+    clause, params = price_history_clause(product_id, customer_id)
+    return [dict(row) for row in conn.execute(f'SELECT * FROM price_history {clause}', params)]
+
+def summarize_price_history(conn, product_id, customer_id=None, per_customer=False):
+    """Price statistics for one product, answered from idx_price_history_product"""
+    overall = conn.execute('''
+        SELECT COUNT(*) AS count, SUM(price) AS total, MIN(price) AS min, MAX(price) AS max
+        FROM price_history WHERE productId = ?
+    ''', (product_id,)).fetchone()
+    summary = {
+        'productId': product_id,
+        'count': overall['count'],
+        'min': overall['min'],
+        'max': overall['max'],
+        'average': overall['total'] / overall['count'] if overall['count'] else None,
+        'lastPriceForCustomer': None,
+        'averageForOthers': None
+    }
+
+    others_count, others_total = overall['count'], overall['total'] or 0
+    if customer_id is not None:
+        last = conn.execute('''
+            SELECT price, createdAt, quoteId FROM price_history
+            WHERE productId = ? AND customerId = ? ORDER BY createdAt DESC LIMIT 1
+        ''', (product_id, customer_id)).fetchone()
+        if last:
+            summary['lastPriceForCustomer'] = dict(last)
+        own = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(price), 0) FROM price_history WHERE productId = ? AND customerId = ?',
+            (product_id, customer_id)
+        ).fetchone()
+        others_count, others_total = others_count - own[0], others_total - own[1]
+    if others_count:
+        summary['averageForOthers'] = {'average': others_total / others_count, 'count': others_count}
+
+    if per_customer:
+        # SQLite returns the price of the row holding MAX(createdAt) for each group
+        summary['lastPrices'] = [dict(row) for row in conn.execute('''
+            SELECT customerId, price, MAX(createdAt) AS createdAt FROM price_history
+            WHERE productId = ? GROUP BY customerId
+        ''', (product_id,))]
+    return summary
+
+@app.route('/api/price-history/summary', methods=['GET'])
+def get_price_history_summary():
+    """Last price for a customer, average over other customers, min/max/count for one or many products"""
+    customer_id = request.args.get('customerId', type=int)
+    per_customer = request.args.get('perCustomer', '') in ('1', 'true')
+    conn = get_db()
+
+    if 'productIds' in request.args:
+        product_ids = parse_ids(request.args.get('productIds', '', type=str))
+        if product_ids is None:
+            return jsonify({'error': 'productIds must be a comma separated list of up to 500 integers'}), 400
+        return jsonify([summarize_price_history(conn, pid, customer_id, per_customer) for pid in product_ids])
+
+    product_id = request.args.get('productId', type=int)
+    if product_id is None:
+        return jsonify({'error': 'productId or productIds is required'}), 400
+    return jsonify(summarize_price_history(conn, product_id, customer_id, per_customer))
+
+# BATCH
+BATCH_ENTITIES = {'customers': 'Customer', 'products': 'Product', 'quotes': 'Quote'}
+MAX_BATCH_SIZE = 200
+
+def run_batch_request(conn, path):
+    """Resolve one read-only sub-request path such as 'customers/5' against `conn`"""
+    parts = urlsplit(path)
+    segments = [s for s in parts.path.split('/') if s]
+    if segments[:1] == ['api']:
+        segments = segments[1:]
+    args = parse_qs(parts.query)
+
+    if len(segments) == 2 and segments[0] in BATCH_ENTITIES:
+        try:
+            row_id = int(segments[1])
+        except ValueError:
+            return 400, {'error': f'Invalid id: {segments[1]}'}
+        row = fetch_by_ids(conn, segments[0], [row_id])[0]
+        if row is None:
+            return 404, {'error': f'{BATCH_ENTITIES[segments[0]]} not found'}
+        return 200, row
+
+    if len(segments) == 1 and segments[0] in BATCH_ENTITIES and 'ids' in args:
+        ids = parse_ids(args['ids'][0])
+        if ids is None:
+            return 400, {'error': 'ids must be a comma separated list of up to 500 integers'}
+        return 200, fetch_by_ids(conn, segments[0], ids)
+
+    if segments == ['price-history']:
+        return 200, fetch_price_history(conn, args.get('productId', [None])[0], args.get('customerId', [None])[0])
+
+    if segments == ['price-history', 'summary'] and 'productId' in args:
+        try:
+            product_id = int(args['productId'][0])
+            customer_id = int(args['customerId'][0]) if 'customerId' in args else None
+        except ValueError:
+            return 400, {'error': 'productId and customerId must be integers'}
+        return 200, summarize_price_history(conn, product_id, customer_id)
+
+    return 404, {'error': f'Unsupported batch path: {path}'}
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Run several GET sub-requests on one connection and return their results in order"""
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object with a requests list'}), 400
+    subrequests = data.get('requests')
+    if not isinstance(subrequests, list) or len(subrequests) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'requests must be a list of at most {MAX_BATCH_SIZE} sub-requests'}), 400
+
+    conn = get_db()
+    # One read transaction so every sub-request sees the same snapshot
+    conn.execute('BEGIN')
+    responses = []
+    for sub in subrequests:
+        if isinstance(sub, str):
+            sub = {'path': sub}
+        if not isinstance(sub, dict) or not sub.get('path'):
+            responses.append({'status': 400, 'body': {'error': 'Sub-request path is required'}})
+            continue
+        if sub.get('method', 'GET').upper() != 'GET':
+            responses.append({'status': 405, 'body': {'error': 'Only GET sub-requests are supported'}})
+            continue
+        status, body = run_batch_request(conn, sub['path'])
+        responses.append({'status': status, 'body': body})
+    conn.rollback()
+
+    return jsonify({'responses': responses})
+
+# SYNC
+
+SYNC_PAGE_SIZE = 1000
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Rows written and ids deleted since ?since=<cursor>, for client-side replicas.
+
+    Without a cursor the response starts a full snapshot. Returns
+    {cursor, more, changes: {table: [rows]}, deleted: {table: [ids]}}; keep
+    calling with the returned cursor while `more` is true.
+    """
+    since = request.args.get('since', type=int)
+    tables = request.args.get('tables', ','.join(SYNC_TABLES)).split(',')
+    if any(t not in SYNC_TABLES for t in tables):
+        return jsonify({'error': f"tables must be a subset of: {', '.join(SYNC_TABLES)}"}), 400
+    limit = max(1, min(request.args.get('limit', SYNC_PAGE_SIZE, type=int), SYNC_PAGE_SIZE))
+
+    conn = get_db()
+    # One read transaction, so every table is read from the same snapshot
+    conn.execute('BEGIN')
+    try:
+        cursor = conn.execute('SELECT COALESCE(MAX(version), 0) FROM table_stats').fetchone()[0]
+        after = since if since is not None else -1
+        pages = {table: [dict(row) for row in conn.execute(
+            f'SELECT * FROM {table} WHERE version > ? ORDER BY version LIMIT ?', (after, limit))]
+            for table in tables}
+        tombstones = []
+        if since is not None:
+            placeholders = ','.join('?' * len(tables))
+            tombstones = conn.execute(f'''
+                SELECT version, tableName, rowId FROM deleted_rows
+                WHERE version > ? AND tableName IN ({placeholders}) ORDER BY version LIMIT ?
+            ''', (since, *tables, limit)).fetchall()
+
+        # Versions are unique across tables, so the tables and tombstones merge into one
+        # stream: a page ends at the limit-th lowest version and holds every change up
+        # to it, and the next page starts right after it, with nothing sent twice
+        versions = sorted([row['version'] for rows in pages.values() for row in rows] +
+                          [row['version'] for row in tombstones])
+        full = len(tombstones) == limit or any(len(rows) == limit for rows in pages.values())
+        more = full or len(versions) > limit
+        if more:
+            cursor = versions[min(limit, len(versions)) - 1]
+
+        changes = {table: [row for row in rows if row['version'] <= cursor] for table, rows in pages.items()}
+        if 'quotes' in changes:
+            attach_quote_items(conn, changes['quotes'])
+        deleted = {table: [] for table in tables}
+        for row in tombstones:
+            if row['version'] <= cursor:
+                deleted[row['tableName']].append(row['rowId'])
+    finally:
+        conn.rollback()
+
+    return jsonify({'cursor': cursor, 'more': more, 'changes': changes, 'deleted': deleted})
+
+# EXPORT
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# table -> (SELECT, date column, ORDER BY); quotes are flattened to one row per line item
+EXPORTS = {
+    'customers': (
+        'SELECT id, name, company, email, phone, address, createdAt FROM customers',
+        'createdAt', 'id'
+    ),
+    'products': (
+        'SELECT id, code, name, description, price, currency, unit, imageUrl, createdAt FROM products',
+        'createdAt', 'id'
+    ),
+    'quotes': (
+        '''SELECT q.id AS quoteId, q.quoteNumber, q.createdAt, q.status, q.customerId, c.name AS customerName,
+                  c.company AS customerCompany, q.currency, q.total, q.validDays, q.notes,
+                  i.position AS line, i.productId, i.productCode, i.productName, i.quantity, i.unit,
+                  i.unitPrice, i.quantity * i.unitPrice AS lineTotal
+           FROM quotes q
+           LEFT JOIN customers c ON c.id = q.customerId
+           LEFT JOIN quote_items i ON i.quoteId = q.id''',
+        'q.createdAt', 'q.id, i.position'
+    ),
+    'price-history': (
+        '''SELECT ph.id, ph.createdAt, ph.productId, p.code AS productCode, p.name AS productName,
+                  ph.customerId, c.name AS customerName, ph.quoteId, q.quoteNumber, ph.price
+           FROM price_history ph
+           LEFT JOIN products p ON p.id = ph.productId
+           LEFT JOIN customers c ON c.id = ph.customerId
+           LEFT JOIN quotes q ON q.id = ph.quoteId''',
+        'ph.createdAt', 'ph.id'
+    ),
+}
+
+def csv_chunks(cursor):
+    buffer = io.StringIO()
+    # BOM so Excel opens the file as UTF-8 (Turkish characters)
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer)
+    writer.writerow(col[0] for col in cursor.description)
+    for row in cursor:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def ndjson_chunks(cursor):
+    columns = [col[0] for col in cursor.description]
+    lines = []
+    size = 0
+    for row in cursor:
+        line = json.dumps(dict(zip(columns, row)), ensure_ascii=False)
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+            size = 0
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.route('/api/export/<table>')
+def export_table(table):
+    """Stream a whole table as CSV (default) or NDJSON (?format=ndjson).
+
+    ?dateFrom= / ?dateTo= filter on createdAt and ?gzip=1 compresses the download.
+    Rows are read from the cursor as they are sent, so memory use does not grow with the export.
+    """
+    if table not in EXPORTS:
+        return jsonify({'error': f"Unknown export, expected one of: {', '.join(EXPORTS)}"}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    compress = request.args.get('gzip', '0') not in ('0', 'false', '')
+
+    select, date_column, order = EXPORTS[table]
+    where, params = [], []
+    add_date_range(where, params, date_column)
+    sql = select
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f' ORDER BY {order}'
+
+    def generate():
+        cursor = get_db().execute(sql, params)
+        chunks = csv_chunks(cursor) if fmt == 'csv' else ndjson_chunks(cursor)
+        yield from gzip_chunks(chunks) if compress else chunks
+
+    filename = f"{table}-{datetime.now().strftime('%Y%m%d')}.{fmt}" + ('.gz' if compress else '')
+    mimetype = 'application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    # stream_with_context keeps the app context (and its pooled connection) alive while streaming
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 # SCRAPING ENDPOINTS
+
+# Outbound fetches (scraping and the image proxy) share one bounded executor.
+# OUTBOUND_MAX_WAITING caps the request threads parked on them; keep it below
+# the gunicorn thread count so database routes always have threads left.
+outbound = FetchExecutor(
+    max_workers=int(os.environ.get('OUTBOUND_WORKERS', 16)),
+    per_host=int(os.environ.get('OUTBOUND_PER_HOST', 4)),
+    max_pending=int(os.environ.get('OUTBOUND_MAX_PENDING', 64)),
+    max_waiting=int(os.environ.get('OUTBOUND_MAX_WAITING', 16)),
+    deadline=float(os.environ.get('OUTBOUND_DEADLINE', 15)),
+    on_wait=metrics.record_http_wait
+)
+OUTBOUND_RETRY_AFTER = 5
+
+def outbound_busy(e):
+    response = jsonify({'error': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(OUTBOUND_RETRY_AFTER)
+    return response
+
+product_scraper = Scraper(
+    sessions=SessionPool(pool_size=outbound.per_host, response_hooks=[metrics.record_http]),
+    executor=outbound,
+    cache=TTLCache(
+        max_entries=int(os.environ.get('SCRAPE_CACHE_SIZE', 512)),
+        ttl=int(os.environ.get('SCRAPE_CACHE_TTL', 3600))
+    )
+)
+MAX_SCRAPE_URLS = 50
+
 @app.route('/api/scrape-product', methods=['POST'])
 def scrape_product():
     """Scrape product info from a given URL"""
     data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object with a url'}), 400
     url = data.get('url')
     
     if not url:
         return jsonify({'error': 'URL is required'}), 400
     
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extract data from Open Graph meta tags first (most reliable)
-        og_image = soup.find('meta', property='og:image')
-        og_title = soup.find('meta', property='og:title')
-        og_description = soup.find('meta', property='og:description')
-        
-        # Fallback to standard meta tags / title
-        title_tag = soup.find('title')
-        meta_description = soup.find('meta', attrs={'name': 'description'})
-        
-        # Try to find first large image if no og:image
-        image_url = None
-        if og_image and og_image.get('content'):
-            image_url = og_image['content']
-        else:
-            # Look for product images
-            for img in soup.find_all('img'):
-                src = img.get('src') or img.get('data-src')
-                if src and not 'logo' in src.lower() and not 'icon' in src.lower():
-                    image_url = urljoin(url, src)
-                    break
-        
-        # Get title
-        title = ''
-        if og_title and og_title.get('content'):
-            title = og_title['content']
-        elif title_tag:
-            title = title_tag.get_text(strip=True)
-        
-        # Get description
-        description = ''
-        if og_description and og_description.get('content'):
-            description = og_description['content']
-        elif meta_description and meta_description.get('content'):
-            description = meta_description['content']
-        
-        # Try to extract brand/model from title
-        brand = ''
-        model = ''
-        title_parts = title.split(' - ') if title else []
-        if len(title_parts) >= 2:
-            brand = title_parts[0].strip()
-            model = title_parts[1].strip() if len(title_parts) > 1 else ''
-        elif title_parts:
-            # Try first two words as brand/model
-            words = title_parts[0].split()
-            brand = words[0] if words else ''
-            model = ' '.join(words[1:3]) if len(words) > 1 else ''
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'imageUrl': image_url,
-                'title': title[:200] if title else '',
-                'brand': brand[:100] if brand else '',
-                'model': model[:100] if model else '',
-                'description': description[:500] if description else ''
-            }
-        })
-        
-    except requests.RequestException as e:
+        return jsonify({'success': True, 'data': product_scraper.scrape(url)})
+    except FetchBusy as e:
+        return outbound_busy(e)
+    except ScrapeError as e:
         return jsonify({'error': f'Failed to fetch URL: {str(e)}'}), 400
     except Exception as e:
         return jsonify({'error': f'Scraping error: {str(e)}'}), 500
 
+@app.route('/api/scrape-products', methods=['POST'])
+def scrape_products():
+    """Scrape many URLs concurrently; per-URL results are returned in request order (?async=1: as a job)"""
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object with a urls list'}), 400
+    urls = data.get('urls')
+    if not isinstance(urls, list) or not urls or len(urls) > MAX_SCRAPE_URLS:
+        return jsonify({'error': f'urls must be a list of 1 to {MAX_SCRAPE_URLS} URLs'}), 400
+    if wants_async():
+        return job_accepted(job_queue.enqueue(get_db(), 'scrape-products', {'urls': [str(u) for u in urls]}))
+    try:
+        return jsonify({'results': product_scraper.scrape_many([str(u) for u in urls])})
+    except FetchBusy as e:
+        return outbound_busy(e)
+
+# IMAGE PROXY
+image_cache = ImageCache(
+    os.environ.get('IMAGE_CACHE_DIR', 'image_cache'),
+    max_bytes=int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+)
+IMAGE_MAX_AGE = 86400
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+def send_cached_image(entry):
+    # conditional=True answers If-None-Match with 304
+    return send_file(entry.path, mimetype=entry.content_type, etag=entry.etag,
+                     max_age=IMAGE_MAX_AGE, conditional=True)
+
+def upstream_chunks(upstream):
+    """The body of a streamed response as it arrives; iter_content() waits to fill each chunk"""
+    if not hasattr(upstream.raw, 'read1'):  # urllib3 1.x
+        yield from upstream.iter_content(IMAGE_CHUNK_SIZE)
+        return
+    while chunk := upstream.raw.read1(IMAGE_CHUNK_SIZE, decode_content=True):
+        yield chunk
+
+def download_image(url, writer):
+    """Fetch `url` into the image cache through `writer`; runs on the outbound executor"""
+    deadline = time.monotonic() + outbound.deadline
+    try:
+        try:
+            upstream = product_scraper.sessions.for_url(url).get(url, timeout=10, stream=True)
+            upstream.raise_for_status()
+        except requests.RequestException:
+            raise ScrapeError('Failed to fetch image')
+        # Closed on the way out, also when the image turns out too large
+        with upstream:
+            content_type = upstream.headers.get('Content-Type', 'image/jpeg')
+            if not content_type.startswith('image/'):
+                raise ScrapeError('URL is not an image')
+            length = upstream.headers.get('Content-Length')
+            writer.start(content_type, int(length) if length and length.isdigit() else None)
+            try:
+                for chunk in upstream_chunks(upstream):
+                    writer.write(chunk)
+                    if time.monotonic() > deadline:
+                        raise ScrapeError('Image download took too long')
+            except (requests.RequestException, urllib3.exceptions.HTTPError, OSError):
+                raise ScrapeError('Failed to fetch image')
+    except (ScrapeError, ImageTooLarge) as e:
+        writer.abort(str(e))
+        return
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
 @app.route('/api/proxy-image')
 def proxy_image():
-    """Proxy an image to avoid CORS issues"""
+    """Proxy an image to avoid CORS issues; cached on disk, ?w= serves a thumbnail"""
     image_url = request.args.get('url')
+    width = request.args.get('w', type=int)
     if not image_url:
         return jsonify({'error': 'URL required'}), 400
-    
+
+    entry = image_cache.lookup(image_url, width)
+    if entry is not None:
+        return send_cached_image(entry)
+
+    # One download per image on the outbound executor; every request for it,
+    # including this one, follows that download
+    writer, created = image_cache.download(image_url)
+    if created:
+        try:
+            outbound.submit(('image', image_url), image_url, lambda: download_image(image_url, writer))
+        except FetchBusy as e:
+            writer.abort(str(e))
+            return outbound_busy(e)
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(image_url, headers=headers, timeout=10, stream=True)
-        response.raise_for_status()
-        
-        content_type = response.headers.get('Content-Type', 'image/jpeg')
-        return Response(response.content, mimetype=content_type)
-    except:
-        return jsonify({'error': 'Failed to fetch image'}), 400
+        with outbound.waiting():
+            if ImageCache.thumbnail_width(width):
+                # A thumbnail needs the whole original first
+                ready = writer.wait_done(outbound.deadline)
+            else:
+                ready = writer.wait_started(outbound.deadline)
+    except FetchBusy as e:
+        return outbound_busy(e)
+    if not ready:
+        return jsonify({'error': writer.error or 'Timed out waiting for the remote site'}), 400
+
+    entry = image_cache.lookup(image_url, width)
+    if entry is not None:
+        return send_cached_image(entry)
+    # Streamed to the client while it is written to the cache
+    response = Response(writer.follow(IMAGE_CHUNK_SIZE, outbound.deadline), mimetype=writer.content_type)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    return response
+
+# JOBS
+
+@app.route('/api/jobs/<int:id>', methods=['GET'])
+def get_job(id):
+    """Status, progress and (once finished) result or error of a background job"""
+    job = job_queue.get(get_db(), id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+def discard_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def run_import_job(job):
+    path = job.payload['path']
+    try:
+        with open(path, 'rb') as f:
+            rows = read_rows(f, job.payload['filename'])
+            result = import_customers(job.conn, rows, job.payload['columns'],
+                                      progress=lambda processed, inserted: job.progress(processed=processed, inserted=inserted))
+    except JobInterrupted:
+        # Rerun from the start of the file later; rows already imported count as duplicates then
+        raise
+    except (ImportFormatError, ValueError, FileNotFoundError) as e:
+        discard_file(path)
+        raise JobFailed(str(e))
+    except Exception:
+        if job.final_attempt:
+            discard_file(path)
+        raise
+    discard_file(path)
+    return result
+
+def run_scrape_job(job):
+    # FetchBusy fails the attempt; it is retried after the backoff
+    return {'results': product_scraper.scrape_many(job.payload['urls'])}
+
+job_queue.register('import-customers', run_import_job, max_attempts=3)
+job_queue.register('scrape-products', run_scrape_job, max_attempts=5)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))